@@ -1,8 +1,8 @@
 # auditoria/views.py
 from django.shortcuts import render
 from django.contrib.auth.decorators import user_passes_test
-from django.core.paginator import Paginator
 from django.db.models import Q, Count
+from consultorio_dental.paginacion import estimar_total, paginar, url_pagina
 from .models import LogAuditoria
 from datetime import datetime, timedelta
 
@@ -61,18 +61,16 @@ def logs_sistema(request):
             Q(ip_address__icontains=busqueda)
         )
     
-    # Estadísticas
-    total_logs = logs.count()
+    # Estadísticas (el total es estimado o con tope: no se cuenta todo el log)
+    total_logs = estimar_total(logs)
     logs_hoy = logs.filter(fecha_hora__gte=datetime.now().replace(hour=0, minute=0, second=0)).count()
     logs_semana = logs.filter(fecha_hora__gte=datetime.now() - timedelta(days=7)).count()
     
     # Acciones más comunes
     acciones_stats = logs.values('accion').annotate(total=Count('id')).order_by('-total')[:5]
     
-    # Paginación
-    paginator = Paginator(logs, 50)  # 50 logs por página
-    page_number = request.GET.get('page')
-    logs_paginados = paginator.get_page(page_number)
+    # Paginación por cursor (o por número con ?page=N)
+    logs_paginados = paginar(request, logs, 50, ('-fecha_hora',))  # 50 logs por página
     
     # Obtener listas para filtros
     from django.contrib.auth.models import User
@@ -81,6 +79,8 @@ def logs_sistema(request):
     
     context = {
         'logs': logs_paginados,
+        'url_anterior': url_pagina(request, logs_paginados, anterior=True),
+        'url_siguiente': url_pagina(request, logs_paginados),
         'total_logs': total_logs,
         'logs_hoy': logs_hoy,
         'logs_semana': logs_semana,
@@ -1,3 +1,20 @@
 from django.contrib import admin
+from pacientes.admin import SelectorPacienteAdminMixin
 
-# Register your models here.
+from .matcher import VINCULO_MANUAL
+from .models import CitaEvento
+
+
+@admin.register(CitaEvento)
+class CitaEventoAdmin(SelectorPacienteAdminMixin, admin.ModelAdmin):
+    list_display = ('titulo', 'calendario', 'inicio', 'fin', 'paciente', 'vinculo', 'secuencia', 'sincronizado_en')
+    list_filter = ('calendario', 'vinculo')
+    search_fields = ('titulo', 'descripcion', 'uid', 'paciente__nombre_completo', 'paciente__dni')
+    date_hierarchy = 'inicio'
+    readonly_fields = ('calendario', 'uid', 'vinculo', 'secuencia', 'ultima_modificacion', 'sincronizado_en')
+
+    def save_model(self, request, obj, form, change):
+        # Un paciente elegido a mano no se recalcula en la siguiente sincronización
+        if 'paciente' in form.changed_data:
+            obj.vinculo = VINCULO_MANUAL if obj.paciente_id else ''
+        super().save_model(request, obj, form, change)
@@ -0,0 +1,142 @@
+# citas/availability.py
+"""
+Buscador de horarios libres sobre el calendario de citas.
+
+Las citas ocupadas salen del ``EventIndex``, se ordenan por inicio y se
+funden en intervalos disjuntos con un solo barrido; luego se recorren los
+tramos de atención de cada día (``CITAS_HORARIO``) buscando huecos donde
+quepa la duración pedida. Con los intervalos disjuntos, el primer intervalo
+que afecta a cada día se encuentra con bisect, así que pedir los próximos N
+huecos cuesta lo mismo aunque el horizonte sea de varios meses.
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from django.conf import settings
+
+from .store import LIMA_TZ
+
+# Lunes=0 ... Domingo=6 -> tramos de atención (hora local)
+HORARIO_DEFECTO = {
+    0: [('09:00', '13:00'), ('15:00', '19:00')],
+    1: [('09:00', '13:00'), ('15:00', '19:00')],
+    2: [('09:00', '13:00'), ('15:00', '19:00')],
+    3: [('09:00', '13:00'), ('15:00', '19:00')],
+    4: [('09:00', '13:00'), ('15:00', '19:00')],
+    5: [('09:00', '13:00')],
+}
+
+# Duración (minutos) de cada tipo de cita
+DURACIONES_DEFECTO = {
+    'consulta': 30,
+    'limpieza': 45,
+    'control': 30,
+    'ortodoncia': 30,
+    'curacion': 60,
+    'endodoncia': 90,
+    'extraccion': 60,
+}
+
+# Duración asumida para eventos sin hora de fin
+DURACION_EVENTO_SIN_FIN = timedelta(minutes=30)
+
+# Cuánto antes del inicio de la búsqueda se miran eventos que pueden seguir
+# ocupando tiempo (p. ej. unas vacaciones de todo el día de varias semanas)
+MARGEN_EVENTOS_PREVIOS = timedelta(days=31)
+
+
+def get_horario():
+    horario = getattr(settings, 'CITAS_HORARIO', HORARIO_DEFECTO)
+    resultado = {}
+    for dia, tramos in horario.items():
+        resultado[int(dia)] = [
+            (datetime.strptime(inicio, '%H:%M').time(), datetime.strptime(fin, '%H:%M').time())
+            for inicio, fin in tramos
+        ]
+    return resultado
+
+
+def get_duraciones():
+    return getattr(settings, 'CITAS_DURACIONES', DURACIONES_DEFECTO)
+
+
+def _intervalo(event):
+    """``(inicio, fin)`` en hora de Lima que ocupa ``event``."""
+    if event.all_day:
+        # DATE sin hora: se usan las fechas tal cual (``begin`` está en UTC y
+        # pasado a Lima caería el día anterior). DTEND no se incluye.
+        dia_inicio = event.begin.date()
+        dia_fin = event.end.date() if event.end else dia_inicio + timedelta(days=1)
+        if dia_fin <= dia_inicio:
+            dia_fin = dia_inicio + timedelta(days=1)
+        return (
+            LIMA_TZ.localize(datetime.combine(dia_inicio, datetime.min.time())),
+            LIMA_TZ.localize(datetime.combine(dia_fin, datetime.min.time())),
+        )
+    inicio = event.local_begin
+    return inicio, event.local_end or inicio + DURACION_EVENTO_SIN_FIN
+
+
+def intervalos_ocupados(events):
+    """
+    Funde los eventos en intervalos ``(inicio, fin)`` disjuntos y ordenados.
+    Los eventos de todo el día bloquean cada día local de ``[DTSTART,
+    DTEND)`` entero (feriados, vacaciones del dentista, ...).
+    """
+    # Los de todo el día vienen ordenados por su medianoche UTC, no por el
+    # inicio del día en Lima: se reordena antes de fundir
+    intervalos = sorted(
+        intervalo for intervalo in (_intervalo(event) for event in events if not event.cancelled)
+        if intervalo[1] > intervalo[0]
+    )
+    ocupados = []
+    for inicio, fin in intervalos:
+        if ocupados and inicio <= ocupados[-1][1]:
+            if fin > ocupados[-1][1]:
+                ocupados[-1] = (ocupados[-1][0], fin)
+        else:
+            ocupados.append((inicio, fin))
+    return ocupados
+
+
+def _redondear(momento, paso, base):
+    """Primer múltiplo de ``paso`` desde ``base`` que no es anterior a ``momento``."""
+    resto = (momento - base) % paso
+    return momento if not resto else momento + (paso - resto)
+
+
+def buscar_huecos(ocupados, duracion, desde, hasta, n=10, horario=None, paso=timedelta(minutes=15)):
+    """
+    Próximos ``n`` huecos libres de ``duracion`` entre ``desde`` y ``hasta``.
+
+    ``ocupados`` son intervalos disjuntos y ordenados (``intervalos_ocupados``).
+    Los inicios se alinean a ``paso`` dentro de cada tramo de atención.
+    Devuelve una lista de ``(inicio, fin)`` en hora de Lima.
+    """
+    horario = horario if horario is not None else get_horario()
+    fines = [fin for _inicio, fin in ocupados]
+    huecos = []
+
+    dia = desde.astimezone(LIMA_TZ).date()
+    ultimo_dia = hasta.astimezone(LIMA_TZ).date()
+    while dia <= ultimo_dia and len(huecos) < n:
+        for hora_inicio, hora_fin in horario.get(dia.weekday(), ()):
+            tramo_inicio = LIMA_TZ.localize(datetime.combine(dia, hora_inicio))
+            tramo_fin = min(LIMA_TZ.localize(datetime.combine(dia, hora_fin)), hasta)
+            cursor = _redondear(max(tramo_inicio, desde), paso, tramo_inicio)
+
+            # Primer intervalo ocupado que termina después del cursor
+            i = bisect_right(fines, cursor)
+            while cursor + duracion <= tramo_fin and len(huecos) < n:
+                if i < len(ocupados) and ocupados[i][0] < cursor + duracion:
+                    # Choca con una cita: saltar al final de esa cita
+                    cursor = _redondear(max(cursor, ocupados[i][1]), paso, tramo_inicio)
+                    i += 1
+                    continue
+                huecos.append((cursor, cursor + duracion))
+                cursor = _redondear(cursor + duracion, paso, tramo_inicio)
+            if len(huecos) >= n:
+                break
+        dia += timedelta(days=1)
+    return huecos
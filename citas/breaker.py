@@ -0,0 +1,98 @@
+# citas/breaker.py
+"""
+Circuit breaker para los feeds de calendario.
+
+El estado vive en la caché compartida, así que todos los procesos del
+servidor ven el mismo circuito:
+
+- cerrado: las descargas pasan normalmente; cada fallo suma 1.
+- abierto: tras ``failure_threshold`` fallos seguidos ya no se intenta
+  descargar durante ``recovery_timeout`` segundos; se sirven los datos en caché.
+- semiabierto: pasado ese tiempo se deja pasar una sola descarga de prueba.
+  Si funciona el circuito se cierra; si falla vuelve a abrirse.
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+
+from .locks import Candado
+
+logger = logging.getLogger(__name__)
+
+CERRADO = 'cerrado'
+ABIERTO = 'abierto'
+SEMIABIERTO = 'semiabierto'
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: no se intentó la descarga."""
+
+
+class CircuitBreaker:
+
+    def __init__(self, key, failure_threshold=3, recovery_timeout=120):
+        self.key = key
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        # Descarga de prueba en semiabierto (ver citas.locks)
+        self._prueba = Candado(self.probe_key, timeout=recovery_timeout)
+
+    @property
+    def probe_key(self):
+        return f'{self.key}:prueba'
+
+    def get_state(self):
+        return cache.get(self.key) or {'estado': CERRADO, 'fallos': 0, 'abierto_en': None}
+
+    def _set_state(self, state):
+        cache.set(self.key, state, timeout=None)
+
+    @property
+    def estado(self):
+        state = self.get_state()
+        if state['estado'] == ABIERTO and time.time() - state['abierto_en'] >= self.recovery_timeout:
+            return SEMIABIERTO
+        return state['estado']
+
+    def allow(self):
+        """True si se puede intentar la llamada ahora."""
+        state = self.get_state()
+        if state['estado'] == CERRADO:
+            return True
+        if time.time() - (state['abierto_en'] or 0) < self.recovery_timeout:
+            return False
+        # Semiabierto: solo un proceso hace la prueba
+        return self._prueba.adquirir()
+
+    def record_success(self):
+        state = self.get_state()
+        if state['estado'] != CERRADO or state['fallos']:
+            if state['estado'] != CERRADO:
+                logger.info(f"Circuito {self.key} cerrado de nuevo")
+            self._set_state({'estado': CERRADO, 'fallos': 0, 'abierto_en': None})
+        self._prueba.liberar()
+
+    def record_failure(self):
+        state = self.get_state()
+        fallos = state['fallos'] + 1
+        if state['estado'] != CERRADO or fallos >= self.failure_threshold:
+            logger.warning(f"Circuito {self.key} abierto tras {fallos} fallos")
+            state = {'estado': ABIERTO, 'fallos': fallos, 'abierto_en': time.time()}
+        else:
+            state = dict(state, fallos=fallos)
+        self._set_state(state)
+        self._prueba.liberar()
+
+    def call(self, funcion, *args, **kwargs):
+        """Ejecuta ``funcion`` a través del circuito (lanza ``CircuitOpenError`` si está abierto)."""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuito {self.key} abierto: se usan los datos en caché")
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return resultado
@@ -1,42 +1,26 @@
 # citas/context_processors.py
-from django.utils import timezone
-import pytz
-from datetime import timedelta
-from .utils import get_calendar_events
+from consultorio_dental.utils import context_processor_omitido, conteo_perezoso, lista_perezosa
+from .utils import get_event_index
 
 def citas_pendientes_hoy(request):
     """
     Context processor para mostrar citas pendientes del día actual.
     Solo muestra citas que aún no han pasado (futuras respecto a la hora actual).
+    El calendario solo se consulta si la plantilla usa las variables.
     """
-    citas_pendientes = []
-    
-    try:
-        # Obtener todos los eventos del calendario
-        all_events = get_calendar_events()
-        
-        # Configurar zona horaria
-        limatz = pytz.timezone('America/Lima')
-        now = timezone.now().astimezone(limatz)
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-        
-        # Filtrar eventos de hoy que aún no han pasado
-        for event in all_events:
-            event_local = event.local_begin
-            
-            # Solo eventos de hoy que son futuros (aún no han pasado)
-            if today_start <= event_local < today_end and event_local > now:
-                citas_pendientes.append(event)
-        
-        # Ordenar por hora
-        citas_pendientes.sort(key=lambda x: x.local_begin)
-        
-    except Exception as e:
-        print(f"Error obteniendo citas pendientes: {e}")
-        citas_pendientes = []
-    
+    if context_processor_omitido(request, 'citas_pendientes_hoy'):
+        return {}
+
+    def citas_pendientes():
+        try:
+            # Eventos de hoy que aún no han pasado (búsqueda binaria, ya ordenados por hora)
+            return get_event_index().pending_today()
+        except Exception as e:
+            print(f"Error obteniendo citas pendientes: {e}")
+            return []
+
+    citas_pendientes = lista_perezosa(citas_pendientes)
     return {
         'citas_pendientes_hoy': citas_pendientes,
-        'citas_pendientes_count': len(citas_pendientes)
+        'citas_pendientes_count': conteo_perezoso(citas_pendientes)
     }
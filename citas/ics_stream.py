@@ -0,0 +1,261 @@
+# citas/ics_stream.py
+"""
+Parser ICS en streaming limitado a una ventana de fechas.
+
+``ics.Calendar`` construye un objeto por cada VEVENT del feed, y el feed del
+consultorio crece sin límite. Este parser lee el texto línea por línea,
+guarda las líneas crudas de cada VEVENT y al cerrarlo mira solo su DTSTART:
+si cae fuera de la ventana el evento se descarta sin parsear nada más.
+
+Los eventos recurrentes (RRULE / RDATE) y sus instancias modificadas
+(RECURRENCE-ID) se conservan siempre, porque su primera fecha no dice si
+tienen ocurrencias dentro de la ventana; ``citas.recurrence`` los expande.
+"""
+
+from datetime import datetime, timedelta
+
+import pytz
+
+from .store import CalendarEvent
+
+# Propiedades que pueden aparecer varias veces en un mismo VEVENT
+_MULTI_VALUED = ('RDATE', 'EXDATE')
+
+_UNESCAPE = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+
+def _unfold(lines):
+    """Une las líneas plegadas (RFC 5545 §3.1): las que empiezan con espacio o tab."""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _split_property(line):
+    """'DTSTART;TZID=America/Lima:20261018T100000' -> ('DTSTART', {'TZID': ...}, '2026...')"""
+    head, sep, value = line.partition(':')
+    if not sep:
+        return line.upper(), {}, ''
+    name, *params = head.split(';')
+    parsed = {}
+    for param in params:
+        key, _, val = param.partition('=')
+        parsed[key.upper()] = val.strip('"')
+    return name.upper(), parsed, value
+
+
+def _unescape(value):
+    if '\\' not in value:
+        return value
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            nxt = next(chars, '')
+            out.append(_UNESCAPE.get(nxt, nxt))
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def parse_datetime(value, params):
+    """
+    Convierte un valor DATE / DATE-TIME de ICS a datetime con zona horaria.
+
+    Devuelve ``(datetime, es_fecha)``. Las fechas sin hora y las horas
+    flotantes se interpretan en UTC, igual que ``ics``.
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return pytz.utc.localize(datetime.strptime(value[:8], '%Y%m%d')), True
+    if value.endswith('Z'):
+        return pytz.utc.localize(datetime.strptime(value[:15], '%Y%m%dT%H%M%S')), False
+    naive = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    tzid = params.get('TZID')
+    if tzid:
+        try:
+            return pytz.timezone(tzid).localize(naive), False
+        except pytz.UnknownTimeZoneError:
+            pass
+    return pytz.utc.localize(naive), False
+
+
+def parse_date_list(value, params):
+    """Lista de fechas separadas por comas (EXDATE / RDATE)."""
+    if params.get('VALUE') == 'PERIOD':
+        # RDATE con periodos: solo interesa el inicio de cada periodo
+        value = ','.join(period.partition('/')[0] for period in value.split(','))
+    return [parse_datetime(item, params)[0] for item in value.split(',') if item.strip()]
+
+
+def parse_duration(value):
+    """Duración ICS simple (P1D, PT1H30M, -PT15M, P1W) a timedelta."""
+    value = value.strip()
+    sign = -1 if value.startswith('-') else 1
+    value = value.lstrip('+-').lstrip('P')
+    days = seconds = 0
+    number = ''
+    in_time = False
+    for char in value:
+        if char.isdigit():
+            number += char
+        elif char == 'T':
+            in_time = True
+        else:
+            n = int(number or 0)
+            number = ''
+            if char == 'W':
+                days += 7 * n
+            elif char == 'D':
+                days += n
+            elif char == 'H' and in_time:
+                seconds += 3600 * n
+            elif char == 'M' and in_time:
+                seconds += 60 * n
+            elif char == 'S' and in_time:
+                seconds += n
+    return sign * timedelta(days=days, seconds=seconds)
+
+
+def _build_event(props, multi):
+    """
+    Construye el CalendarEvent a partir de las propiedades ya separadas.
+    ``multi`` guarda todas las apariciones de las propiedades repetibles.
+    """
+    dtstart = props.get('DTSTART')
+    begin, all_day = parse_datetime(dtstart[1], dtstart[0])
+
+    end = None
+    if 'DTEND' in props:
+        end, _ = parse_datetime(props['DTEND'][1], props['DTEND'][0])
+    elif 'DURATION' in props:
+        end = begin + parse_duration(props['DURATION'][1])
+    elif all_day:
+        end = begin + timedelta(days=1)
+
+    sequence = 0
+    if 'SEQUENCE' in props:
+        try:
+            sequence = int(props['SEQUENCE'][1])
+        except ValueError:
+            pass
+
+    last_modified = None
+    if 'LAST-MODIFIED' in props:
+        last_modified, _ = parse_datetime(props['LAST-MODIFIED'][1], props['LAST-MODIFIED'][0])
+
+    def text(name):
+        return _unescape(props[name][1]) if name in props else ''
+
+    def dates(name):
+        return [d for params, value in multi.get(name, ()) for d in parse_date_list(value, params)]
+
+    recurrence_id = None
+    if 'RECURRENCE-ID' in props:
+        recurrence_id, _ = parse_datetime(props['RECURRENCE-ID'][1], props['RECURRENCE-ID'][0])
+
+    return CalendarEvent(
+        uid=text('UID'),
+        name=text('SUMMARY'),
+        begin=begin,
+        end=end,
+        description=text('DESCRIPTION'),
+        location=text('LOCATION'),
+        all_day=all_day,
+        sequence=sequence,
+        last_modified=last_modified,
+        status=text('STATUS'),
+        rrule=props['RRULE'][1] if 'RRULE' in props else '',
+        rdates=dates('RDATE'),
+        exdates=dates('EXDATE'),
+        recurrence_id=recurrence_id,
+    )
+
+
+def iter_vevents(lines):
+    """
+    Genera ``(líneas, dtstart, recurrente)`` por cada VEVENT del feed.
+
+    Las líneas ya vienen desplegadas; ``dtstart`` es la línea DTSTART cruda
+    para poder filtrar por fecha sin parsear el resto del evento.
+    """
+    event_lines = None
+    dtstart = None
+    recurring = False
+    nested = 0
+    for line in _unfold(lines):
+        if event_lines is None:
+            if line == 'BEGIN:VEVENT':
+                event_lines = []
+                dtstart = None
+                recurring = False
+            continue
+        first = line[:1]
+        if first == 'E' and line.startswith('END:'):
+            if line == 'END:VEVENT':
+                yield event_lines, dtstart, recurring
+                event_lines = None
+            else:
+                nested -= 1
+        elif first == 'B' and line.startswith('BEGIN:'):
+            nested += 1
+        elif not nested:
+            event_lines.append(line)
+            if first == 'D':
+                if dtstart is None and line.startswith('DTSTART'):
+                    dtstart = line
+            elif first == 'R' and line.startswith(('RRULE', 'RDATE', 'RECURRENCE-ID')):
+                recurring = True
+
+
+def parse_ics_window(lines, start=None, end=None):
+    """
+    Parsea un feed ICS y devuelve solo los eventos cuyo DTSTART cae en
+    ``[start, end)``, ordenados por ``local_begin``.
+
+    ``lines`` puede ser el texto completo o cualquier iterable de líneas
+    (por ejemplo ``response.iter_lines(decode_unicode=True)``).
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+
+    # Filtro barato por prefijo 'AAAAMMDD' con un día de margen por las zonas horarias
+    low = (start - timedelta(days=1)).strftime('%Y%m%d') if start else None
+    high = (end + timedelta(days=1)).strftime('%Y%m%d') if end else None
+
+    events = []
+    for event_lines, dtstart, recurring in iter_vevents(lines):
+        if dtstart is None:
+            continue
+
+        if not recurring:
+            day = dtstart.rpartition(':')[2][:8]
+            if (low and day < low) or (high and day > high):
+                continue
+
+        props = {}
+        multi = {}
+        for line in event_lines:
+            name, params, value = _split_property(line)
+            props.setdefault(name, (params, value))
+            if name in _MULTI_VALUED:
+                multi.setdefault(name, []).append((params, value))
+        try:
+            event = _build_event(props, multi)
+        except ValueError:
+            continue
+
+        if not recurring and ((start and event.begin < start) or (end and event.begin >= end)):
+            continue
+        events.append(event)
+
+    events.sort(key=lambda e: e.local_begin)
+    return events
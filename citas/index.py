@@ -0,0 +1,129 @@
+# citas/index.py
+"""
+Índice de eventos ordenados para consultas por rango con bisect.
+
+Los eventos de la instantánea ya vienen ordenados por ``local_begin``; el
+índice guarda en paralelo la lista de inicios y responde rangos, "hoy",
+"próximas N", etc. en O(log n + k) sin recorrer todo el calendario.
+También centraliza el cálculo de ventanas (semana, mes, ...) que antes
+repetía cada vista.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .store import LIMA_TZ
+
+
+def _inicio_mes(dia):
+    return dia.replace(day=1)
+
+
+def _mes_siguiente(dia):
+    if dia.month == 12:
+        return dia.replace(year=dia.year + 1, month=1, day=1)
+    return dia.replace(month=dia.month + 1, day=1)
+
+
+def _mes_anterior(dia):
+    if dia.month == 1:
+        return dia.replace(year=dia.year - 1, month=12, day=1)
+    return dia.replace(month=dia.month - 1, day=1)
+
+
+class EventIndex:
+    """Vista indexada (solo lectura) sobre una lista de eventos ordenada por ``local_begin``."""
+
+    def __init__(self, events):
+        self.events = events
+        self._inicios = [event.local_begin for event in events]
+        self._por_fuente = {}
+
+    def __len__(self):
+        return len(self.events)
+
+    @staticmethod
+    def now():
+        return timezone.now().astimezone(LIMA_TZ)
+
+    @staticmethod
+    def inicio_dia(dia):
+        """Medianoche (hora de Lima) del día ``dia`` (date o datetime)."""
+        if isinstance(dia, datetime):
+            dia = dia.astimezone(LIMA_TZ).date()
+        return LIMA_TZ.localize(datetime.combine(dia, time.min))
+
+    def for_source(self, source):
+        """Sub-índice con solo los eventos de un calendario (``None`` = todos)."""
+        if not source:
+            return self
+        if source not in self._por_fuente:
+            self._por_fuente[source] = EventIndex([e for e in self.events if e.source == source])
+        return self._por_fuente[source]
+
+    # --- Consultas básicas ---
+
+    def range(self, start, end):
+        """Eventos con ``start <= local_begin < end``."""
+        i = bisect_left(self._inicios, start)
+        j = bisect_left(self._inicios, end, lo=i)
+        return self.events[i:j]
+
+    def after(self, moment, n=None, inclusive=True):
+        """Los ``n`` primeros eventos que empiezan en/después de ``moment``."""
+        bisect = bisect_left if inclusive else bisect_right
+        i = bisect(self._inicios, moment)
+        return self.events[i:i + n] if n is not None else self.events[i:]
+
+    def on_day(self, dia):
+        inicio = self.inicio_dia(dia)
+        return self.range(inicio, inicio + timedelta(days=1))
+
+    # --- Ventanas de fechas usadas por las vistas ---
+
+    @classmethod
+    def bounds(cls, filtro, now=None):
+        """
+        ``(inicio, fin)`` del filtro de la lista de eventos: 'week' (lunes a
+        domingo), 'month', 'last_month' o 'next_3_months'. Cualquier otro
+        valor cae en el mes actual.
+        """
+        now = now or cls.now()
+        hoy = now.date()
+        if filtro == 'week':
+            lunes = hoy - timedelta(days=hoy.weekday())
+            return cls.inicio_dia(lunes), cls.inicio_dia(lunes + timedelta(days=7))
+        if filtro == 'last_month':
+            inicio_mes = _inicio_mes(hoy)
+            return cls.inicio_dia(_mes_anterior(inicio_mes)), cls.inicio_dia(inicio_mes)
+        if filtro == 'next_3_months':
+            inicio = cls.inicio_dia(hoy)
+            return inicio, inicio + timedelta(days=90)
+        inicio_mes = _inicio_mes(hoy)
+        return cls.inicio_dia(inicio_mes), cls.inicio_dia(_mes_siguiente(inicio_mes))
+
+    def today(self, now=None):
+        return self.on_day(now or self.now())
+
+    def week(self, now=None):
+        return self.range(*self.bounds('week', now))
+
+    def month(self, now=None):
+        return self.range(*self.bounds('month', now))
+
+    def filtered(self, filtro, now=None):
+        return self.range(*self.bounds(filtro, now))
+
+    def upcoming(self, n=5, now=None):
+        """Próximos ``n`` eventos a partir de ahora."""
+        return self.after(now or self.now(), n)
+
+    def pending_today(self, now=None):
+        """Eventos de hoy que todavía no empezaron."""
+        now = now or self.now()
+        fin = self.inicio_dia(now) + timedelta(days=1)
+        i = bisect_right(self._inicios, now)
+        j = bisect_left(self._inicios, fin, lo=i)
+        return self.events[i:j]
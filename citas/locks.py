@@ -0,0 +1,67 @@
+# citas/locks.py
+"""
+Candados entre procesos para el refresco del calendario.
+
+El candado del refresco (``CalendarStore.refresh``) y la descarga de prueba
+del circuit breaker se toman con ``cache.add``, que solo es atómico en
+cachés como Redis o Memcached. Con ``FileBasedCache`` (la de settings)
+``add`` lee y después escribe: dos procesos pueden ver la clave libre a la
+vez y los dos descargar el feed. Con esa caché el candado es un ``flock``
+sobre un archivo en el mismo directorio de la caché, que el sistema
+operativo garantiza exclusivo y suelta solo si el proceso muere.
+"""
+
+import hashlib
+import os
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: no hay flock, se usa cache.add
+    fcntl = None
+
+
+def _directorio_flock():
+    """Directorio de la ``FileBasedCache`` por defecto, o None si hay que usar ``cache.add``."""
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if fcntl is None or not isinstance(backend, FileBasedCache):
+        return None
+    return backend._dir
+
+
+class Candado:
+    """
+    Candado con nombre ``key``. ``timeout`` (segundos) solo aplica con
+    ``cache.add``: es lo que dura la clave si el proceso muere sin soltarla.
+    """
+
+    def __init__(self, key, timeout):
+        self.key = key
+        self.timeout = timeout
+        self._archivo = None
+
+    def adquirir(self):
+        """True si se tomó el candado; no espera."""
+        directorio = _directorio_flock()
+        if directorio is None:
+            return cache.add(self.key, 1, timeout=self.timeout)
+        os.makedirs(directorio, exist_ok=True)
+        nombre = hashlib.md5(self.key.encode()).hexdigest() + '.lock'
+        archivo = open(os.path.join(directorio, nombre), 'a')
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            return False
+        self._archivo = archivo
+        return True
+
+    def liberar(self):
+        if self._archivo is not None:
+            fcntl.flock(self._archivo, fcntl.LOCK_UN)
+            self._archivo.close()
+            self._archivo = None
+        elif _directorio_flock() is None:
+            cache.delete(self.key)
@@ -0,0 +1,83 @@
+# citas/management/commands/benchmark_calendario.py
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from django.core.management.base import BaseCommand
+
+from citas.ics_stream import parse_ics_window
+from citas.store import parse_ics
+
+
+def generar_feed(num_eventos, anios=8, semilla=42):
+    """Genera un feed ICS sintético con eventos repartidos en los últimos ``anios``."""
+    rnd = random.Random(semilla)
+    hoy = datetime.now(pytz.utc).replace(minute=0, second=0, microsecond=0)
+    lineas = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Consultorio//Benchmark//ES']
+    for i in range(num_eventos):
+        inicio = hoy - timedelta(days=rnd.randint(-120, anios * 365), hours=rnd.randint(0, 10))
+        fin = inicio + timedelta(minutes=rnd.choice([30, 45, 60]))
+        lineas += [
+            'BEGIN:VEVENT',
+            f'UID:bench-{i}@consultorio',
+            f'DTSTART:{inicio:%Y%m%dT%H%M%SZ}',
+            f'DTEND:{fin:%Y%m%dT%H%M%SZ}',
+            f'DTSTAMP:{hoy:%Y%m%dT%H%M%SZ}',
+            f'LAST-MODIFIED:{inicio:%Y%m%dT%H%M%SZ}',
+            'SEQUENCE:0',
+            f'SUMMARY:Paciente {i} - Control',
+            'DESCRIPTION:Control de ortodoncia\\, traer radiografía',
+            'LOCATION:Consultorio 1',
+            'STATUS:CONFIRMED',
+            'END:VEVENT',
+        ]
+    lineas.append('END:VCALENDAR')
+    return '\r\n'.join(lineas) + '\r\n'
+
+
+def medir(funcion, repeticiones):
+    mejor = None
+    resultado = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = funcion()
+        transcurrido = time.perf_counter() - t0
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, resultado
+
+
+class Command(BaseCommand):
+    help = 'Compara el parser ICS en streaming (ventana ±N días) con el parser completo de ics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--eventos', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--ventana', type=int, default=90, help='Días a cada lado de hoy')
+        parser.add_argument('--repeticiones', type=int, default=3)
+        parser.add_argument('--sin-ics', action='store_true', help='No medir el parser de ics (lento)')
+        parser.add_argument(
+            '--max-ics', type=int, default=None,
+            help='Feeds más grandes no se parsean con ics (por defecto se miden todos; 100k tarda minutos)',
+        )
+
+    def handle(self, *args, **options):
+        hoy = datetime.now(pytz.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        ventana = timedelta(days=options['ventana'])
+        inicio, fin = hoy - ventana, hoy + ventana
+
+        for num in options['eventos']:
+            texto = generar_feed(num)
+            self.stdout.write(f"\nFeed sintético: {num} eventos ({len(texto) / 1024 / 1024:.1f} MB)")
+
+            t_stream, eventos = medir(lambda: parse_ics_window(texto, inicio, fin), options['repeticiones'])
+            self.stdout.write(f"  streaming ±{options['ventana']} días: {t_stream * 1000:9.1f} ms  ({len(eventos)} eventos)")
+
+            if options['sin_ics']:
+                continue
+            if options['max_ics'] is not None and num > options['max_ics']:
+                self.stdout.write(f"  ics (feed completo):    no medido (más de --max-ics {options['max_ics']} eventos)")
+                continue
+            t_ics, todos = medir(lambda: parse_ics(texto), 1)
+            en_ventana = sum(1 for e in todos if inicio <= e.begin < fin)
+            self.stdout.write(f"  ics (feed completo):    {t_ics * 1000:9.1f} ms  ({len(todos)} eventos, {en_ventana} en la ventana)")
+            self.stdout.write(self.style.SUCCESS(f"  → {t_ics / t_stream:.1f}x más rápido"))
@@ -0,0 +1,62 @@
+# citas/management/commands/sincronizar_citas.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from citas.store import fuentes_sincronizables, get_store
+from citas.sync import sincronizar_eventos
+
+
+class Command(BaseCommand):
+    help = 'Descarga el calendario ICS y sincroniza la tabla de citas (CitaEvento)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Ignora ETag/Last-Modified y descarga el feed completo',
+        )
+        parser.add_argument(
+            '--cada',
+            type=int,
+            metavar='SEGUNDOS',
+            help='Repite la sincronización cada SEGUNDOS sin terminar (p. ej. como always-on task)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['cada']:
+            self.sincronizar(options['completo'])
+            return
+        while True:
+            inicio = time.monotonic()
+            # Proceso largo: no reutilizar una conexión que la BD ya cerró
+            close_old_connections()
+            try:
+                self.sincronizar(options['completo'])
+            except Exception as e:
+                # Un fallo (BD bloqueada, etc.) no detiene el bucle
+                self.stderr.write(self.style.ERROR(f"Error sincronizando citas: {e}"))
+            time.sleep(max(0, options['cada'] - (time.monotonic() - inicio)))
+
+    def sincronizar(self, completo):
+        store = get_store()
+        if store.refresh(force=completo, notify=False):
+            self.stdout.write('Feed descargado: instantánea nueva.')
+        else:
+            self.stdout.write('Feed sin cambios (o no disponible): se usa la última instantánea.')
+
+        meta = store.get_meta()
+        for source in store.sources:
+            info = (meta.get('sources') or {}).get(source.id, {})
+            if info.get('error'):
+                self.stdout.write(self.style.WARNING(f"  {source.nombre}: {info['error']}"))
+        resultado = sincronizar_eventos(
+            store.get_events(),
+            ventana=meta.get('window'),
+            calendarios=fuentes_sincronizables(meta),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Citas sincronizadas (creadas: {resultado['creados']}, "
+            f"actualizadas: {resultado['actualizados']}, eliminadas: {resultado['eliminados']})"
+        ))
@@ -0,0 +1,12 @@
+# citas/management/commands/vincular_citas.py
+from django.core.management.base import BaseCommand
+
+from citas.sync import vincular_citas
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a vincular las citas del calendario con los pacientes (por DNI o nombre)'
+
+    def handle(self, *args, **options):
+        cambiados = vincular_citas()
+        self.stdout.write(self.style.SUCCESS(f"✓ Citas con vínculo actualizado: {cambiados}"))
@@ -0,0 +1,87 @@
+# citas/matcher.py
+"""
+Vinculación de citas del calendario con pacientes.
+
+Los eventos del calendario son texto libre ("Juan Pérez - control", "Cita
+DNI 12345678", ...). ``PacienteMatcher`` carga una sola vez los nombres y
+DNI de todos los pacientes en diccionarios normalizados y resuelve los
+eventos en bloque durante la sincronización, no en cada vista.
+"""
+
+import re
+
+from pacientes.busqueda import normalizar
+from pacientes.models import Paciente
+
+VINCULO_DNI = 'dni'
+VINCULO_NOMBRE = 'nombre'
+VINCULO_MANUAL = 'manual'
+
+_DNI_RE = re.compile(r'(?<!\d)(\d{8})(?!\d)')
+
+# Un solo nombre ("Juan") es demasiado ambiguo para vincular
+MIN_PALABRAS = 2
+
+
+def _clave(palabras):
+    # Independiente del orden: 'perez juan' == 'juan perez'
+    return ' '.join(sorted(palabras))
+
+
+class PacienteMatcher:
+    """Índice en memoria de nombres normalizados y DNI de los pacientes."""
+
+    def __init__(self, pacientes):
+        """``pacientes``: iterable de ``(pk, nombre_completo, dni)``."""
+        self.por_dni = {}
+        self.por_nombre = {}
+        ambiguos = set()
+        self.max_palabras = MIN_PALABRAS
+        for pk, nombre, dni in pacientes:
+            if dni:
+                self.por_dni[dni.strip()] = pk
+            palabras = normalizar(nombre).split()
+            if len(palabras) < MIN_PALABRAS:
+                continue
+            clave = _clave(palabras)
+            if clave in self.por_nombre and self.por_nombre[clave] != pk:
+                # Dos pacientes con el mismo nombre: solo se vinculan por DNI
+                ambiguos.add(clave)
+            self.por_nombre[clave] = pk
+            self.max_palabras = max(self.max_palabras, len(palabras))
+        for clave in ambiguos:
+            del self.por_nombre[clave]
+
+    @classmethod
+    def desde_bd(cls):
+        return cls(Paciente.objects.values_list('pk', 'nombre_completo', 'dni').iterator())
+
+    def buscar_dni(self, texto):
+        for dni in _DNI_RE.findall(texto or ''):
+            if dni in self.por_dni:
+                return self.por_dni[dni]
+        return None
+
+    def buscar_nombre(self, texto):
+        """Busca el nombre de paciente más largo contenido en ``texto``."""
+        palabras = normalizar(texto).split()
+        for largo in range(min(self.max_palabras, len(palabras)), MIN_PALABRAS - 1, -1):
+            for inicio in range(len(palabras) - largo + 1):
+                pk = self.por_nombre.get(_clave(palabras[inicio:inicio + largo]))
+                if pk is not None:
+                    return pk
+        return None
+
+    def resolver(self, titulo, descripcion=''):
+        """
+        ``(paciente_id, vinculo)`` para un evento, o ``(None, '')``.
+        Prioridad: DNI en título o descripción, nombre en el título y
+        por último nombre en la descripción.
+        """
+        pk = self.buscar_dni(titulo) or self.buscar_dni(descripcion)
+        if pk is not None:
+            return pk, VINCULO_DNI
+        pk = self.buscar_nombre(titulo) or self.buscar_nombre(descripcion)
+        if pk is not None:
+            return pk, VINCULO_NOMBRE
+        return None, ''
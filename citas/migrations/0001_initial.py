@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CitaEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uid', models.CharField(max_length=255, unique=True, verbose_name='UID del evento (ICS)')),
+                ('titulo', models.CharField(blank=True, max_length=255, verbose_name='Título')),
+                ('descripcion', models.TextField(blank=True, verbose_name='Descripción')),
+                ('ubicacion', models.CharField(blank=True, max_length=255, verbose_name='Ubicación')),
+                ('inicio', models.DateTimeField(verbose_name='Inicio')),
+                ('fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('todo_el_dia', models.BooleanField(default=False, verbose_name='Todo el día')),
+                ('secuencia', models.IntegerField(default=0, verbose_name='SEQUENCE')),
+                ('ultima_modificacion', models.DateTimeField(blank=True, null=True, verbose_name='LAST-MODIFIED')),
+                ('sincronizado_en', models.DateTimeField(auto_now=True, verbose_name='Última sincronización')),
+            ],
+            options={
+                'verbose_name': 'Cita (calendario)',
+                'verbose_name_plural': 'Citas (calendario)',
+                'ordering': ['inicio'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='citaevento',
+            index=models.Index(fields=['inicio'], name='citas_evento_inicio_idx'),
+        ),
+    ]
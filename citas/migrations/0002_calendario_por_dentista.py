@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('citas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citaevento',
+            name='calendario',
+            field=models.CharField(default='principal', help_text='Id de la fuente en CITAS_CALENDARIOS (un calendario por dentista)', max_length=50, verbose_name='Calendario'),
+        ),
+        migrations.AlterField(
+            model_name='citaevento',
+            name='uid',
+            field=models.CharField(max_length=255, verbose_name='UID del evento (ICS)'),
+        ),
+        migrations.AddIndex(
+            model_name='citaevento',
+            index=models.Index(fields=['calendario', 'inicio'], name='citas_evento_cal_inicio_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='citaevento',
+            constraint=models.UniqueConstraint(fields=('calendario', 'uid'), name='citas_evento_calendario_uid_uniq'),
+        ),
+    ]
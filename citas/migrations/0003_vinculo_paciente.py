@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 12:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0003_alter_tokenfichapaciente_token'),
+        ('citas', '0002_calendario_por_dentista'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='citaevento',
+            name='paciente',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='citas', to='pacientes.paciente', verbose_name='Paciente'),
+        ),
+        migrations.AddField(
+            model_name='citaevento',
+            name='vinculo',
+            field=models.CharField(blank=True, choices=[('dni', 'Por DNI'), ('nombre', 'Por nombre'), ('manual', 'Manual')], help_text='Cómo se vinculó la cita con el paciente (las manuales no se recalculan)', max_length=10, verbose_name='Vinculado'),
+        ),
+        migrations.AddIndex(
+            model_name='citaevento',
+            index=models.Index(fields=['paciente', 'inicio'], name='citas_evento_pac_inicio_idx'),
+        ),
+    ]
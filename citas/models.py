@@ -1,3 +1,125 @@
+# citas/models.py
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class CitaEvento(models.Model):
+    """
+    Copia local de un evento del calendario ICS.
+
+    Se sincroniza de forma incremental desde el feed (ver ``citas.sync`` y el
+    comando ``sincronizar_citas``) para que los filtros por fecha sean
+    consultas indexadas en lugar de recorrer todos los eventos del
+    calendario en Python.
+    """
+    calendario = models.CharField(
+        max_length=50,
+        default='principal',
+        verbose_name="Calendario",
+        help_text="Id de la fuente en CITAS_CALENDARIOS (un calendario por dentista)"
+    )
+    uid = models.CharField(
+        max_length=255,
+        verbose_name="UID del evento (ICS)"
+    )
+    titulo = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Título"
+    )
+    descripcion = models.TextField(
+        blank=True,
+        verbose_name="Descripción"
+    )
+    ubicacion = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Ubicación"
+    )
+    inicio = models.DateTimeField(
+        verbose_name="Inicio"
+    )
+    fin = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="Fin"
+    )
+    todo_el_dia = models.BooleanField(
+        default=False,
+        verbose_name="Todo el día"
+    )
+    secuencia = models.IntegerField(
+        default=0,
+        verbose_name="SEQUENCE"
+    )
+    ultima_modificacion = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="LAST-MODIFIED"
+    )
+    VINCULO_CHOICES = [
+        ('dni', 'Por DNI'),
+        ('nombre', 'Por nombre'),
+        ('manual', 'Manual'),
+    ]
+    paciente = models.ForeignKey(
+        'pacientes.Paciente',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='citas',
+        verbose_name="Paciente"
+    )
+    vinculo = models.CharField(
+        max_length=10,
+        choices=VINCULO_CHOICES,
+        blank=True,
+        verbose_name="Vinculado",
+        help_text="Cómo se vinculó la cita con el paciente (las manuales no se recalculan)"
+    )
+    sincronizado_en = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Última sincronización"
+    )
+
+    class Meta:
+        verbose_name = "Cita (calendario)"
+        verbose_name_plural = "Citas (calendario)"
+        ordering = ['inicio']
+        indexes = [
+            models.Index(fields=['inicio'], name='citas_evento_inicio_idx'),
+            models.Index(fields=['calendario', 'inicio'], name='citas_evento_cal_inicio_idx'),
+            models.Index(fields=['paciente', 'inicio'], name='citas_evento_pac_inicio_idx'),
+        ]
+        constraints = [
+            # El mismo UID puede aparecer en los calendarios de dos dentistas
+            models.UniqueConstraint(fields=['calendario', 'uid'], name='citas_evento_calendario_uid_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.titulo} - {timezone.localtime(self.inicio).strftime('%d/%m/%Y %H:%M')}"
+
+    # Mismos nombres que los eventos del feed para reutilizar las plantillas
+    @property
+    def name(self):
+        return self.titulo
+
+    @property
+    def description(self):
+        return self.descripcion
+
+    @property
+    def location(self):
+        return self.ubicacion
+
+    @property
+    def source(self):
+        return self.calendario
+
+    @property
+    def local_begin(self):
+        return timezone.localtime(self.inicio)
+
+    @property
+    def local_end(self):
+        return timezone.localtime(self.fin) if self.fin else None
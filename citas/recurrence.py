@@ -0,0 +1,232 @@
+# citas/recurrence.py
+"""
+Expansión de eventos recurrentes (RRULE / RDATE / EXDATE / RECURRENCE-ID).
+
+Los controles periódicos (ortodoncia, etc.) llegan en el feed como un solo
+VEVENT con su regla. ``OccurrenceExpander`` genera las ocurrencias reales
+dentro de una ventana usando ``dateutil.rrule`` y memoriza, por serie, los
+intervalos ya expandidos: si se pide una ventana que se solapa con otra ya
+calculada, solo se expanden los tramos que faltan.
+"""
+
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, time
+
+import pytz
+from dateutil.rrule import rruleset, rrulestr
+
+from .store import CalendarEvent
+
+
+def _zona(dt):
+    """Zona horaria en la que se deben calcular las repeticiones de la serie."""
+    tz = dt.tzinfo
+    zone = getattr(tz, 'zone', None)
+    return pytz.timezone(zone) if zone else tz
+
+
+def _a_local(dt, tz):
+    return dt.astimezone(tz).replace(tzinfo=None)
+
+
+def _localizar(naive, tz):
+    return tz.localize(naive) if hasattr(tz, 'localize') else naive.replace(tzinfo=tz)
+
+
+def _regla_local(rrule, tz):
+    """
+    Reescribe UNTIL en hora local sin zona.
+
+    dateutil no acepta un UNTIL en UTC con un DTSTART sin zona, y la regla se
+    evalúa en hora local para respetar los cambios de horario.
+    """
+    from .ics_stream import parse_datetime
+
+    partes = []
+    for parte in rrule.split(';'):
+        clave, _, valor = parte.partition('=')
+        if clave.upper() == 'UNTIL':
+            until, es_fecha = parse_datetime(valor, {})
+            if es_fecha:
+                until = datetime.combine(until.date(), time(23, 59, 59))
+            elif valor.strip().endswith('Z'):
+                until = _a_local(until, tz)
+            else:
+                until = until.replace(tzinfo=None)
+            valor = until.strftime('%Y%m%dT%H%M%S')
+        partes.append(f'{clave}={valor}')
+    return ';'.join(partes)
+
+
+def _sello(dt):
+    return dt.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _instancia(master, begin, original=None):
+    """Copia de ``master`` para una ocurrencia concreta de la serie."""
+    original = original or begin
+    duracion = master.end - master.begin if master.end else None
+    return CalendarEvent(
+        uid=f'{master.uid}/{_sello(original)}',
+        name=master.name,
+        begin=begin,
+        end=begin + duracion if duracion is not None else None,
+        description=master.description,
+        location=master.location,
+        all_day=master.all_day,
+        sequence=master.sequence,
+        last_modified=master.last_modified,
+        status=master.status,
+        recurrence_id=original,
+        source=master.source,
+    )
+
+
+def _tramos_faltantes(cubiertos, start, end):
+    """Partes de ``[start, end)`` que no están en los intervalos ``cubiertos`` (ordenados)."""
+    faltan = []
+    cursor = start
+    for a, b in cubiertos:
+        if b <= cursor:
+            continue
+        if a >= end:
+            break
+        if a > cursor:
+            faltan.append((cursor, a))
+        cursor = max(cursor, b)
+        if cursor >= end:
+            break
+    if cursor < end:
+        faltan.append((cursor, end))
+    return faltan
+
+
+def _unir_intervalos(intervalos):
+    unidos = []
+    for a, b in sorted(intervalos):
+        if unidos and a <= unidos[-1][1]:
+            unidos[-1] = (unidos[-1][0], max(unidos[-1][1], b))
+        else:
+            unidos.append((a, b))
+    return unidos
+
+
+class OccurrenceExpander:
+    """
+    Expande series recurrentes con memoización por (UID, ventana).
+
+    Por cada serie (fuente, UID) se guardan las fechas de inicio ya calculadas y los
+    intervalos que cubren; la entrada se invalida sola si cambia la regla,
+    SEQUENCE, LAST-MODIFIED o las fechas extra/excluidas.
+    """
+
+    def __init__(self, max_series=2000):
+        self.max_series = max_series
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self.hits = self.misses = 0
+
+    def occurrences(self, master, start=None, end=None):
+        """Inicios de las ocurrencias de ``master`` en ``[start, end)``, ordenados."""
+        start = start or master.begin
+        if end is None or start >= end:
+            return []
+
+        firma = (
+            master.sequence, master.last_modified, master.rrule,
+            master.rdates, master.exdates, master.begin,
+        )
+        with self._lock:
+            clave = (master.source, master.uid)
+            entrada = self._series.get(clave)
+            if entrada is None or entrada['firma'] != firma:
+                entrada = {'firma': firma, 'cubiertos': [], 'inicios': []}
+                self._series[clave] = entrada
+            self._series.move_to_end(clave)
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+
+            faltan = _tramos_faltantes(entrada['cubiertos'], start, end)
+            if faltan:
+                self.misses += 1
+                nuevos = set(entrada['inicios'])
+                for a, b in faltan:
+                    nuevos.update(self._calcular(master, a, b))
+                entrada['inicios'] = sorted(nuevos)
+                entrada['cubiertos'] = _unir_intervalos(entrada['cubiertos'] + faltan)
+            else:
+                self.hits += 1
+
+            inicios = entrada['inicios']
+            return inicios[bisect_left(inicios, start):bisect_left(inicios, end)]
+
+    def _calcular(self, master, start, end):
+        tz = _zona(master.begin)
+        inicio_local = _a_local(master.begin, tz)
+
+        serie = rruleset()
+        if master.rrule:
+            serie.rrule(rrulestr(_regla_local(master.rrule, tz), dtstart=inicio_local))
+        else:
+            # Solo RDATE: DTSTART siempre es la primera ocurrencia
+            serie.rdate(inicio_local)
+        for fecha in master.rdates:
+            serie.rdate(_a_local(fecha, tz))
+        for fecha in master.exdates:
+            serie.exdate(_a_local(fecha, tz))
+
+        fechas = serie.between(_a_local(start, tz), _a_local(end, tz), inc=True)
+        return [d for d in (_localizar(f, tz) for f in fechas) if start <= d < end]
+
+    def expand(self, events, start=None, end=None):
+        """
+        Reemplaza cada serie recurrente por sus ocurrencias en ``[start, end)``.
+
+        Las instancias modificadas (RECURRENCE-ID) sustituyen a la ocurrencia
+        original; los eventos simples se devuelven tal cual. El resultado se
+        ordena por ``local_begin``. ``start=None`` expande desde el inicio de
+        cada serie.
+        """
+        simples = []
+        series = []
+        modificadas = {}
+        for event in events:
+            if event.recurrence_id is not None:
+                modificadas.setdefault((event.source, event.uid), {})[event.recurrence_id] = event
+            elif event.is_recurring:
+                series.append(event)
+            else:
+                simples.append(event)
+
+        resultado = simples
+        for master in series:
+            movidas = modificadas.pop((master.source, master.uid), {})
+            for begin in self.occurrences(master, start, end):
+                if begin not in movidas:
+                    resultado.append(_instancia(master, begin))
+            for original, event in movidas.items():
+                if (start is None or event.begin >= start) and (end is None or event.begin < end):
+                    # Conserva los datos propios de la instancia modificada
+                    instancia = _instancia(event, event.begin, original)
+                    instancia.sequence = max(event.sequence, master.sequence)
+                    resultado.append(instancia)
+
+        # Instancias modificadas cuya serie no vino en el feed
+        for movidas in modificadas.values():
+            for original, event in movidas.items():
+                if (start is None or event.begin >= start) and (end is None or event.begin < end):
+                    resultado.append(_instancia(event, event.begin, original))
+
+        resultado.sort(key=lambda e: e.local_begin)
+        return resultado
+
+
+expander = OccurrenceExpander()
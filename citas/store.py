@@ -0,0 +1,546 @@
+# citas/store.py
+"""
+Almacén de eventos del calendario con refresco en segundo plano.
+
+Las vistas nunca esperan a Google: leen la última instantánea guardada en la
+caché compartida y, si está vencida, se lanza un refresco en un hilo aparte.
+El refresco usa GET condicional (ETag / If-Modified-Since) y, si el feed no
+responde, se sigue sirviendo la última instantánea buena.
+
+Cada dentista tiene su propio calendario (``CalendarSource``): las fuentes se
+descargan en paralelo con un pool de hilos acotado y se mezclan en una sola
+lista ordenada; cada evento lleva el id de su fuente en ``source``.
+
+El refresco solo toca la caché. La tabla ``CitaEvento`` se sincroniza con
+``manage.py sincronizar_citas`` (un único proceso, p. ej. desde cron), no
+desde los hilos de refresco de cada worker web.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import pytz
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from .breaker import CircuitOpenError
+from .locks import Candado
+
+logger = logging.getLogger(__name__)
+
+LIMA_TZ = pytz.timezone('America/Lima')
+
+DEFAULT_ICS_URL = "https://calendar.google.com/calendar/ical/juancarloscn%40gmail.com/private-7c3dfb4a8b649579159a76228916d6cf/basic.ics"
+
+DEFAULT_SOURCE_ID = 'principal'
+
+
+class CalendarEvent:
+    """
+    Evento ya procesado y listo para las plantillas.
+
+    Expone los mismos atributos que usaban las plantillas con ``ics.Event``
+    (name, description, location, local_begin) pero es liviano y se puede
+    guardar en la caché sin arrastrar el objeto completo de ``ics``.
+    """
+
+    __slots__ = (
+        'uid', 'name', 'description', 'location', 'begin', 'end', 'all_day', 'local_begin',
+        'sequence', 'last_modified', 'status', 'rrule', 'rdates', 'exdates', 'recurrence_id',
+        'source',
+    )
+
+    def __init__(self, uid, name, begin, end=None, description='', location='', all_day=False,
+                 sequence=0, last_modified=None, status='', rrule='', rdates=(), exdates=(),
+                 recurrence_id=None, source=DEFAULT_SOURCE_ID):
+        self.uid = uid
+        self.name = name or ''
+        self.description = description or ''
+        self.location = location or ''
+        self.begin = begin
+        self.end = end
+        self.all_day = all_day
+        self.local_begin = begin.astimezone(LIMA_TZ)
+        self.sequence = sequence
+        self.last_modified = last_modified
+        self.status = (status or '').upper()
+        # Recurrencia (RFC 5545): regla, fechas extra/excluidas y, en las
+        # instancias modificadas o expandidas, la fecha original de la serie
+        self.rrule = rrule or ''
+        self.rdates = tuple(rdates)
+        self.exdates = tuple(exdates)
+        self.recurrence_id = recurrence_id
+        # Id del calendario (CalendarSource) del que viene el evento
+        self.source = source
+
+    def __repr__(self):
+        return f"<CalendarEvent {self.uid} {self.local_begin:%Y-%m-%d %H:%M} {self.name!r}>"
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        self.source = DEFAULT_SOURCE_ID
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    @property
+    def local_end(self):
+        return self.end.astimezone(LIMA_TZ) if self.end else None
+
+    @property
+    def cancelled(self):
+        return self.status == 'CANCELLED'
+
+    @property
+    def is_recurring(self):
+        return bool(self.rrule or self.rdates)
+
+    @classmethod
+    def from_ics(cls, event):
+        """Convierte un ``ics.Event`` en ``CalendarEvent``."""
+        begin = event.begin.datetime if hasattr(event.begin, 'datetime') else event.begin
+        if begin.tzinfo is None:
+            begin = pytz.utc.localize(begin)
+        end = None
+        if event.end is not None:
+            end = event.end.datetime if hasattr(event.end, 'datetime') else event.end
+            if end.tzinfo is None:
+                end = pytz.utc.localize(end)
+        from .ics_stream import parse_date_list, parse_datetime
+
+        sequence = 0
+        rrule = ''
+        rdates = []
+        exdates = []
+        recurrence_id = None
+        for line in event.extra:
+            params = {key: values[0] for key, values in line.params.items() if values}
+            if line.name == 'SEQUENCE':
+                try:
+                    sequence = int(line.value)
+                except ValueError:
+                    pass
+            elif line.name == 'RRULE':
+                rrule = line.value
+            elif line.name == 'RDATE':
+                rdates += parse_date_list(line.value, params)
+            elif line.name == 'EXDATE':
+                exdates += parse_date_list(line.value, params)
+            elif line.name == 'RECURRENCE-ID':
+                recurrence_id, _ = parse_datetime(line.value, params)
+        last_modified = event.last_modified.datetime if event.last_modified is not None else None
+        return cls(
+            uid=event.uid,
+            name=event.name,
+            begin=begin,
+            end=end,
+            description=event.description,
+            location=event.location,
+            all_day=event.all_day,
+            sequence=sequence,
+            last_modified=last_modified,
+            status=event.status,
+            rrule=rrule,
+            rdates=rdates,
+            exdates=exdates,
+            recurrence_id=recurrence_id,
+        )
+
+
+def parse_ics(text):
+    """Parsea el texto ICS y devuelve la lista de eventos ordenada por fecha."""
+    from ics import Calendar
+
+    events = [CalendarEvent.from_ics(event) for event in Calendar(text).events]
+    events.sort(key=lambda e: e.local_begin)
+    return events
+
+
+class CalendarSource:
+    """Un feed ICS (normalmente el calendario de un dentista o sillón)."""
+
+    def __init__(self, id, url, nombre='', timeout=None):
+        self.id = id
+        self.url = url
+        self.nombre = nombre or id
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"<CalendarSource {self.id} {self.nombre!r}>"
+
+    @classmethod
+    def from_setting(cls, value, default_timeout=None):
+        """Acepta un dict de ``CITAS_CALENDARIOS`` (id, url, nombre, timeout)."""
+        return cls(
+            id=value['id'],
+            url=value['url'],
+            nombre=value.get('nombre', ''),
+            timeout=value.get('timeout', default_timeout),
+        )
+
+
+class CalendarStore:
+    """
+    Instantánea compartida de uno o varios feeds ICS.
+
+    En la caché se guardan ``<key>:meta`` (pequeña: versión, validadores HTTP
+    de cada fuente y hora del último intento), ``<key>:events`` (la lista ya
+    mezclada y ordenada) y ``<key>:events:<fuente>`` (los eventos de cada
+    fuente, para reutilizarlos cuando esa fuente responde 304 o falla). Cada
+    proceso recuerda la última versión que deserializó, así que en el caso
+    normal solo se lee la clave pequeña.
+    """
+
+    def __init__(self, sources, cache_key='citas:calendar', refresh_interval=300, timeout=10,
+                 connect_timeout=3, window_days=None, recurrence_horizon_days=365, max_workers=4,
+                 failure_threshold=3, recovery_timeout=120, on_update=None):
+        self.sources = list(sources)
+        self.cache_key = cache_key
+        self.refresh_interval = refresh_interval
+        # Timeout de lectura por defecto de cada fuente (cada CalendarSource puede fijar el suyo)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        # Circuit breaker por fuente (ver citas.breaker)
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        # Con window_days se usa el parser en streaming y solo se guardan
+        # los eventos a ±window_days de hoy (None = feed completo con ``ics``)
+        self.window_days = window_days
+        # Sin ventana, las series recurrentes se expanden hasta hoy + este horizonte
+        self.recurrence_horizon_days = recurrence_horizon_days
+        self.max_workers = max_workers
+        # Callbacks llamados con (eventos, meta) cada vez que hay instantánea nueva
+        self.on_update = list(on_update or [])
+        self._local_version = None
+        self._local_events = []
+        self._index = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    @property
+    def meta_key(self):
+        return f'{self.cache_key}:meta'
+
+    @property
+    def events_key(self):
+        return f'{self.cache_key}:events'
+
+    @property
+    def lock_key(self):
+        return f'{self.cache_key}:lock'
+
+    def source_events_key(self, source_id):
+        return f'{self.cache_key}:events:{source_id}'
+
+    def source_timeout(self, source):
+        return source.timeout or self.timeout
+
+    def breaker(self, source):
+        from .breaker import CircuitBreaker
+
+        return CircuitBreaker(
+            f'{self.cache_key}:breaker:{source.id}',
+            failure_threshold=self.failure_threshold,
+            recovery_timeout=self.recovery_timeout,
+        )
+
+    def get_source(self, source_id):
+        for source in self.sources:
+            if source.id == source_id:
+                return source
+        return None
+
+    def get_meta(self):
+        return cache.get(self.meta_key) or {}
+
+    def refresh_if_stale(self, meta=None):
+        """Programa un refresco en segundo plano si la instantánea está vencida."""
+        if meta is None:
+            meta = self.get_meta()
+        checked_at = meta.get('checked_at')
+        if checked_at is None or time.time() - checked_at >= self.refresh_interval:
+            self.refresh_async()
+        return meta
+
+    def get_events(self):
+        """
+        Devuelve la última instantánea disponible sin bloquear.
+
+        Si la instantánea está vencida (o no existe) se programa un refresco
+        en segundo plano; la respuesta actual usa los datos que ya hay.
+        """
+        meta = self.refresh_if_stale()
+
+        version = meta.get('version')
+        if version is None:
+            return self._local_events
+        if version != self._local_version:
+            events = cache.get(self.events_key)
+            if events is None:
+                # La clave grande fue expulsada de la caché: forzar refresco completo
+                self.refresh_async(force=True)
+                return self._local_events
+            self._local_version = version
+            self._local_events = events
+        return self._local_events
+
+    def get_index(self):
+        """``EventIndex`` de la instantánea actual (se reconstruye solo si cambió)."""
+        from .index import EventIndex
+
+        events = self.get_events()
+        if self._index is None or self._index.events is not events:
+            self._index = EventIndex(events)
+        return self._index
+
+    def refresh_async(self, force=False):
+        """Lanza un refresco en un hilo daemon si no hay otro en curso."""
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self.refresh,
+                kwargs={'force': force},
+                name=f'refresh-{self.cache_key}',
+                daemon=True,
+            )
+            self._thread.start()
+
+    def refresh(self, force=False, notify=True):
+        """
+        Descarga el feed (con GET condicional) y actualiza la instantánea.
+
+        Solo un proceso a la vez refresca el mismo feed gracias a un candado
+        (``citas.locks``). Devuelve True si se guardó una instantánea nueva; con
+        ``notify=False`` no se llaman los callbacks ``on_update``.
+        """
+        max_timeout = max([self.source_timeout(source) for source in self.sources] or [self.timeout])
+        candado = Candado(self.lock_key, timeout=max_timeout * 3)
+        if not candado.adquirir():
+            return False
+        try:
+            updated = self._refresh(force=force)
+        except Exception as e:
+            # Se mantiene la última instantánea buena
+            logger.warning(f"Error refrescando calendario {self.cache_key}: {e}")
+            self._touch(self.get_meta())
+            return False
+        finally:
+            candado.liberar()
+
+        if updated and notify:
+            for callback in self.on_update:
+                try:
+                    callback(self._local_events, self.get_meta())
+                except Exception:
+                    logger.exception(f"Error procesando actualización de {self.cache_key}")
+        if threading.current_thread() is self._thread:
+            # Los hilos de refresco abren su propia conexión a la BD
+            from django.db import connection
+            connection.close()
+        return updated
+
+    def current_window(self):
+        """Ventana ``(inicio, fin)`` de hoy ± window_days, o None si se parsea todo."""
+        if not self.window_days:
+            return None
+        today = datetime.now(pytz.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        delta = timedelta(days=self.window_days)
+        return (today - delta, today + delta)
+
+    def _fetch(self, source, source_meta, window, force):
+        """
+        Descarga y parsea una fuente a través de su circuit breaker. Devuelve
+        ``None`` si respondió 304 o ``(eventos, cabeceras)``; con el circuito
+        abierto lanza ``CircuitOpenError`` sin tocar la red. Corre en los
+        hilos del pool: no toca la BD.
+        """
+        return self.breaker(source).call(self._download, source, source_meta, window, force)
+
+    def _download(self, source, source_meta, window, force):
+        headers = {}
+        if not force:
+            if source_meta.get('etag'):
+                headers['If-None-Match'] = source_meta['etag']
+            if source_meta.get('last_modified'):
+                headers['If-Modified-Since'] = source_meta['last_modified']
+
+        response = requests.get(
+            source.url,
+            headers=headers,
+            timeout=(self.connect_timeout, self.source_timeout(source)),
+            stream=window is not None,
+        )
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        if 'charset' not in response.headers.get('Content-Type', ''):
+            # RFC 5545: UTF-8 por defecto (requests asumiría ISO-8859-1)
+            response.encoding = 'utf-8'
+
+        from .recurrence import expander
+        if window is None:
+            events = parse_ics(response.text)
+        else:
+            from .ics_stream import parse_ics_window
+            events = parse_ics_window(response.iter_lines(decode_unicode=True), *window)
+        for event in events:
+            event.source = source.id
+        if window is None:
+            horizon = datetime.now(pytz.utc) + timedelta(days=self.recurrence_horizon_days)
+            events = expander.expand(events, None, horizon)
+        else:
+            events = expander.expand(events, *window)
+        return events, response.headers
+
+    def _fetch_all(self, window, sources_meta, force):
+        """
+        Descarga todas las fuentes en paralelo. Devuelve ``{id: resultado}``
+        donde el resultado es lo que devuelve ``_fetch`` o la excepción. Las
+        fuentes que no terminan a tiempo quedan como ``TimeoutError``.
+        """
+        resultados = {}
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(self.sources))),
+            thread_name_prefix=f'fetch-{self.cache_key}',
+        )
+        try:
+            futures = {}
+            for source in self.sources:
+                # Si se perdieron los eventos de la fuente un 304 no sirve: descarga completa
+                forzar = force or not cache.has_key(self.source_events_key(source.id))
+                futures[pool.submit(self._fetch, source, sources_meta.get(source.id, {}), window, forzar)] = source
+            # requests.get limita cada lectura, no la descarga completa: plazo total por si acaso
+            plazo = max(self.source_timeout(source) for source in self.sources) * 2
+            wait(futures, timeout=plazo)
+            for future, source in futures.items():
+                if not future.done():
+                    future.cancel()
+                    resultados[source.id] = TimeoutError(f'{source.url} no respondió en {plazo}s')
+                elif future.exception() is not None:
+                    resultados[source.id] = future.exception()
+                else:
+                    resultados[source.id] = future.result()
+        finally:
+            pool.shutdown(wait=False)
+        return resultados
+
+    def _refresh(self, force=False):
+        meta = self.get_meta()
+        window = self.current_window()
+        if window != meta.get('window'):
+            # La ventana avanzó (cambió el día): hay que volver a parsear aunque el feed no cambie
+            force = True
+
+        anteriores = meta.get('sources') or {}
+        resultados = self._fetch_all(window, anteriores, force)
+
+        ahora = time.time()
+        changed = set(anteriores) != {source.id for source in self.sources}
+        sources_meta = {}
+        listas = []
+        for source in self.sources:
+            anterior = anteriores.get(source.id, {})
+            resultado = resultados[source.id]
+            if resultado is None or isinstance(resultado, Exception):
+                if isinstance(resultado, CircuitOpenError):
+                    logger.info(str(resultado))
+                elif isinstance(resultado, Exception):
+                    # Se mantienen los últimos eventos buenos de esta fuente
+                    logger.warning(f"Error refrescando calendario {source.id}: {resultado}")
+                events = cache.get(self.source_events_key(source.id))
+                info = dict(anterior, checked_at=ahora, error=str(resultado) if resultado else None)
+                if events is None:
+                    info['ok'] = False
+                    events = []
+            else:
+                events, headers = resultado
+                cache.set(self.source_events_key(source.id), events, timeout=None)
+                info = {
+                    'etag': headers.get('ETag'),
+                    'last_modified': headers.get('Last-Modified'),
+                    'checked_at': ahora,
+                    'updated_at': ahora,
+                    'count': len(events),
+                    'error': None,
+                    'ok': True,
+                }
+                changed = True
+            sources_meta[source.id] = info
+            listas.append(events)
+
+        if not changed:
+            meta = dict(meta, sources=sources_meta)
+            self._touch(meta)
+            return False
+
+        # Cada lista ya viene ordenada: mezcla k-way en O(n log k)
+        events = list(heapq.merge(*listas, key=lambda e: e.local_begin))
+        version = (meta.get('version') or 0) + 1
+        cache.set(self.events_key, events, timeout=None)
+        cache.set(self.meta_key, {
+            'version': version,
+            'sources': sources_meta,
+            'checked_at': ahora,
+            'updated_at': ahora,
+            'count': len(events),
+            'window': window,
+        }, timeout=None)
+        self._local_version = version
+        self._local_events = events
+        return True
+
+    def _touch(self, meta):
+        meta = dict(meta)
+        meta['checked_at'] = time.time()
+        cache.set(self.meta_key, meta, timeout=None)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_sources():
+    """
+    Fuentes configuradas en ``CITAS_CALENDARIOS``. Si no está definido se usa
+    el calendario único de ``CITAS_ICS_URL``.
+    """
+    timeout = getattr(settings, 'CITAS_ICS_TIMEOUT', 10)
+    calendarios = getattr(settings, 'CITAS_CALENDARIOS', None)
+    if not calendarios:
+        calendarios = [{
+            'id': DEFAULT_SOURCE_ID,
+            'nombre': 'Consultorio',
+            'url': getattr(settings, 'CITAS_ICS_URL', DEFAULT_ICS_URL),
+        }]
+    return [CalendarSource.from_setting(value, timeout) for value in calendarios]
+
+
+def get_store():
+    """Instancia única (por proceso) del almacén configurado en settings."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CalendarStore(
+                    sources=get_sources(),
+                    refresh_interval=getattr(settings, 'CITAS_ICS_REFRESH_INTERVAL', 300),
+                    timeout=getattr(settings, 'CITAS_ICS_TIMEOUT', 10),
+                    connect_timeout=getattr(settings, 'CITAS_ICS_CONNECT_TIMEOUT', 3),
+                    failure_threshold=getattr(settings, 'CITAS_ICS_BREAKER_FALLOS', 3),
+                    recovery_timeout=getattr(settings, 'CITAS_ICS_BREAKER_ESPERA', 120),
+                    window_days=getattr(settings, 'CITAS_ICS_VENTANA_DIAS', None),
+                    max_workers=getattr(settings, 'CITAS_ICS_MAX_HILOS', 4),
+                )
+    return _store
+
+
+def fuentes_sincronizables(meta):
+    """Ids de las fuentes con datos válidos en la instantánea (las demás no se tocan en la BD)."""
+    return [source_id for source_id, info in (meta.get('sources') or {}).items() if info.get('ok')]
@@ -0,0 +1,152 @@
+# citas/sync.py
+"""
+Sincronización incremental del feed ICS con la tabla ``CitaEvento``.
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+
+from .matcher import VINCULO_MANUAL, PacienteMatcher
+from .models import CitaEvento
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_SINCRONIZADOS = [
+    'titulo', 'descripcion', 'ubicacion', 'inicio', 'fin', 'todo_el_dia',
+    'secuencia', 'ultima_modificacion', 'paciente', 'vinculo',
+]
+
+
+def _valores_evento(event):
+    return {
+        'titulo': event.name[:255],
+        'descripcion': event.description,
+        'ubicacion': event.location[:255],
+        'inicio': event.begin,
+        'fin': event.end,
+        'todo_el_dia': event.all_day,
+        'secuencia': event.sequence,
+        'ultima_modificacion': event.last_modified,
+    }
+
+
+def _ha_cambiado(event, secuencia, ultima_modificacion, inicio):
+    """
+    Un VEVENT cambió si subió su SEQUENCE o su LAST-MODIFIED es más reciente.
+    Si el feed no trae LAST-MODIFIED se compara la fecha de inicio.
+    """
+    if event.sequence > secuencia:
+        return True
+    if event.last_modified is not None:
+        return ultima_modificacion is None or event.last_modified > ultima_modificacion
+    return event.begin != inicio
+
+
+def sincronizar_eventos(events, ventana=None, calendarios=None):
+    """
+    Inserta los eventos nuevos, actualiza solo los que cambiaron y elimina
+    los cancelados o los que ya no aparecen en el feed.
+
+    ``events`` es la lista de ``CalendarEvent`` del feed. Si el feed se parseó
+    solo dentro de una ``ventana`` ``(inicio, fin)``, únicamente se consideran
+    borradas las filas de esa ventana; el resto del historial no se toca.
+    Con ``calendarios`` solo se sincronizan esas fuentes: las que fallaron en
+    la descarga conservan sus filas tal cual.
+    Devuelve un dict con el número de filas creadas, actualizadas y eliminadas.
+    """
+    if calendarios is not None:
+        calendarios = set(calendarios)
+        events = [event for event in events if event.source in calendarios]
+    uids = {event.uid for event in events if event.uid}
+    filas = CitaEvento.objects.all()
+    if calendarios is not None:
+        filas = filas.filter(calendario__in=calendarios)
+    if ventana:
+        filas = filas.filter(Q(inicio__gte=ventana[0], inicio__lt=ventana[1]) | Q(uid__in=uids))
+    existentes = {
+        (calendario, uid): (pk, secuencia, ultima_modificacion, inicio, paciente_id, vinculo)
+        for pk, calendario, uid, secuencia, ultima_modificacion, inicio, paciente_id, vinculo in filas.values_list(
+            'pk', 'calendario', 'uid', 'secuencia', 'ultima_modificacion', 'inicio', 'paciente_id', 'vinculo'
+        )
+    }
+    # El índice de pacientes se construye solo si hay filas nuevas o modificadas
+    matcher = None
+
+    nuevos = []
+    modificados = []
+    cancelados = []
+    vistos = set()
+
+    for event in events:
+        clave = (event.source, event.uid)
+        if not event.uid or clave in vistos:
+            continue
+        vistos.add(clave)
+
+        actual = existentes.get(clave)
+        if event.cancelled:
+            if actual:
+                cancelados.append(actual[0])
+            continue
+
+        if actual is None:
+            matcher = matcher or PacienteMatcher.desde_bd()
+            paciente_id, vinculo = matcher.resolver(event.name, event.description)
+            nuevos.append(CitaEvento(
+                calendario=event.source, uid=event.uid, paciente_id=paciente_id, vinculo=vinculo,
+                **_valores_evento(event)
+            ))
+        elif _ha_cambiado(event, *actual[1:4]):
+            paciente_id, vinculo = actual[4:6]
+            if vinculo != VINCULO_MANUAL:
+                matcher = matcher or PacienteMatcher.desde_bd()
+                paciente_id, vinculo = matcher.resolver(event.name, event.description)
+            modificados.append(CitaEvento(
+                pk=actual[0], uid=event.uid, paciente_id=paciente_id, vinculo=vinculo,
+                **_valores_evento(event)
+            ))
+
+    # Eventos borrados del calendario: Google simplemente deja de publicarlos
+    eliminados = [pk for clave, (pk, *_resto) in existentes.items() if clave not in vistos]
+
+    with transaction.atomic():
+        if nuevos:
+            CitaEvento.objects.bulk_create(nuevos, batch_size=500)
+        if modificados:
+            CitaEvento.objects.bulk_update(modificados, CAMPOS_SINCRONIZADOS, batch_size=500)
+        if cancelados or eliminados:
+            CitaEvento.objects.filter(pk__in=cancelados + eliminados).delete()
+
+    resultado = {
+        'creados': len(nuevos),
+        'actualizados': len(modificados),
+        'eliminados': len(cancelados) + len(eliminados),
+    }
+    logger.info(f"Calendario sincronizado: {resultado}")
+    return resultado
+
+
+def vincular_citas(filas=None):
+    """
+    Recalcula el paciente de las citas ya guardadas (p. ej. después de
+    registrar pacientes nuevos). Las vinculaciones manuales no se tocan.
+    Devuelve el número de filas cuyo vínculo cambió.
+    """
+    if filas is None:
+        filas = CitaEvento.objects.all()
+    matcher = PacienteMatcher.desde_bd()
+    cambiados = []
+    for pk, titulo, descripcion, paciente_id, vinculo in filas.exclude(vinculo=VINCULO_MANUAL).values_list(
+        'pk', 'titulo', 'descripcion', 'paciente_id', 'vinculo'
+    ).iterator():
+        nuevo = matcher.resolver(titulo, descripcion)
+        if nuevo != (paciente_id, vinculo):
+            cambiados.append(CitaEvento(pk=pk, paciente_id=nuevo[0], vinculo=nuevo[1]))
+
+    if cambiados:
+        with transaction.atomic():
+            CitaEvento.objects.bulk_update(cambiados, ['paciente', 'vinculo'], batch_size=500)
+    logger.info(f"Citas revinculadas con pacientes: {len(cambiados)}")
+    return len(cambiados)
@@ -1,3 +1,225 @@
-from django.test import TestCase
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import pytz
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .availability import buscar_huecos, get_horario, intervalos_ocupados
+from .breaker import CircuitBreaker
+from .locks import Candado
+from .store import LIMA_TZ, CalendarEvent, CalendarSource, CalendarStore
+
+
+def _todo_el_dia(inicio, fin=None):
+    # Como los deja ics_stream.parse_datetime: medianoche UTC
+    return CalendarEvent(
+        uid=f'vacaciones-{inicio}', name='Vacaciones', all_day=True,
+        begin=pytz.utc.localize(datetime.combine(inicio, datetime.min.time())),
+        end=pytz.utc.localize(datetime.combine(fin, datetime.min.time())) if fin else None,
+    )
+
+
+class EventosTodoElDiaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.horario = get_horario()
+
+    def _dias_libres(self, eventos):
+        desde = LIMA_TZ.localize(datetime(2026, 10, 19, 0, 0))
+        hasta = desde + timedelta(days=7)
+        huecos = buscar_huecos(
+            intervalos_ocupados(eventos), timedelta(minutes=30), desde, hasta,
+            n=1000, horario=self.horario,
+        )
+        return {inicio.date() for inicio, _fin in huecos}
+
+    def test_un_dia_bloquea_ese_dia_en_lima(self):
+        ocupados = intervalos_ocupados([_todo_el_dia(date(2026, 10, 21))])
+        self.assertEqual(ocupados, [(
+            LIMA_TZ.localize(datetime(2026, 10, 21)),
+            LIMA_TZ.localize(datetime(2026, 10, 22)),
+        )])
+        libres = self._dias_libres([_todo_el_dia(date(2026, 10, 21))])
+        self.assertNotIn(date(2026, 10, 21), libres)
+        self.assertIn(date(2026, 10, 20), libres)
+        self.assertIn(date(2026, 10, 22), libres)
+
+    def test_varios_dias_bloquea_hasta_dtend_sin_incluirlo(self):
+        # Vacaciones del 21 al 23: DTEND es el 24 (exclusivo)
+        libres = self._dias_libres([_todo_el_dia(date(2026, 10, 21), date(2026, 10, 24))])
+        for dia in (21, 22, 23):
+            self.assertNotIn(date(2026, 10, dia), libres)
+        self.assertIn(date(2026, 10, 20), libres)
+        self.assertIn(date(2026, 10, 24), libres)
+
+    def test_cita_con_hora_del_dia_anterior_no_desordena(self):
+        # Cita de 19:30 el 20 (Lima): en el índice va después del evento del 21,
+        # que empieza a medianoche UTC (19:00 del 20 en Lima)
+        cita = CalendarEvent(
+            uid='cita', name='Cita',
+            begin=LIMA_TZ.localize(datetime(2026, 10, 20, 19, 30)),
+            end=LIMA_TZ.localize(datetime(2026, 10, 20, 20, 30)),
+        )
+        ocupados = intervalos_ocupados([_todo_el_dia(date(2026, 10, 21)), cita])
+        self.assertEqual([inicio for inicio, _fin in ocupados], [cita.local_begin, LIMA_TZ.localize(datetime(2026, 10, 21))])
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Feed ICS con ETag; ``server.estado`` decide la respuesta (200/304 o error)."""
+
+    def do_GET(self):
+        servidor = self.server
+        servidor.pedidos.append(self.headers.get('If-None-Match'))
+        if servidor.fallar:
+            self.send_error(500)
+            return
+        if self.headers.get('If-None-Match') == servidor.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        cuerpo = servidor.feed.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/calendar; charset=utf-8')
+        self.send_header('ETag', servidor.etag)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _feed(*eventos):
+    lineas = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Consultorio//Tests//ES']
+    for uid, inicio in eventos:
+        lineas += [
+            'BEGIN:VEVENT', f'UID:{uid}', f'DTSTART:{inicio:%Y%m%dT%H%M%SZ}',
+            f'DTEND:{inicio + timedelta(minutes=30):%Y%m%dT%H%M%SZ}', f'SUMMARY:Cita {uid}', 'END:VEVENT',
+        ]
+    lineas.append('END:VCALENDAR')
+    return '\r\n'.join(lineas) + '\r\n'
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'citas-tests'}})
+class RefrescoFeedLocalTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+        manana = datetime.now(pytz.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.servidor.feed = _feed(('a', manana), ('b', manana + timedelta(hours=2)))
+        self.servidor.etag = '"v1"'
+        self.servidor.fallar = False
+        self.servidor.pedidos = []
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        url = f'http://127.0.0.1:{self.servidor.server_address[1]}/basic.ics'
+        self.store = CalendarStore(
+            [CalendarSource('principal', url)], cache_key='tests:calendario', timeout=5,
+            window_days=30, failure_threshold=2, recovery_timeout=60,
+        )
+
+    def uids(self):
+        return [event.uid for event in self.store.get_events()]
+
+    def test_304_y_ultima_instantanea_si_falla(self):
+        self.assertTrue(self.store.refresh())
+        self.assertEqual(self.uids(), ['a', 'b'])
+        version = self.store.get_meta()['version']
+
+        # Segunda descarga condicional: 304, la instantánea no cambia
+        self.assertFalse(self.store.refresh())
+        self.assertEqual(self.servidor.pedidos, [None, '"v1"'])
+        self.assertEqual(self.store.get_meta()['version'], version)
+        self.assertEqual(self.uids(), ['a', 'b'])
+
+        # El feed falla: se sigue sirviendo la última instantánea buena
+        self.servidor.fallar = True
+        self.assertFalse(self.store.refresh())
+        self.assertEqual(self.uids(), ['a', 'b'])
+        info = self.store.get_meta()['sources']['principal']
+        self.assertIn('500', info['error'])
+        # Otro proceso (sin copia local) también la ve
+        otro = CalendarStore(self.store.sources, cache_key='tests:calendario', window_days=30)
+        self.assertEqual([event.uid for event in otro.get_events()], ['a', 'b'])
+
+        # Con el circuito abierto ya no se llama al feed
+        self.assertFalse(self.store.refresh())
+        pedidos = len(self.servidor.pedidos)
+        self.assertFalse(self.store.refresh())
+        self.assertEqual(len(self.servidor.pedidos), pedidos)
+        self.assertEqual(self.uids(), ['a', 'b'])
+
+    def test_feed_nuevo_reemplaza_la_instantanea(self):
+        self.store.refresh()
+        manana = datetime.now(pytz.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.servidor.feed = _feed(('c', manana))
+        self.servidor.etag = '"v2"'
+        self.assertTrue(self.store.refresh())
+        self.assertEqual(self.uids(), ['c'])
+
+    def test_un_solo_refresco_a_la_vez(self):
+        candado = Candado(self.store.lock_key, timeout=60)
+        self.assertTrue(candado.adquirir())
+        try:
+            self.assertFalse(self.store.refresh())
+            self.assertEqual(self.servidor.pedidos, [])
+        finally:
+            candado.liberar()
+        self.assertTrue(self.store.refresh())
+
+
+class CandadoArchivoTests(SimpleTestCase):
+    """Con FileBasedCache el candado es un flock (``cache.add`` no es atómico ahí)."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio.name,
+        }})
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_exclusivo_hasta_liberarlo(self):
+        primero, segundo = Candado('citas:lock', 60), Candado('citas:lock', 60)
+        self.assertTrue(primero.adquirir())
+        self.assertFalse(segundo.adquirir())
+        self.assertTrue(Candado('otra:clave', 60).adquirir())
+        # No deja nada en la caché que otro proceso pueda leer como "tomado"
+        self.assertIsNone(cache.get('citas:lock'))
+        primero.liberar()
+        self.assertTrue(segundo.adquirir())
+        segundo.liberar()
+
+    def test_solo_un_hilo_gana(self):
+        ganadores = []
+        barrera = threading.Barrier(8)
+
+        def intentar():
+            candado = Candado('citas:lock', 60)
+            barrera.wait()
+            if candado.adquirir():
+                ganadores.append(candado)
+
+        hilos = [threading.Thread(target=intentar) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(ganadores), 1)
+        ganadores[0].liberar()
+
+    def test_prueba_del_circuito_semiabierto(self):
+        primero = CircuitBreaker('citas:breaker:x', failure_threshold=1, recovery_timeout=0)
+        primero.record_failure()
+        segundo = CircuitBreaker('citas:breaker:x', failure_threshold=1, recovery_timeout=0)
+        self.assertTrue(primero.allow())
+        self.assertFalse(segundo.allow())
+        primero.record_success()
+        self.assertTrue(segundo.allow())
+        segundo.record_success()
@@ -1,9 +1,6 @@
+from django.http import JsonResponse
 from django.shortcuts import render
-import requests
-from ics import Calendar
-from django.utils import timezone
-from datetime import timedelta
-import pytz
+from consultorio_dental.utils import omitir_context_processors
 
 def calendario_view(request):
     # Placeholder for the Embed URL
@@ -17,78 +14,39 @@ def lista_eventos_view(request):
     Vista principal que carga el esqueleto de la página.
     Los eventos se cargan vía AJAX.
     """
+    from .store import get_store
+
     filter_type = request.GET.get('filter', 'week')
     context = {
         'current_filter': filter_type,
+        'calendarios': get_store().sources,
+        'current_calendario': request.GET.get('calendario', ''),
     }
     return render(request, 'citas/lista_eventos.html', context)
 
+@omitir_context_processors()
 def api_eventos_view(request):
     """
     Vista API que devuelve el HTML parcial de los eventos.
     Se llama vía AJAX.
     """
-    from .utils import get_calendar_events
+    from .index import EventIndex
+    from .utils import get_event_index
     
     today_events = []
     filtered_events = []
     error_message = None
     filter_type = request.GET.get('filter', 'week')
+    calendario = request.GET.get('calendario') or None
+    now = EventIndex.now()
 
     try:
-        # Obtener eventos
-        all_events = get_calendar_events()
-        
-        # Configurar zona horaria y fechas
-        limatz = pytz.timezone('America/Lima')
-        now = timezone.now().astimezone(limatz)
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-        
-        # Definir rango de fechas para el filtro
-        if filter_type == 'week':
-            # Semana actual (Lunes a Domingo)
-            start_date = today_start - timedelta(days=today_start.weekday())
-            end_date = start_date + timedelta(days=7)
-        elif filter_type == 'month':
-            # Mes actual
-            start_date = today_start.replace(day=1)
-            # Primer día del próximo mes
-            if start_date.month == 12:
-                end_date = start_date.replace(year=start_date.year + 1, month=1)
-            else:
-                end_date = start_date.replace(month=start_date.month + 1)
-        elif filter_type == 'last_month':
-            # Mes pasado
-            this_month_start = today_start.replace(day=1)
-            if this_month_start.month == 1:
-                start_date = this_month_start.replace(year=this_month_start.year - 1, month=12)
-            else:
-                start_date = this_month_start.replace(month=this_month_start.month - 1)
-            end_date = this_month_start
-        elif filter_type == 'next_3_months':
-            # Próximos 3 meses
-            start_date = today_start
-            end_date = start_date + timedelta(days=90)
-        else:
-            # Fallback a mes actual
-            start_date = today_start.replace(day=1)
-            if start_date.month == 12:
-                end_date = start_date.replace(year=start_date.year + 1, month=1)
-            else:
-                end_date = start_date.replace(month=start_date.month + 1)
-
-        # Procesar eventos
-        for event in all_events:
-            event_local = event.local_begin
-            
-            # Filtrar eventos de HOY
-            if today_start <= event_local < today_end:
-                today_events.append(event)
-            
-            # Filtrar eventos según el filtro seleccionado
-            if start_date <= event_local < end_date:
-                filtered_events.append(event)
+        # Índice ordenado sobre la instantánea del calendario
+        index = get_event_index().for_source(calendario)
+
+        # Eventos de HOY y del rango seleccionado (semana, mes, mes pasado, 3 meses)
+        today_events = index.today(now)
+        filtered_events = index.filtered(filter_type, now)
                 
     except Exception as e:
         error_message = f"Error al procesar eventos: {e}"
@@ -101,3 +59,59 @@ def api_eventos_view(request):
         'now': now
     }
     return render(request, 'citas/partials/eventos_list.html', context)
+
+
+@omitir_context_processors()
+def api_disponibilidad_view(request):
+    """
+    Próximos huecos libres en formato JSON.
+
+    Parámetros GET: ``duracion`` (minutos) o ``tratamiento`` (ver
+    CITAS_DURACIONES), ``n`` (máx. 50), ``desde`` (AAAA-MM-DD, por defecto
+    ahora), ``dias`` (horizonte) y ``calendario`` (id del dentista).
+    """
+    from datetime import datetime, timedelta
+
+    from .availability import MARGEN_EVENTOS_PREVIOS, buscar_huecos, get_duraciones, intervalos_ocupados
+    from .index import EventIndex
+    from .store import get_store
+    from .utils import get_event_index
+
+    duraciones = get_duraciones()
+    tratamiento = request.GET.get('tratamiento')
+    try:
+        if tratamiento:
+            if tratamiento not in duraciones:
+                return JsonResponse({'error': f'Tratamiento desconocido: {tratamiento}'}, status=400)
+            minutos = duraciones[tratamiento]
+        else:
+            minutos = int(request.GET.get('duracion', 30))
+        n = min(int(request.GET.get('n', 10)), 50)
+        dias = int(request.GET.get('dias', 60))
+        desde = request.GET.get('desde')
+        desde = datetime.strptime(desde, '%Y-%m-%d').date() if desde else None
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if minutos <= 0 or n <= 0 or dias <= 0:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+
+    ahora = EventIndex.now()
+    inicio = max(ahora, EventIndex.inicio_dia(desde)) if desde else ahora
+    fin = EventIndex.inicio_dia(inicio) + timedelta(days=dias + 1)
+
+    ventana = get_store().get_meta().get('window')
+    if ventana:
+        # Más allá de la ventana de la instantánea no se conocen las citas
+        fin = min(fin, ventana[1])
+
+    index = get_event_index().for_source(request.GET.get('calendario') or None)
+    # Un evento que empezó antes de la ventana puede seguir ocupando tiempo
+    eventos = index.range(inicio - MARGEN_EVENTOS_PREVIOS, fin)
+    huecos = buscar_huecos(intervalos_ocupados(eventos), timedelta(minutes=minutos), inicio, fin, n=n)
+
+    return JsonResponse({
+        'duracion': minutos,
+        'hasta': fin.isoformat(),
+        'huecos': [{'inicio': a.isoformat(), 'fin': b.isoformat()} for a, b in huecos],
+    })
+
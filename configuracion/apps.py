@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ConfiguracionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'configuracion'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,68 @@
+# configuracion/cache.py
+"""
+Caché de la configuración del consultorio (registro único, casi nunca cambia).
+
+Cada proceso guarda la instancia en memoria junto con la versión con la que
+la leyó; la versión vive en la caché compartida y ``post_save`` /
+``post_delete`` la cambian, así que todos los workers ven las ediciones en
+la siguiente petición. En el caso normal leer la configuración no hace
+ninguna consulta a la BD: solo se lee la clave pequeña de la versión.
+
+La instancia devuelta es compartida: es de solo lectura. Para editarla usar
+``ConfiguracionConsultorio.get_configuracion()``.
+"""
+
+import uuid
+
+from django.core.cache import cache
+
+VERSION_KEY = 'configuracion:consultorio:version'
+DATA_KEY = 'configuracion:consultorio:data'
+
+# (versión, instancia) de este proceso; se reemplaza de una sola vez
+_proceso = (None, None)
+
+
+def _version_actual():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Versión aleatoria: si se vacía la caché ningún proceso confunde su copia vieja
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def version_configuracion():
+    """
+    Versión actual de la configuración. Cambia con cada edición; sirve para
+    armar claves de caché de documentos que dependen de ella (PDFs, SVGs).
+    """
+    return _version_actual()
+
+
+def get_configuracion_cacheada():
+    """Configuración del consultorio servida desde memoria / caché compartida."""
+    from .models import ConfiguracionConsultorio
+
+    global _proceso
+
+    version = _version_actual()
+    version_local, config = _proceso
+    if version is not None and version_local == version:
+        return config
+
+    datos = cache.get(DATA_KEY)
+    if datos is not None and datos[0] == version:
+        config = datos[1]
+    else:
+        config = ConfiguracionConsultorio.get_configuracion()
+        cache.set(DATA_KEY, (version, config), timeout=None)
+
+    _proceso = (version, config)
+    return config
+
+
+def invalidar_configuracion(**kwargs):
+    """Receptor de post_save / post_delete: nueva versión para todos los procesos."""
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    cache.delete(DATA_KEY)
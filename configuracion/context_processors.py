@@ -1,9 +1,14 @@
 # configuracion/context_processors.py
-from .models import ConfiguracionConsultorio
+from django.utils.functional import SimpleLazyObject
+from consultorio_dental.utils import context_processor_omitido
+from .cache import get_configuracion_cacheada
 
 def configuracion_consultorio(request):
     """Context processor para hacer disponible la configuración en todos los templates"""
-    config = ConfiguracionConsultorio.get_configuracion()
+    if context_processor_omitido(request, 'configuracion_consultorio'):
+        return {}
+    # Se carga recién cuando la plantilla accede a config_consultorio (desde la caché)
+    config = SimpleLazyObject(get_configuracion_cacheada)
     return {
         'config_consultorio': config
     }
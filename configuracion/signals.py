@@ -0,0 +1,12 @@
+# configuracion/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidar_configuracion
+from .models import ConfiguracionConsultorio
+
+
+@receiver(post_save, sender=ConfiguracionConsultorio)
+@receiver(post_delete, sender=ConfiguracionConsultorio)
+def configuracion_modificada(sender, **kwargs):
+    invalidar_configuracion()
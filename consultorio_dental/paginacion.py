@@ -0,0 +1,276 @@
+"""
+Paginación por cursor (keyset) para los listados largos.
+
+``Paginator`` pagina con ``OFFSET``: la página N lee y descarta las N-1
+anteriores, y además cuenta toda la tabla con ``COUNT(*)``. Aquí cada
+página se pide desde la última fila de la anterior::
+
+    WHERE (fecha, id) < (fecha_ultima, id_ultimo) ORDER BY fecha DESC, id DESC LIMIT 21
+
+que con un índice sobre ``(fecha, id)`` cuesta lo mismo en la primera
+página que en la milésima. El desempate por ``id`` hace el orden total,
+así que ninguna fila se repite ni se salta entre páginas.
+
+Los enlaces llevan un cursor opaco (firmado) con los valores de orden de
+la fila límite, la dirección y el número de página. No se cuenta el total;
+quien lo necesite usa ``estimar_total``, que lee la estimación del motor o
+cuenta con tope.
+
+Los campos de orden deben ser campos propios del modelo y sin nulos.
+"""
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+CURSOR_PARAM = 'cursor'
+PAGINA_PARAM = 'page'
+CURSOR_SALT = 'consultorio_dental.paginacion'
+# Más allá de este número de filas, ``estimar_total`` deja de contar
+TOPE_CONTEO = 10000
+
+
+class Total(int):
+    """Total de filas; ``exacto`` es False si es una estimación o se llegó al ``tope``."""
+
+    def __new__(cls, valor, exacto=True, tope=False):
+        total = super().__new__(cls, valor)
+        total.exacto = exacto
+        total.tope = tope
+        return total
+
+    def __str__(self):
+        valor = f'{int(self):,}'.replace(',', ' ')
+        if self.exacto:
+            return valor
+        return f'más de {valor}' if self.tope else f'≈ {valor}'
+
+
+def _estimado_postgresql(queryset):
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        fila = cursor.fetchone()
+    # -1: la tabla nunca se analizó
+    return fila[0] if fila and fila[0] >= 0 else None
+
+
+def estimar_total(queryset, tope=TOPE_CONTEO):
+    """
+    ``Total`` de filas de ``queryset`` sin recorrer la tabla entera: sin
+    filtros y en PostgreSQL, la estimación del planificador; si no, un
+    ``COUNT`` que se detiene en ``tope``.
+    """
+    if not queryset.query.where and connections[queryset.db].vendor == 'postgresql':
+        try:
+            estimado = _estimado_postgresql(queryset)
+        except DatabaseError:
+            estimado = None
+        if estimado is not None:
+            return Total(estimado, exacto=False)
+    total = queryset.order_by()[:tope + 1].count()
+    return Total(min(total, tope), exacto=total <= tope, tope=total > tope)
+
+
+# ============================================
+# PÁGINA Y PAGINADOR
+# ============================================
+
+class PaginaCursor:
+    """Página de ``PaginadorCursor``; se usa como ``Page`` en las plantillas."""
+
+    def __init__(self, object_list, number, paginator, siguiente=None, anterior=None):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.cursor_siguiente = siguiente
+        self.cursor_anterior = anterior
+
+    def __repr__(self):
+        return f'<Página {self.number} (cursor)>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, indice):
+        return self.object_list[indice]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class PaginadorCursor:
+    """
+    Pagina ``queryset`` por ``orden`` (nombres de campo con ``-`` para
+    descendente, como en ``order_by``) más la clave primaria, que sigue la
+    dirección del último campo.
+    """
+
+    # Sin número de páginas: solo se puede ir a la anterior o la siguiente
+    num_pages = None
+
+    def __init__(self, queryset, per_page, orden):
+        self.per_page = int(per_page)
+        self.modelo = queryset.model
+        pk = self.modelo._meta.pk.name
+        descendente = orden[-1].startswith('-')
+        self.campos = [
+            (nombre.lstrip('-'), nombre.startswith('-'))
+            for nombre in (*orden, f"{'-' if descendente else ''}{pk}")
+        ]
+        self.queryset = queryset
+
+    @cached_property
+    def count(self):
+        return estimar_total(self.queryset)
+
+    def _ordenado(self, invertido=False):
+        return self.queryset.order_by(*[
+            f"{'-' if descendente != invertido else ''}{nombre}"
+            for nombre, descendente in self.campos
+        ])
+
+    def _despues_de(self, valores, invertido=False):
+        """Filas después de ``valores`` en el orden (antes, si ``invertido``)."""
+        filtro = Q()
+        iguales = {}
+        for (nombre, descendente), valor in zip(self.campos, valores):
+            operador = 'lt' if descendente != invertido else 'gt'
+            filtro |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+            iguales[nombre] = valor
+        # La condición sobre el primer campo sola, para que el motor recorra
+        # un rango del índice en vez de evaluar el OR fila por fila
+        nombre, descendente = self.campos[0]
+        rango = 'lte' if descendente != invertido else 'gte'
+        return Q(**{f'{nombre}__{rango}': valores[0]}) & filtro
+
+    def _valores(self, objeto):
+        return [self.modelo._meta.get_field(nombre).value_to_string(objeto) for nombre, _ in self.campos]
+
+    def _cursor(self, objeto, direccion, numero):
+        return signing.dumps(
+            {'v': self._valores(objeto), 'd': direccion, 'n': numero},
+            salt=CURSOR_SALT, compress=True,
+        )
+
+    def _leer_cursor(self, cursor):
+        """``(valores, direccion, numero)`` o ``None`` si el cursor no es válido."""
+        try:
+            datos = signing.loads(cursor, salt=CURSOR_SALT)
+            valores = [
+                self.modelo._meta.get_field(nombre).to_python(valor)
+                for (nombre, _), valor in zip(self.campos, datos['v'], strict=True)
+            ]
+            return valores, datos['d'], max(int(datos['n']), 1)
+        except (signing.BadSignature, ValidationError, KeyError, TypeError, ValueError):
+            return None
+
+    def page(self, cursor=None):
+        """``PaginaCursor`` de ``cursor``; sin cursor o con uno inválido, la primera."""
+        leido = self._leer_cursor(cursor) if cursor else None
+        if leido is None:
+            filas = list(self._ordenado()[:self.per_page + 1])
+            return self._pagina(filas[:self.per_page], 1, len(filas) > self.per_page, False)
+
+        valores, direccion, numero = leido
+        if direccion == 'anterior':
+            filas = list(self._ordenado(invertido=True).filter(self._despues_de(valores, True))[:self.per_page + 1])
+            hay_antes = len(filas) > self.per_page
+            filas = filas[:self.per_page][::-1]
+            if not filas:
+                return self.page()
+            return self._pagina(filas, numero if hay_antes else 1, True, hay_antes)
+
+        filas = list(self._ordenado().filter(self._despues_de(valores))[:self.per_page + 1])
+        if not filas:
+            # Se borraron las filas que quedaban después del cursor
+            return self.page()
+        return self._pagina(filas[:self.per_page], numero, len(filas) > self.per_page, True)
+
+    def _pagina(self, filas, numero, hay_despues, hay_antes):
+        return PaginaCursor(
+            filas, numero, self,
+            siguiente=self._cursor(filas[-1], 'siguiente', numero + 1) if hay_despues else None,
+            anterior=self._cursor(filas[0], 'anterior', numero - 1) if hay_antes else None,
+        )
+
+    get_page = page
+
+
+# ============================================
+# VISTAS
+# ============================================
+
+def url_pagina(request, pagina, anterior=False):
+    """
+    Querystring del enlace a la página anterior o siguiente de ``pagina``
+    (por cursor o por número), conservando los demás parámetros (filtros).
+    """
+    params = request.GET.copy()
+    params.pop(CURSOR_PARAM, None)
+    params.pop(PAGINA_PARAM, None)
+    if isinstance(pagina, PaginaCursor):
+        cursor = pagina.cursor_anterior if anterior else pagina.cursor_siguiente
+        if cursor is None:
+            return None
+        # La primera página no lleva cursor
+        if not (anterior and pagina.number == 2):
+            params[CURSOR_PARAM] = cursor
+    else:
+        if not (pagina.has_previous() if anterior else pagina.has_next()):
+            return None
+        params[PAGINA_PARAM] = pagina.previous_page_number() if anterior else pagina.next_page_number()
+    return f'?{params.urlencode()}'
+
+
+def paginar(request, queryset, per_page, orden):
+    """
+    Página de ``queryset`` para ``request``: por cursor salvo que se pida
+    una página por número (``?page=N``) o que ``queryset`` no sea un
+    ``QuerySet`` (p. ej. resultados ya ordenados por relevancia).
+    """
+    if isinstance(queryset, QuerySet) and PAGINA_PARAM not in request.GET:
+        return PaginadorCursor(queryset, per_page, orden).page(request.GET.get(CURSOR_PARAM))
+    return Paginator(queryset, per_page).get_page(request.GET.get(PAGINA_PARAM))
+
+
+class PaginacionCursorMixin:
+    """
+    Para ``ListView``: pagina por cursor según ``orden_cursor`` y deja en el
+    contexto ``url_anterior`` y ``url_siguiente``. Con ``?page=N`` (enlaces
+    viejos) o si ``get_queryset`` no devuelve un ``QuerySet``, pagina por
+    número como siempre.
+    """
+
+    orden_cursor = None
+
+    def get_orden_cursor(self):
+        return self.orden_cursor or self.model._meta.ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        if not isinstance(queryset, QuerySet) or PAGINA_PARAM in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        pagina = paginar(self.request, queryset, page_size, self.get_orden_cursor())
+        return pagina.paginator, pagina, pagina.object_list, pagina.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        pagina = context.get('page_obj')
+        if pagina is not None:
+            context['url_anterior'] = url_pagina(self.request, pagina, anterior=True)
+            context['url_siguiente'] = url_pagina(self.request, pagina)
+        return context
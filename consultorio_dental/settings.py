@@ -105,4 +105,41 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
 
 # Tipo de campo por defecto para claves primarias
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Caché compartida entre procesos (instantáneas del calendario, etc.)
+# El refresco del calendario necesita un candado entre procesos: con esta
+# caché se usa flock (cache.add no es atómico aquí); con otra caché debe
+# ser una con add atómico, como Redis o Memcached (ver citas/locks.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+
+# Calendario de citas (Google Calendar ICS)
+CITAS_ICS_URL = os.environ.get(
+    'CITAS_ICS_URL',
+    "https://calendar.google.com/calendar/ical/juancarloscn%40gmail.com/private-7c3dfb4a8b649579159a76228916d6cf/basic.ics"
+)
+# Un calendario por dentista / sillón. 'id' se guarda en cada cita para poder
+# filtrar por dentista; 'timeout' (segundos) es opcional por fuente.
+CITAS_CALENDARIOS = [
+    {'id': 'principal', 'nombre': 'Consultorio', 'url': CITAS_ICS_URL},
+]
+CITAS_ICS_MAX_HILOS = 4  # descargas simultáneas de calendarios
+CITAS_ICS_REFRESH_INTERVAL = 300  # segundos entre refrescos en segundo plano
+CITAS_ICS_TIMEOUT = 10  # segundos máximos de lectura de cada feed (por defecto)
+CITAS_ICS_CONNECT_TIMEOUT = 3  # segundos máximos para conectar con el servidor del feed
+# Circuit breaker: tras N fallos seguidos no se vuelve a intentar durante M segundos
+CITAS_ICS_BREAKER_FALLOS = 3
+CITAS_ICS_BREAKER_ESPERA = 120
+# Solo se parsean los eventos a ±N días de hoy (parser en streaming). None = feed completo
+CITAS_ICS_VENTANA_DIAS = 90
+
+# Buscador de horarios libres (citas/api/disponibilidad/): los tramos de
+# atención y la duración de cada tipo de cita por defecto están en
+# citas/availability.py (HORARIO_DEFECTO, DURACIONES_DEFECTO). Para cambiarlos,
+# definir aquí CITAS_HORARIO (Lunes=0 ... Domingo=6 -> [('09:00', '13:00'), ...])
+# y CITAS_DURACIONES ({'limpieza': 45, ...}, en minutos).
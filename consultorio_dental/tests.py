@@ -0,0 +1,185 @@
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.core import signing
+from django.core.paginator import Page
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from citas.index import EventIndex
+from pacientes.models import Paciente
+from tratamientos.models import Pago, Tratamiento
+
+from .paginacion import CURSOR_PARAM, CURSOR_SALT, PaginaCursor, PaginadorCursor, url_pagina
+
+
+class RecorridoMixin:
+    """Recorre todas las páginas hacia adelante y luego hacia atrás."""
+
+    def recorrer(self, paginador):
+        adelante = [paginador.page()]
+        while adelante[-1].has_next():
+            adelante.append(paginador.page(adelante[-1].cursor_siguiente))
+        atras = [adelante[-1]]
+        while atras[-1].has_previous():
+            atras.append(paginador.page(atras[-1].cursor_anterior))
+        return adelante, atras[::-1]
+
+    def comprobar_recorrido(self, paginador, esperados):
+        adelante, atras = self.recorrer(paginador)
+        for paginas in (adelante, atras):
+            pks = [objeto.pk for pagina in paginas for objeto in pagina]
+            # Ni repetidos ni saltados, en el orden del listado
+            self.assertEqual(pks, esperados)
+            self.assertEqual([pagina.number for pagina in paginas], list(range(1, len(paginas) + 1)))
+            self.assertTrue(all(len(pagina) == paginador.per_page for pagina in paginas[:-1]))
+        self.assertFalse(adelante[0].has_previous())
+        self.assertFalse(adelante[-1].has_next())
+        return adelante
+
+
+class PaginadorCursorPagosTests(RecorridoMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        paciente = Paciente.objects.create(
+            nombre_completo='Paciente Pagos', dni='11111111', fecha_nacimiento=date(1990, 1, 1), genero='M',
+        )
+        cls.tratamiento = Tratamiento.objects.create(
+            paciente=paciente, nombre='Ortodoncia', costo_total=Decimal('6000'), fecha_inicio=date(2024, 1, 1),
+        )
+        cls.fecha = timezone.make_aware(datetime(2024, 3, 1, 10, 0))
+        # 60 pagos a la misma hora: el orden lo decide solo el desempate por id
+        Pago.objects.bulk_create([
+            Pago(tratamiento=cls.tratamiento, monto=Decimal('10'), fecha_pago=cls.fecha) for _ in range(60)
+        ])
+        # Y algunos antes y después, para que haya rangos de fecha distintos
+        for dia in (2, 20):
+            Pago.objects.bulk_create([
+                Pago(tratamiento=cls.tratamiento, monto=Decimal('10'),
+                     fecha_pago=timezone.make_aware(datetime(2024, 3, dia, 9, 0)))
+                for _ in range(3)
+            ])
+
+    def esperados(self):
+        return list(Pago.objects.order_by('-fecha_pago', '-id').values_list('pk', flat=True))
+
+    def test_empates_en_fecha_sin_repetidos_ni_huecos(self):
+        paginador = PaginadorCursor(Pago.objects.all(), 7, ('-fecha_pago',))
+        adelante = self.comprobar_recorrido(paginador, self.esperados())
+        self.assertEqual(len(adelante), 10)
+
+    def test_solo_empates(self):
+        paginador = PaginadorCursor(Pago.objects.filter(fecha_pago=self.fecha), 7, ('-fecha_pago',))
+        adelante = self.comprobar_recorrido(
+            paginador, list(Pago.objects.filter(fecha_pago=self.fecha).order_by('-id').values_list('pk', flat=True)),
+        )
+        self.assertEqual(len(adelante), 9)
+
+    def test_orden_ascendente(self):
+        paginador = PaginadorCursor(Pago.objects.all(), 8, ('fecha_pago',))
+        self.comprobar_recorrido(paginador, self.esperados()[::-1])
+
+    def test_cursor_alterado_o_invalido_vuelve_a_la_primera(self):
+        paginador = PaginadorCursor(Pago.objects.all(), 7, ('-fecha_pago',))
+        primera = [pago.pk for pago in paginador.page()]
+        cursor = paginador.page().cursor_siguiente
+        otra_sal = signing.dumps({'v': ['x'], 'd': 'siguiente', 'n': 2}, salt='otra')
+        sin_campos = signing.dumps({'d': 'siguiente', 'n': 2}, salt=CURSOR_SALT)
+        valores_malos = signing.dumps({'v': ['no-es-fecha', 'x'], 'd': 'siguiente', 'n': 2}, salt=CURSOR_SALT)
+        for invalido in (cursor[:-2] + 'xx', cursor + 'a', 'basura', otra_sal, sin_campos, valores_malos):
+            with self.subTest(cursor=invalido):
+                pagina = paginador.page(invalido)
+                self.assertEqual(pagina.number, 1)
+                self.assertEqual([pago.pk for pago in pagina], primera)
+
+    def test_filas_borradas_despues_del_cursor(self):
+        paginador = PaginadorCursor(Pago.objects.all(), 7, ('-fecha_pago',))
+        adelante, _atras = self.recorrer(paginador)
+        penultima = adelante[-2]
+        Pago.objects.filter(pk__in=[pago.pk for pago in adelante[-1]]).delete()
+        pagina = paginador.page(penultima.cursor_siguiente)
+        self.assertEqual(pagina.number, 1)
+
+
+class PaginadorCursorPacientesTests(RecorridoMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        nombres = ['Ana Pérez', 'Luis Díaz', 'Ana Pérez', 'Zoe Ríos', 'Carla Soto'] * 5
+        for i, nombre in enumerate(nombres):
+            Paciente.objects.create(
+                nombre_completo=nombre, dni=f'{20000000 + i}', fecha_nacimiento=date(1990, 1, 1), genero='F',
+            )
+
+    def test_nombres_repetidos_sin_repetidos_ni_huecos(self):
+        paginador = PaginadorCursor(Paciente.objects.all(), 4, ('nombre_completo',))
+        esperados = list(Paciente.objects.order_by('nombre_completo', 'id').values_list('pk', flat=True))
+        self.assertEqual(len(self.comprobar_recorrido(paginador, esperados)), 7)
+
+    def test_con_filtro(self):
+        queryset = Paciente.objects.filter(nombre_completo='Ana Pérez')
+        paginador = PaginadorCursor(queryset, 3, ('nombre_completo',))
+        self.comprobar_recorrido(paginador, list(queryset.order_by('id').values_list('pk', flat=True)))
+
+
+class PaginacionVistasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(25):
+            Paciente.objects.create(
+                nombre_completo=f'Paciente {i % 5}', dni=f'{30000000 + i}', fecha_nacimiento=date(1990, 1, 1),
+                genero='M',
+            )
+
+    def setUp(self):
+        # La plantilla base muestra las citas de hoy: sin ir a buscar el calendario
+        parche = mock.patch('citas.context_processors.get_event_index', return_value=EventIndex([]))
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_lista_por_cursor_y_enlaces(self):
+        url = reverse('pacientes:lista')
+        response = self.client.get(url)
+        self.assertIsInstance(response.context['page_obj'], PaginaCursor)
+        self.assertIsNone(response.context['url_anterior'])
+        vistos = [p.pk for p in response.context['pacientes']]
+
+        siguiente = response.context['url_siguiente']
+        while siguiente:
+            response = self.client.get(url + siguiente)
+            self.assertEqual(response.status_code, 200)
+            vistos += [p.pk for p in response.context['pacientes']]
+            siguiente = response.context['url_siguiente']
+        self.assertEqual(vistos, list(Paciente.objects.order_by('nombre_completo', 'id').values_list('pk', flat=True)))
+        self.assertEqual(response.context['page_obj'].number, 3)
+
+        # Volver de la página 2 a la 1 no lleva cursor
+        response = self.client.get(url + response.context['url_anterior'])
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertNotIn(CURSOR_PARAM, parse_qs(urlparse(response.context['url_anterior']).query))
+
+    def test_page_n_sigue_paginando_por_numero(self):
+        response = self.client.get(reverse('pacientes:lista'), {'page': 2})
+        pagina = response.context['page_obj']
+        self.assertIsInstance(pagina, Page)
+        self.assertEqual(pagina.number, 2)
+        self.assertEqual(
+            [p.pk for p in pagina],
+            list(Paciente.objects.order_by('nombre_completo', 'id').values_list('pk', flat=True)[10:20]),
+        )
+        self.assertEqual(parse_qs(response.context['url_siguiente'][1:]), {'page': ['3']})
+
+    def test_url_pagina_conserva_los_filtros(self):
+        paginador = PaginadorCursor(Paciente.objects.all(), 10, ('nombre_completo',))
+        pagina = paginador.page()
+        request = RequestFactory().get('/pacientes/', {'q': 'ana', CURSOR_PARAM: 'viejo', 'page': '4'})
+        params = parse_qs(url_pagina(request, pagina)[1:])
+        self.assertEqual(params['q'], ['ana'])
+        self.assertEqual(params[CURSOR_PARAM], [pagina.cursor_siguiente])
+        self.assertNotIn('page', params)
+        self.assertIsNone(url_pagina(request, pagina, anterior=True))
@@ -1,5 +1,7 @@
 from django.template.loader import get_template
 from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject, lazy
+from functools import wraps
 import io
 import logging
 
@@ -37,3 +39,61 @@ def render_to_pdf(template_src, context_dict={}):
     except Exception as e:
         logger.exception("Error inesperado generando PDF")
         return HttpResponse(f"Error inesperado: {str(e)}", status=500)
+
+
+# ============================================
+# CONTEXT PROCESSORS PEREZOSOS
+# ============================================
+
+TODOS = '__todos__'
+
+
+def omitir_context_processors(*nombres):
+    """
+    Decorador para vistas parciales (AJAX/HTMX) o JSON que no necesitan los
+    datos globales de ``base.html``. Sin argumentos omite todos los context
+    processors del proyecto; con nombres, solo esos::
+
+        @omitir_context_processors()
+        def api_eventos_view(request): ...
+
+        @omitir_context_processors('cumpleanos_hoy', 'citas_pendientes_hoy')
+        def registro_paciente_publico(request): ...
+
+    Para vistas basadas en clases usar ``method_decorator`` sobre ``dispatch``.
+    """
+    if len(nombres) == 1 and callable(nombres[0]):
+        # Usado sin paréntesis: @omitir_context_processors
+        return omitir_context_processors()(nombres[0])
+
+    omitidos = frozenset(nombres) or frozenset([TODOS])
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            request.context_processors_omitidos = omitidos
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
+
+
+def context_processor_omitido(request, nombre):
+    """True si la vista pidió omitir el context processor ``nombre``."""
+    if request is None:
+        return False
+    # Solo las vistas marcadas con ``omitir_context_processors``: una página
+    # completa pedida por AJAX necesita los mismos datos que cualquier otra
+    omitidos = getattr(request, 'context_processors_omitidos', None)
+    if omitidos is None:
+        return False
+    return TODOS in omitidos or nombre in omitidos
+
+
+def lista_perezosa(funcion):
+    """Lista que solo se calcula cuando la plantilla la usa (una sola vez)."""
+    return SimpleLazyObject(lambda: list(funcion()))
+
+
+def conteo_perezoso(lista):
+    """``len()`` perezoso de una ``lista_perezosa`` (no dispara otra consulta)."""
+    return lazy(lambda: len(lista), int)()
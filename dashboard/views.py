@@ -6,6 +6,8 @@ from django.utils import timezone
 from datetime import timedelta, datetime
 from decimal import Decimal
 
+from consultorio_dental.utils import omitir_context_processors
+
 from pacientes.models import Paciente
 from tratamientos.models import Tratamiento, Pago
 from historias.models import EntradaHistoria
@@ -41,17 +43,10 @@ def dashboard_view(request):
         estado='en_progreso'
     ).count()
     
-    # 4. Deuda Total
-    tratamientos_con_deuda = Tratamiento.objects.annotate(
-        suma_pagos=Sum('pagos__monto')
-    ).filter(
-        Q(suma_pagos__lt=F('costo_total')) | Q(suma_pagos__isnull=True)
-    )
+    # 4. Deuda Total (saldo guardado en cada tratamiento)
+    tratamientos_con_deuda = Tratamiento.objects.filter(saldo__gt=0)
     
-    deuda_total = sum([
-        (t.costo_total - (t.pagos.aggregate(Sum('monto'))['monto__sum'] or Decimal('0.00')))
-        for t in tratamientos_con_deuda
-    ])
+    deuda_total = tratamientos_con_deuda.aggregate(total=Sum('saldo'))['total'] or Decimal('0.00')
     
     # 5. Citas de esta semana (Carga asíncrona via AJAX)
     # Se obtienen en una vista separada para mejorar LCP
@@ -72,27 +67,21 @@ def dashboard_view(request):
     # ============ LISTAS RÁPIDAS ============
     
     # Pacientes con mayor deuda
-    pacientes_deuda = []
-    for t in tratamientos_con_deuda.select_related('paciente')[:10]:
-        pagado = t.pagos.aggregate(Sum('monto'))['monto__sum'] or Decimal('0.00')
-        deuda = t.costo_total - pagado
-        if deuda > 0:
-            pacientes_deuda.append({
-                'paciente': t.paciente,
-                'tratamiento': t,
-                'deuda': deuda
-            })
-    
-    pacientes_deuda = sorted(pacientes_deuda, key=lambda x: x['deuda'], reverse=True)[:5]
+    pacientes_deuda = [
+        {
+            'paciente': t.paciente,
+            'tratamiento': t,
+            'deuda': t.saldo
+        }
+        for t in tratamientos_con_deuda.with_finanzas().order_by('-saldo')[:5]
+    ]
     
     # Últimos tratamientos creados
-    ultimos_tratamientos = Tratamiento.objects.select_related('paciente').order_by('-fecha_inicio')[:5]
+    ultimos_tratamientos = Tratamiento.objects.with_finanzas().order_by('-fecha_inicio')[:5]
     
     # Cumpleaños próximos (próximos 30 días)
     hoy = now.date()
-    cumpleanos_proximos = Paciente.objects.filter(
-        fecha_nacimiento__month__gte=hoy.month
-    ).order_by('fecha_nacimiento__month', 'fecha_nacimiento__day')[:5]
+    cumpleanos_proximos = Paciente.objects.cumpleanos_proximos(dias=30, hoy=hoy)[:5]
     
     # ============ DATOS PARA GRÁFICOS ============
     
@@ -287,30 +276,17 @@ def estadisticas_view(request):
     }
     
 
+@omitir_context_processors()
 def dashboard_citas_api(request):
     """
     API para cargar el widget de citas del dashboard asíncronamente
     """
-    from citas.utils import get_calendar_events
-    import pytz
+    from citas.utils import get_event_index
     
     # Renderizar solo el partial
     try:
-        all_events = get_calendar_events()
-        
-        # Configurar fechas
-        now = timezone.now()
-        limatz = pytz.timezone('America/Lima')
-        now_lima = now.astimezone(limatz)
-        
-        proximas_citas = []
-        for event in all_events:
-            # Recopilar próximas citas (futuras)
-            if event.local_begin >= now_lima:
-                proximas_citas.append(event)
-        
-        # Limitar a 5
-        proximas_citas = proximas_citas[:5]
+        # Próximas 5 citas (futuras)
+        proximas_citas = get_event_index().upcoming(5)
         
     except Exception:
         proximas_citas = []
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('historias', '0002_alter_imagenhistoria_imagen'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='entradahistoria',
+            index=models.Index(fields=['fecha', 'id'], name='entrada_historia_fecha_id'),
+        ),
+    ]
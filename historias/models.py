@@ -35,6 +35,9 @@ class EntradaHistoria(models.Model):
         verbose_name = "Entrada de Historia Clínica"
         verbose_name_plural = "Entradas de Historia Clínica"
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='entrada_historia_fecha_id'),
+        ]
 
     def __str__(self):
         return f"Entrada del {self.fecha.strftime('%d/%m/%Y %H:%M')} - {self.paciente.nombre_completo}"
@@ -10,17 +10,19 @@ from pacientes.models import Paciente
 from .models import EntradaHistoria, ImagenHistoria
 from .forms import EntradaHistoriaForm, ImagenHistoriaForm
 from auditoria.utils import registrar_log
+from consultorio_dental.paginacion import PaginacionCursorMixin
 
 # ===== VISTAS DE ENTRADAS =====
 
 from django.db.models import Q, Count
 from datetime import date
 
-class ListaEntradasView(ListView):
+class ListaEntradasView(PaginacionCursorMixin, ListView):
     model = EntradaHistoria
     template_name = 'historias/lista_entradas.html'
     context_object_name = 'entradas'
     paginate_by = 10
+    orden_cursor = ('-fecha',)
 
     def get_queryset(self):
         paciente_id = self.kwargs.get('paciente_id')
@@ -2,14 +2,17 @@
 
 from django import forms
 from django.forms import inlineformset_factory
+from pacientes.widgets import SelectorPacienteField, SelectorPacienteWidget
 from .models import Nota, ImagenNota
 
 class NotaForm(forms.ModelForm):
     class Meta:
         model = Nota
         fields = ['paciente', 'titulo', 'contenido']
+        # Autocompletado en vez de un <select> con todos los pacientes
+        field_classes = {'paciente': SelectorPacienteField}
         widgets = {
-            'paciente': forms.Select(attrs={'class': 'form-select'}),
+            'paciente': SelectorPacienteWidget(attrs={'class': 'form-control', 'placeholder': 'Nota general (sin paciente) o busca por nombre, DNI o teléfono'}),
             'titulo': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: Recordatorio, Observación, etc.'}),
             'contenido': forms.Textarea(attrs={'class': 'form-control', 'rows': 5, 'placeholder': 'Escribe aquí el contenido de la nota...'}),
         }
@@ -18,7 +21,6 @@ class NotaForm(forms.ModelForm):
         paciente_id = kwargs.pop('paciente_id', None)
         super().__init__(*args, **kwargs)
         self.fields['paciente'].required = False
-        self.fields['paciente'].empty_label = "— Nota general (sin paciente) —"
         if paciente_id:
             self.fields['paciente'].initial = paciente_id
             self.fields['paciente'].widget = forms.HiddenInput()
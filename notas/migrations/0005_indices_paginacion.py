@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notas', '0004_imagennota_imagen_drive_url_alter_imagennota_imagen'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='nota',
+            index=models.Index(fields=['creado_en', 'id'], name='nota_creado_id'),
+        ),
+    ]
@@ -33,6 +33,9 @@ class Nota(models.Model):
         verbose_name = "Nota"
         verbose_name_plural = "Notas"
         ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['creado_en', 'id'], name='nota_creado_id'),
+        ]
 
     def __str__(self):
         return f"{self.titulo} - {self.creado_en.strftime('%d/%m/%Y')}"
@@ -14,12 +14,14 @@ from .models import Nota, ImagenNota
 from .forms import NotaForm, ImagenNotaForm
 
 from auditoria.utils import registrar_log
+from consultorio_dental.paginacion import PaginacionCursorMixin
 
-class ListaNotasView(ListView):
+class ListaNotasView(PaginacionCursorMixin, ListView):
     model = Nota
     template_name = 'notas/lista_notas.html'
     context_object_name = 'notas'
     paginate_by = 10
+    orden_cursor = ('-creado_en',)
 
     def get_queryset(self):
         paciente_id = self.kwargs.get('paciente_id')
@@ -1,5 +1,22 @@
 from django.contrib import admin
 from .models import Paciente, TokenFichaPaciente, FichaMedicaPaciente
+from .widgets import SelectorPacienteField
+
+
+class SelectorPacienteAdminMixin:
+    """
+    Muestra las FK a ``Paciente`` con el selector con autocompletado en vez
+    de un ``<select>`` con todos los pacientes.
+    """
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if (
+            db_field.related_model is Paciente
+            and db_field.name not in self.raw_id_fields
+            and db_field.name not in self.get_autocomplete_fields(request)
+        ):
+            kwargs.setdefault('form_class', SelectorPacienteField)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 @admin.register(Paciente)
@@ -10,7 +27,7 @@ class PacienteAdmin(admin.ModelAdmin):
 
 
 @admin.register(TokenFichaPaciente)
-class TokenFichaPacienteAdmin(admin.ModelAdmin):
+class TokenFichaPacienteAdmin(SelectorPacienteAdminMixin, admin.ModelAdmin):
     list_display = ('paciente', 'token', 'creado_en', 'expira_en', 'completado', 'dias_restantes')
     list_filter = ('completado', 'creado_en')
     search_fields = ('paciente__nombre_completo', 'token')
@@ -22,7 +39,7 @@ class TokenFichaPacienteAdmin(admin.ModelAdmin):
 
 
 @admin.register(FichaMedicaPaciente)
-class FichaMedicaPacienteAdmin(admin.ModelAdmin):
+class FichaMedicaPacienteAdmin(SelectorPacienteAdminMixin, admin.ModelAdmin):
     list_display = ('paciente', 'email', 'fecha_completado', 'acepta_tratamiento_datos')
     search_fields = ('paciente__nombre_completo', 'email')
     list_filter = ('fecha_completado', 'acepta_tratamiento_datos', 'acepta_contacto')
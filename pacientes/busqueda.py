@@ -0,0 +1,311 @@
+# pacientes/busqueda.py
+"""
+Búsqueda de pacientes por nombre, DNI o teléfono.
+
+Cada paciente guarda en ``busqueda`` su nombre, DNI y teléfono normalizados
+(minúsculas, sin tildes ni signos). Sobre esa columna hay un índice de texto:
+
+- SQLite: tabla FTS5 ``pacientes_busqueda_fts`` con tokenizador de
+  trigramas (rowid = id del paciente) y un vocabulario de las palabras de
+  los nombres (``pacientes_busqueda_vocab``) para corregir errores de
+  tipeo. Las mantienen las señales de ``Paciente`` y se reconstruyen con
+  ``manage.py reindexar_busqueda``.
+- PostgreSQL: índice GIN ``pg_trgm`` sobre ``busqueda``.
+
+Los trigramas encuentran cualquier fragmento ("tierr" -> "Gutiérrez"). Si
+una palabra no aparece en ningún paciente se reemplaza por las palabras más
+parecidas del vocabulario ("gutierez" -> "gutierrez"). Los candidatos se
+ordenan en Python: DNI o teléfono exacto, nombres que empiezan por lo
+buscado, palabras que empiezan por lo buscado y similitud de trigramas.
+"""
+
+import re
+import unicodedata
+
+from django.db import connection
+
+FTS_TABLE = 'pacientes_busqueda_fts'
+VOCAB_TABLE = 'pacientes_busqueda_vocab'
+
+# FTS5 con trigramas solo indexa términos de 3 o más caracteres
+MIN_TRIGRAMA = 3
+# Máximo de resultados de una búsqueda (los más relevantes)
+LIMITE_CANDIDATOS = 500
+# Palabras del vocabulario que reemplazan a una palabra mal escrita
+MAX_CORRECCIONES = 3
+MIN_SIMILITUD = 0.3
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar(texto):
+    """Minúsculas, sin tildes ni signos: 'Pérez-Núñez, José' -> 'perez nunez jose'."""
+    texto = texto or ''
+    if not texto.isascii():
+        # NFKD separa las tildes de las letras; lo que no es ASCII lo quita la regex de todos modos
+        texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return _NO_ALFANUMERICO.sub(' ', texto.lower()).strip()
+
+
+def texto_busqueda(nombre, dni, telefono=''):
+    """Valor de la columna ``Paciente.busqueda``."""
+    return ' '.join(parte for parte in (normalizar(nombre), normalizar(dni), normalizar(telefono)) if parte)
+
+
+def trigramas(palabra):
+    palabra = f'  {palabra} '
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+def similitud(a, b):
+    """Coeficiente de Jaccard entre los trigramas de dos palabras (0..1)."""
+    ta, tb = trigramas(a), trigramas(b)
+    return len(ta & tb) / len(ta | tb)
+
+
+class _Ranking:
+    """Ordena candidatos ``(id, texto)`` según su parecido con la consulta."""
+
+    def __init__(self, consulta):
+        self.consulta = consulta
+        self.palabras = consulta.split()
+        self.trigramas = [trigramas(p) for p in self.palabras]
+
+    def puntaje(self, texto):
+        """Clave de orden (mayor es mejor)."""
+        palabras_texto = texto.split()
+        parecido = 0.0
+        for palabra, tp in zip(self.palabras, self.trigramas):
+            mejor = 0.0
+            for w in palabras_texto:
+                if w == palabra:
+                    mejor = 1.0
+                    break
+                tw = trigramas(w)
+                mejor = max(mejor, len(tp & tw) / len(tp | tw))
+            parecido += mejor
+        return (
+            self.consulta in palabras_texto,  # DNI o teléfono exacto
+            texto.startswith(self.consulta),
+            all(any(w.startswith(p) for w in palabras_texto) for p in self.palabras),
+            parecido / len(self.palabras),
+        )
+
+    def ordenar(self, filas, minimo=0.0):
+        """Ids ordenados; sin coincidencia directa exige una similitud ``minimo``."""
+        puntuadas = []
+        for pk, texto in filas:
+            puntaje = self.puntaje(texto)
+            if any(puntaje[:3]) or puntaje[3] >= minimo:
+                puntuadas.append((puntaje, pk))
+        # sort es estable: a igual puntaje se mantiene el orden de llegada
+        puntuadas.sort(key=lambda item: item[0], reverse=True)
+        return [pk for _puntaje, pk in puntuadas]
+
+
+class ResultadosBusqueda:
+    """
+    Resultado de ``Paciente.objects.buscar()``: secuencia ordenada por
+    relevancia que solo trae de la base de datos los pacientes de cada
+    rebanada, así que funciona con ``Paginator`` sin ordenar en SQL.
+    """
+
+    def __init__(self, queryset, ids):
+        self.queryset = queryset
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, int):
+            return self[indice:indice + 1][0]
+        ids = self.ids[indice]
+        objetos = self.queryset.in_bulk(ids)
+        return [objetos[pk] for pk in ids if pk in objetos]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+# ============================================
+# SQLITE (FTS5)
+# ============================================
+
+def _fts(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _frase(palabra):
+    # Tras normalizar solo quedan [a-z0-9]: no hay comillas que escapar
+    return f'"{palabra}"'
+
+
+def _correcciones(palabra):
+    """Palabras del vocabulario parecidas a ``palabra``, o ``[palabra]`` si existe."""
+    if palabra.isdigit() or _fts(
+        f'SELECT 1 FROM {VOCAB_TABLE} WHERE {VOCAB_TABLE} MATCH %s LIMIT 1', [_frase(palabra)]
+    ):
+        return [palabra]
+    expresion = ' OR '.join(_frase(t) for t in sorted(trigramas(palabra)) if ' ' not in t)
+    if not expresion:
+        return [palabra]
+    candidatas = [fila[0] for fila in _fts(
+        f'SELECT palabra FROM {VOCAB_TABLE} WHERE {VOCAB_TABLE} MATCH %s', [expresion]
+    )]
+    parecidas = sorted(
+        ((similitud(palabra, c), c) for c in candidatas), reverse=True
+    )[:MAX_CORRECCIONES]
+    return [c for s, c in parecidas if s >= MIN_SIMILITUD] or [palabra]
+
+
+def _por_prefijo(consulta, limite):
+    """Pacientes cuyo nombre empieza por ``consulta`` (usa el índice B-tree de ``busqueda``)."""
+    return _fts(
+        'SELECT id, busqueda FROM pacientes_paciente WHERE busqueda >= %s AND busqueda < %s LIMIT %s',
+        [consulta, consulta + '\uffff', limite],
+    )
+
+
+def _buscar_fts(consulta, limite):
+    palabras = consulta.split()
+    largas = [p for p in palabras if len(p) >= MIN_TRIGRAMA]
+    if not largas:
+        return _buscar_like(consulta, limite)
+    # Las palabras cortas no están en el índice: se exigen como inicio de palabra
+    cortas = [p for p in palabras if len(p) < MIN_TRIGRAMA]
+
+    def candidatos(expresion):
+        filas = _por_prefijo(consulta, LIMITE_CANDIDATOS) + _fts(
+            f'SELECT rowid, texto FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT %s',
+            [expresion, LIMITE_CANDIDATOS],
+        )
+        if cortas:
+            filas = [
+                (pk, texto) for pk, texto in filas
+                if all(any(w.startswith(c) for w in texto.split()) for c in cortas)
+            ]
+        return list(dict(filas).items())
+
+    ranking = _Ranking(consulta)
+    ids = ranking.ordenar(candidatos(' AND '.join(_frase(p) for p in largas)))
+    if ids:
+        return ids[:limite]
+
+    # Tolerancia a errores: cada palabra inexistente se cambia por las más parecidas
+    grupos = []
+    for palabra in largas:
+        grupos.append('(' + ' OR '.join(_frase(c) for c in _correcciones(palabra)) + ')')
+    return ranking.ordenar(candidatos(' AND '.join(grupos)), MIN_SIMILITUD)[:limite]
+
+
+# ============================================
+# POSTGRESQL (pg_trgm) Y OTROS MOTORES
+# ============================================
+
+def _buscar_trigram(consulta, limite):
+    from django.db.models.expressions import RawSQL
+
+    from .models import Paciente
+
+    # word_similarity: parecido de la consulta con la parte más similar del texto
+    filas = Paciente.objects.annotate(
+        similitud=RawSQL('word_similarity(%s, busqueda)', [consulta])
+    ).extra(
+        where=['(busqueda LIKE %s OR %s <%% busqueda)'],
+        params=[f'%{consulta}%', consulta],
+    ).order_by('-similitud').values_list('pk', 'busqueda')[:LIMITE_CANDIDATOS]
+    return _Ranking(consulta).ordenar(filas, MIN_SIMILITUD)[:limite]
+
+
+def _buscar_like(consulta, limite):
+    from django.db.models import Q
+
+    from .models import Paciente
+
+    filtro = Q()
+    for palabra in consulta.split():
+        filtro &= Q(busqueda__startswith=palabra) | Q(busqueda__contains=f' {palabra}')
+    filas = Paciente.objects.filter(filtro).values_list('pk', 'busqueda')[:LIMITE_CANDIDATOS]
+    return _Ranking(consulta).ordenar(filas)[:limite]
+
+
+def buscar_ids(texto, limite=LIMITE_CANDIDATOS):
+    """Ids de pacientes que coinciden con ``texto``, del más relevante al menos."""
+    consulta = normalizar(texto)
+    if not consulta:
+        return []
+    if connection.vendor == 'sqlite':
+        return _buscar_fts(consulta, limite)
+    if connection.vendor == 'postgresql':
+        return _buscar_trigram(consulta, limite)
+    return _buscar_like(consulta, limite)
+
+
+# ============================================
+# MANTENIMIENTO DEL ÍNDICE
+# ============================================
+
+def _palabras_vocabulario(texto):
+    return {w for w in texto.split() if len(w) >= MIN_TRIGRAMA and not w.isdigit()}
+
+
+def _agregar_vocabulario(cursor, palabras):
+    for palabra in palabras:
+        cursor.execute(
+            f'SELECT palabra FROM {VOCAB_TABLE} WHERE {VOCAB_TABLE} MATCH %s', [_frase(palabra)]
+        )
+        if palabra not in {fila[0] for fila in cursor.fetchall()}:
+            cursor.execute(f'INSERT INTO {VOCAB_TABLE} (palabra) VALUES (%s)', [palabra])
+
+
+def indexar(paciente_id, texto):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [paciente_id])
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, texto) VALUES (%s, %s)', [paciente_id, texto])
+        # Las palabras que dejan de usarse quedan en el vocabulario hasta el
+        # próximo reindexar(): como mucho sugieren una corrección sin resultados
+        _agregar_vocabulario(cursor, _palabras_vocabulario(texto))
+
+
+def desindexar(paciente_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [paciente_id])
+
+
+def reindexar():
+    """
+    Recalcula ``Paciente.busqueda`` (por si hubo cambios con ``update()`` o
+    ``bulk_create``, que no pasan por ``save()``) y reconstruye el índice.
+    Devuelve el número de pacientes indexados.
+    """
+    from .models import Paciente
+
+    pacientes = []
+    vocabulario = set()
+    for paciente in Paciente.objects.only('pk', 'nombre_completo', 'dni', 'telefono', 'busqueda').iterator():
+        texto = texto_busqueda(paciente.nombre_completo, paciente.dni, paciente.telefono)
+        vocabulario |= _palabras_vocabulario(texto)
+        if paciente.busqueda != texto:
+            paciente.busqueda = texto
+            pacientes.append(paciente)
+    Paciente.objects.bulk_update(pacientes, ['busqueda'], batch_size=500)
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, texto) SELECT id, busqueda FROM pacientes_paciente')
+            cursor.execute(f'DELETE FROM {VOCAB_TABLE}')
+            cursor.executemany(
+                f'INSERT INTO {VOCAB_TABLE} (palabra) VALUES (%s)', [(p,) for p in sorted(vocabulario)]
+            )
+    return Paciente.objects.count()
@@ -1,14 +1,14 @@
 # pacientes/context_processors.py
-from .models import Paciente
-from datetime import date
+from .cumpleanos import cumpleaneros_del_dia
+from consultorio_dental.utils import context_processor_omitido, conteo_perezoso, lista_perezosa
 
 def cumpleanos_hoy(request):
-    hoy = date.today()
-    cumpleaneros = Paciente.objects.filter(
-        fecha_nacimiento__month=hoy.month,
-        fecha_nacimiento__day=hoy.day
-    )
+    if context_processor_omitido(request, 'cumpleanos_hoy'):
+        return {}
+
+    # Resumen del día precalculado en la caché (ver pacientes.cumpleanos)
+    cumpleaneros_hoy = lista_perezosa(cumpleaneros_del_dia)
     return {
-        'cumpleaneros_hoy_count': cumpleaneros.count(),
-        'cumpleaneros_hoy': cumpleaneros
-    }
\ No newline at end of file
+        'cumpleaneros_hoy_count': conteo_perezoso(cumpleaneros_hoy),
+        'cumpleaneros_hoy': cumpleaneros_hoy
+    }
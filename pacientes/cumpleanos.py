@@ -0,0 +1,68 @@
+# pacientes/cumpleanos.py
+"""
+Resumen diario de cumpleaños.
+
+La lista de cumpleañeros del día se calcula una sola vez y se guarda en la
+caché con la fecha en la clave; las páginas solo leen esa clave. Las señales
+de ``Paciente`` corrigen el resumen de hoy cuando un paciente entra o sale
+de la lista (alta, baja o cambio de fecha de nacimiento / nombre).
+"""
+
+from datetime import date
+
+from django.core.cache import cache
+
+from .models import Paciente
+
+# Se guarda un poco más de un día por si el reloj de algún proceso va atrasado
+DURACION = 60 * 60 * 48
+
+
+def _clave(dia):
+    return f'pacientes:cumpleanos:{dia.isoformat()}'
+
+
+def _entrada(paciente):
+    return {
+        'id': paciente.pk,
+        'nombre_completo': paciente.nombre_completo,
+        'edad': paciente.edad,
+    }
+
+
+def _ordenar(entradas):
+    entradas.sort(key=lambda e: (e['nombre_completo'], e['id']))
+    return entradas
+
+
+def cumpleaneros_del_dia(hoy=None):
+    """Lista de dicts ``{id, nombre_completo, edad}`` de los que cumplen años hoy."""
+    hoy = hoy or date.today()
+    entradas = cache.get(_clave(hoy))
+    if entradas is None:
+        entradas = _ordenar([_entrada(p) for p in Paciente.objects.cumpleanos_hoy(hoy)])
+        cache.set(_clave(hoy), entradas, timeout=DURACION)
+    return entradas
+
+
+def actualizar_resumen(paciente, eliminado=False, hoy=None):
+    """
+    Corrige el resumen de hoy (si ya está calculado) para ``paciente``.
+    Solo escribe en la caché si el paciente entra, sale o cambia en la lista.
+    """
+    hoy = hoy or date.today()
+    clave = _clave(hoy)
+    entradas = cache.get(clave)
+    if entradas is None:
+        # Se calculará completo en la próxima lectura
+        return
+
+    actual = next((e for e in entradas if e['id'] == paciente.pk), None)
+    nueva = _entrada(paciente) if not eliminado and paciente.cumple_en(hoy) else None
+    if actual == nueva:
+        return
+
+    entradas = [e for e in entradas if e['id'] != paciente.pk]
+    if nueva is not None:
+        entradas.append(nueva)
+    cache.set(clave, _ordenar(entradas), timeout=DURACION)
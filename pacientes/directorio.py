@@ -0,0 +1,325 @@
+# pacientes/directorio.py
+"""
+Directorio de pacientes en memoria para el autocompletado.
+
+Cada proceso guarda, en arreglos paralelos, el id, nombre, DNI, teléfono
+y texto de búsqueda (``Paciente.busqueda``: nombre, DNI y teléfono ya
+normalizados) de todos los pacientes, más un índice de prefijos ordenado.
+Sus claves son las rotaciones de las palabras del nombre ("juan perez
+garcia", "perez garcia juan", "garcia juan perez"), así que se encuentra
+escribiendo desde cualquier palabra y con los apellidos primero, más el
+DNI y el teléfono. Buscar es un ``bisect`` sobre ese índice, sin tocar la
+BD.
+
+El directorio se carga la primera vez que se usa y nunca se modifica: los
+cambios arman uno nuevo que reemplaza al anterior de una sola vez, así que
+las lecturas no necesitan candados. El nuevo comparte la base del anterior
+y lleva los cambios en un índice aparte; un cambio cuesta O(pendientes),
+no O(pacientes), y la base se rearma (O(n log n), en memoria) recién
+cuando se juntan ``MIN_PENDIENTES`` cambios o el 5 % de los pacientes.
+
+Para que todos los procesos vean los cambios, las señales de ``Paciente``
+anotan en la caché compartida un contador de versión y qué paciente cambió
+en cada versión. En cada consulta el proceso compara su versión con la de
+la caché (una lectura de una clave pequeña) y, si está atrasado, relee de
+la BD solo los pacientes que cambiaron. Si la caché se vació (cambia la
+época) o se perdieron cambios, recarga todo.
+"""
+
+import heapq
+import threading
+import uuid
+from array import array
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+
+from .busqueda import normalizar
+
+EPOCA_KEY = 'pacientes:directorio:epoca'
+VERSION_KEY = 'pacientes:directorio:version'
+CAMBIO_KEY = 'pacientes:directorio:cambio:{epoca}:{version}'
+CAMBIO_TIMEOUT = 60 * 60 * 24
+# Con más cambios pendientes que estos se recarga todo el directorio
+MAX_CAMBIOS = 500
+LIMITE = 10
+# Revisiones del índice para búsquedas de varias palabras en otro orden
+MAX_REVISADAS = 2000
+# Cambios pendientes (mínimo) antes de rearmar la base del directorio
+MIN_PENDIENTES = 1000
+
+_FIN = '\uffff'
+
+
+def _claves(texto, dni, telefono):
+    # ``texto`` es nombre + DNI + teléfono normalizados (ver texto_busqueda)
+    cola = [c for c in (normalizar(dni), normalizar(telefono)) if c]
+    palabras = texto.split()
+    nombre = palabras[:max(len(palabras) - sum(len(c.split()) for c in cola), 1)]
+    claves = {' '.join(nombre[i:] + nombre[:i]) for i in range(len(nombre))}
+    claves.update(cola)
+    # "999 111 222" también como "999111222"
+    claves.update(c.replace(' ', '') for c in cola)
+    return claves
+
+
+class Directorio:
+    """
+    Instantánea inmutable de los pacientes con su índice de prefijos.
+
+    La base (arreglos paralelos y claves ordenadas) solo se arma en
+    ``desde_filas``. Los cambios posteriores van a un índice aparte, chico,
+    que se consulta junto con la base: ``pendientes`` (pk -> fila nueva) y
+    ``ocultos`` (pks cuya fila de la base ya no vale, por cambio o borrado).
+    Así aplicar un cambio cuesta en proporción a los pendientes y no al
+    total de pacientes. Cuando los pendientes pasan de ``_umbral()`` se
+    rearma la base en memoria, sin ir a la BD (O(n log n), repartido entre
+    todos esos cambios).
+    """
+
+    def __init__(self, ids, nombres, dnis, telefonos, textos, claves, posiciones,
+                 pendientes=None, ocultos=frozenset(), posicion=None, claves_pendientes=None):
+        self.ids = ids                    # array('q')
+        self.nombres = nombres
+        self.dnis = dnis
+        self.telefonos = telefonos
+        self.textos = textos
+        self.claves = claves              # ordenadas
+        self.posiciones = posiciones      # array('i'): posición del paciente de cada clave
+        self.posicion = posicion if posicion is not None else {pk: i for i, pk in enumerate(ids)}
+        self.pendientes = pendientes or {}    # pk -> (nombre, dni, telefono, texto)
+        self.ocultos = ocultos
+        # (clave, pk) de los pendientes, ordenadas
+        if claves_pendientes is None:
+            claves_pendientes = sorted(
+                (clave, pk)
+                for pk, (_nombre, dni, telefono, texto) in self.pendientes.items()
+                for clave in _claves(texto, dni, telefono)
+            )
+        self.claves_pendientes = claves_pendientes
+        # Los pendientes que ya estaban en la base están también en ``ocultos``
+        self.total = len(self.posicion) - len(ocultos) + len(self.pendientes)
+
+    @classmethod
+    def desde_filas(cls, filas):
+        """``filas``: iterable de ``(pk, nombre_completo, dni, telefono, busqueda)``."""
+        ids, nombres, dnis, telefonos, textos = array('q'), [], [], [], []
+        claves, posiciones = [], []
+        for i, (pk, nombre, dni, telefono, texto) in enumerate(filas):
+            ids.append(pk)
+            nombres.append(nombre)
+            dnis.append(dni)
+            telefonos.append(telefono)
+            textos.append(texto)
+            for clave in _claves(texto, dni, telefono):
+                claves.append(clave)
+                posiciones.append(i)
+        orden = sorted(range(len(claves)), key=claves.__getitem__)
+        return cls(
+            ids, nombres, dnis, telefonos, textos,
+            [claves[j] for j in orden], array('i', [posiciones[j] for j in orden]),
+        )
+
+    def __len__(self):
+        return self.total
+
+    def _umbral(self):
+        return max(MIN_PENDIENTES, len(self.posicion) // 20)
+
+    def filas(self):
+        """Todas las filas vigentes, como las recibe ``desde_filas``."""
+        for i, pk in enumerate(self.ids):
+            if pk not in self.ocultos:
+                yield pk, self.nombres[i], self.dnis[i], self.telefonos[i], self.textos[i]
+        for pk, fila in self.pendientes.items():
+            yield (pk, *fila)
+
+    def con_cambios(self, filas, eliminados):
+        """
+        Directorio nuevo con ``filas`` agregadas o actualizadas y
+        ``eliminados`` quitados. No copia la base: comparte sus arreglos.
+        """
+        pendientes = dict(self.pendientes)
+        ocultos = set(self.ocultos)
+        claves_pendientes = list(self.claves_pendientes)
+
+        def quitar_pendiente(pk):
+            anterior = pendientes.pop(pk, None)
+            if anterior:
+                _nombre, dni, telefono, texto = anterior
+                for clave in _claves(texto, dni, telefono):
+                    del claves_pendientes[bisect_left(claves_pendientes, (clave, pk))]
+
+        for pk in eliminados:
+            quitar_pendiente(pk)
+            if pk in self.posicion:
+                ocultos.add(pk)
+        for pk, nombre, dni, telefono, texto in filas:
+            quitar_pendiente(pk)
+            pendientes[pk] = (nombre, dni, telefono, texto)
+            for clave in _claves(texto, dni, telefono):
+                insort(claves_pendientes, (clave, pk))
+            if pk in self.posicion:
+                ocultos.add(pk)
+
+        nuevo = Directorio(
+            self.ids, self.nombres, self.dnis, self.telefonos, self.textos, self.claves, self.posiciones,
+            pendientes, frozenset(ocultos), posicion=self.posicion, claves_pendientes=claves_pendientes,
+        )
+        if len(pendientes) + len(ocultos) > self._umbral():
+            return Directorio.desde_filas(nuevo.filas())
+        return nuevo
+
+    def _texto(self, pk):
+        fila = self.pendientes.get(pk)
+        return fila[3] if fila else self.textos[self.posicion[pk]]
+
+    def _rango(self, prefijo):
+        """pks con alguna clave que empieza por ``prefijo``, en orden de la clave."""
+        inicio, fin = bisect_left(self.claves, prefijo), bisect_left(self.claves, prefijo + _FIN)
+        base = (
+            (self.claves[j], self.ids[self.posiciones[j]]) for j in range(inicio, fin)
+            if self.ids[self.posiciones[j]] not in self.ocultos
+        )
+        inicio_p = bisect_left(self.claves_pendientes, (prefijo,))
+        fin_p = bisect_left(self.claves_pendientes, (prefijo + _FIN,))
+        if inicio_p == fin_p:
+            return (pk for _clave, pk in base), fin - inicio
+        pendientes = self.claves_pendientes[inicio_p:fin_p]
+        return (pk for _clave, pk in heapq.merge(base, pendientes)), fin - inicio + fin_p - inicio_p
+
+    def buscar(self, texto, limite=LIMITE, desde=0):
+        """
+        Pks de los pacientes cuyo nombre (desde cualquier palabra y dando la
+        vuelta), DNI o teléfono empieza por ``texto``; si no alcanzan,
+        también los que tienen todas las palabras de ``texto`` salteadas
+        ("perez juan" -> "Juan Carlos Pérez"). En orden alfabético de la
+        clave que coincidió. ``desde`` salta resultados (para paginar).
+        """
+        consulta = normalizar(texto)
+        if not consulta:
+            return []
+        vistos = set()
+        encontrados = []
+        necesarios = desde + limite
+
+        for pk in self._rango(consulta)[0]:
+            if pk not in vistos:
+                vistos.add(pk)
+                encontrados.append(pk)
+                if len(encontrados) >= necesarios:
+                    return encontrados[desde:]
+
+        palabras = consulta.split()
+        if len(palabras) > 1:
+            # Se recorre el rango de la palabra más selectiva
+            rangos = [self._rango(p) for p in palabras]
+            candidatos = min(rangos, key=lambda r: r[1])[0]
+            # ' juan' dentro de ' maria juana ...': alguna palabra empieza por 'juan'
+            prefijos = [' ' + p for p in palabras]
+            for revisadas, pk in enumerate(candidatos):
+                if revisadas >= MAX_REVISADAS:
+                    break
+                if pk in vistos:
+                    continue
+                vistos.add(pk)
+                texto_paciente = ' ' + self._texto(pk)
+                if all(p in texto_paciente for p in prefijos):
+                    encontrados.append(pk)
+                    if len(encontrados) >= necesarios:
+                        break
+        return encontrados[desde:]
+
+    def fila(self, pk):
+        pendiente = self.pendientes.get(pk)
+        if pendiente:
+            nombre, dni, telefono, _texto = pendiente
+        else:
+            i = self.posicion[pk]
+            nombre, dni, telefono = self.nombres[i], self.dnis[i], self.telefonos[i]
+        return {'id': pk, 'nombre': nombre, 'dni': dni, 'telefono': telefono}
+
+
+# ============================================
+# ESTADO DEL PROCESO Y VERSIONES
+# ============================================
+
+# (época, versión, directorio) de este proceso; se reemplaza de una sola vez
+_proceso = (None, None, None)
+_candado = threading.Lock()
+
+
+def _version_actual():
+    epoca = cache.get(EPOCA_KEY)
+    if epoca is None:
+        # Época aleatoria: si se vacía la caché ningún proceso confunde su copia vieja
+        cache.add(EPOCA_KEY, uuid.uuid4().hex, timeout=None)
+        epoca = cache.get(EPOCA_KEY)
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 0, timeout=None)
+        version = cache.get(VERSION_KEY) or 0
+    return epoca, version
+
+
+def _filas(ids=None):
+    from .models import Paciente
+
+    pacientes = Paciente.objects.order_by()
+    if ids is not None:
+        pacientes = pacientes.filter(pk__in=ids)
+    return pacientes.values_list('pk', 'nombre_completo', 'dni', 'telefono', 'busqueda')
+
+
+def _actualizado(epoca, version, epoca_local, version_local, directorio):
+    """Directorio al día a partir del local, o ``None`` si hay que recargar todo."""
+    if directorio is None or epoca_local != epoca or version_local > version:
+        return None
+    if version - version_local > MAX_CAMBIOS:
+        return None
+    claves = [CAMBIO_KEY.format(epoca=epoca, version=v) for v in range(version_local + 1, version + 1)]
+    cambios = cache.get_many(claves)
+    if len(cambios) != len(claves):
+        return None
+    ids = set(cambios.values())
+    filas = list(_filas(ids))
+    return directorio.con_cambios(filas, ids - {fila[0] for fila in filas})
+
+
+def obtener_directorio():
+    """Directorio de este proceso, al día con la versión de la caché compartida."""
+    global _proceso
+
+    epoca, version = _version_actual()
+    epoca_local, version_local, directorio = _proceso
+    if epoca_local == epoca and version_local == version:
+        return directorio
+
+    with _candado:
+        epoca_local, version_local, directorio = _proceso
+        if epoca_local == epoca and version_local == version:
+            return directorio
+        nuevo = _actualizado(epoca, version, epoca_local, version_local, directorio)
+        if nuevo is None:
+            nuevo = Directorio.desde_filas(_filas().iterator(chunk_size=5000))
+        _proceso = (epoca, version, nuevo)
+        return nuevo
+
+
+def registrar_cambio(paciente_id):
+    """Receptor de las señales de ``Paciente``: nueva versión para todos los procesos."""
+    epoca, _version = _version_actual()
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # La clave expiró o se borró entre medio: se empieza de nuevo
+        cache.set(EPOCA_KEY, uuid.uuid4().hex, timeout=None)
+        cache.set(VERSION_KEY, 0, timeout=None)
+        return
+    cache.set(CAMBIO_KEY.format(epoca=epoca, version=version), paciente_id, timeout=CAMBIO_TIMEOUT)
+
+
+def autocompletar(texto, limite=LIMITE, desde=0):
+    """Lista de dicts ``{id, nombre, dni, telefono}`` de los pacientes que coinciden."""
+    directorio = obtener_directorio()
+    return [directorio.fila(pk) for pk in directorio.buscar(texto, limite, desde)]
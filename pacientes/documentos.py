@@ -0,0 +1,249 @@
+# pacientes/documentos.py
+"""
+Búsqueda global: pacientes, tratamientos, entradas de historia, notas y
+pagos en una sola tabla, ``DocumentoBusqueda``.
+
+Cada modelo tiene aquí una función que arma su documento (título,
+subtítulo, URL y texto normalizado). Las señales de ``pacientes.signals``
+los mantienen al guardar o borrar; ``manage.py reindexar_busqueda`` los
+reconstruye en bloque. La búsqueda es una sola consulta que ordena por
+relevancia dentro de cada tipo y devuelve como mucho ``cuota`` de cada uno:
+
+- SQLite: FTS5 (``pacientes_documentos_fts``) sincronizada por triggers,
+  con prefijos indexados y bm25 con más peso para el contenido propio que
+  para el nombre del paciente.
+- Otros motores: ``LIKE`` por palabra (con índices ``pg_trgm`` en
+  PostgreSQL), los más recientes primero.
+"""
+
+from django.apps import apps as django_apps
+from django.db import connection
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from .busqueda import normalizar, texto_busqueda
+from .models import DocumentoBusqueda
+
+FTS_TABLE = 'pacientes_documentos_fts'
+
+CUOTA_POR_TIPO = 5
+# Peso bm25 de cada columna de la FTS: texto propio, nombre del paciente
+PESOS = (10.0, 1.0)
+LARGO_SUBTITULO = 80
+
+
+def _unir(*partes):
+    return ' '.join(normalizar(str(parte)) for parte in partes if parte)
+
+
+def _resumen(texto):
+    return Truncator(' '.join((texto or '').split())).chars(LARGO_SUBTITULO)
+
+
+def _nombre_paciente(paciente):
+    return normalizar(paciente.nombre_completo) if paciente else ''
+
+
+def _doc_paciente(paciente):
+    return {
+        'paciente_id': paciente.pk,
+        'titulo': paciente.nombre_completo,
+        'subtitulo': f'DNI: {paciente.dni}' if paciente.dni else 'Sin DNI',
+        'url': reverse('pacientes:detalle', args=[paciente.pk]),
+        'fecha': paciente.creado_en,
+        'texto': texto_busqueda(paciente.nombre_completo, paciente.dni, paciente.telefono),
+        'nombre_paciente': '',
+    }
+
+
+def _doc_tratamiento(tratamiento):
+    return {
+        'paciente_id': tratamiento.paciente_id,
+        'titulo': tratamiento.nombre,
+        'subtitulo': tratamiento.get_estado_display(),
+        'url': reverse('tratamientos:detalle', args=[tratamiento.pk]),
+        'fecha': tratamiento.creado_en,
+        'texto': _unir(tratamiento.nombre, tratamiento.descripcion),
+        'nombre_paciente': _nombre_paciente(tratamiento.paciente),
+    }
+
+
+def _doc_historia(entrada):
+    return {
+        'paciente_id': entrada.paciente_id,
+        'titulo': entrada.motivo,
+        'subtitulo': _resumen(entrada.diagnostico),
+        'url': reverse('historias:detalle_entrada', args=[entrada.pk]),
+        'fecha': entrada.fecha,
+        'texto': _unir(entrada.motivo, entrada.diagnostico, entrada.notas, entrada.evolucion),
+        'nombre_paciente': _nombre_paciente(entrada.paciente),
+    }
+
+
+def _doc_nota(nota):
+    return {
+        'paciente_id': nota.paciente_id,
+        'titulo': nota.titulo,
+        'subtitulo': _resumen(nota.contenido),
+        'url': reverse('notas:detalle', args=[nota.pk]),
+        'fecha': nota.creado_en,
+        'texto': _unir(nota.titulo, nota.contenido),
+        'nombre_paciente': _nombre_paciente(nota.paciente),
+    }
+
+
+def _doc_pago(pago):
+    tratamiento = pago.tratamiento
+    fecha = timezone.localtime(pago.fecha_pago) if pago.fecha_pago else None
+    return {
+        'paciente_id': tratamiento.paciente_id,
+        'titulo': f'S/ {pago.monto} · {tratamiento.nombre}',
+        'subtitulo': ' · '.join(filter(None, [
+            fecha.strftime('%d/%m/%Y') if fecha else '',
+            pago.get_metodo_pago_display(),
+        ])),
+        'url': reverse('tratamientos:detalle', args=[tratamiento.pk]),
+        'fecha': pago.fecha_pago,
+        'texto': _unir(tratamiento.nombre, pago.get_metodo_pago_display(), pago.monto, pago.nota),
+        'nombre_paciente': _nombre_paciente(tratamiento.paciente),
+    }
+
+
+# tipo -> (modelo, constructor, select_related para reindexar, icono)
+TIPOS = {
+    'paciente': ('pacientes.Paciente', _doc_paciente, (), 'bi-person'),
+    'tratamiento': ('tratamientos.Tratamiento', _doc_tratamiento, ('paciente',), 'bi-heart-pulse'),
+    'historia': ('historias.EntradaHistoria', _doc_historia, ('paciente',), 'bi-journal-medical'),
+    'nota': ('notas.Nota', _doc_nota, ('paciente',), 'bi-sticky'),
+    'pago': ('tratamientos.Pago', _doc_pago, ('tratamiento__paciente',), 'bi-cash-coin'),
+}
+
+
+def tipo_de(modelo):
+    for tipo, (etiqueta, *_resto) in TIPOS.items():
+        if modelo._meta.label == etiqueta:
+            return tipo
+    return None
+
+
+# ============================================
+# MANTENIMIENTO
+# ============================================
+
+def guardar_documento(instancia):
+    """Crea o actualiza el documento de ``instancia`` (no escribe si no cambió)."""
+    tipo = tipo_de(type(instancia))
+    datos = TIPOS[tipo][1](instancia)
+    documentos = DocumentoBusqueda.objects.filter(tipo=tipo, objeto_id=instancia.pk)
+    anterior = documentos.values(*datos).first()
+    if anterior == datos:
+        return
+    if anterior is None:
+        DocumentoBusqueda.objects.create(tipo=tipo, objeto_id=instancia.pk, **datos)
+        return
+    documentos.update(**datos)
+
+    # Lo que se copia en otros documentos: el nombre del paciente en todos
+    # los suyos y el nombre del tratamiento en sus pagos
+    if tipo == 'paciente' and anterior['titulo'] != datos['titulo']:
+        DocumentoBusqueda.objects.filter(paciente_id=instancia.pk).exclude(tipo='paciente').update(
+            nombre_paciente=_nombre_paciente(instancia)
+        )
+    elif tipo == 'tratamiento' and anterior['titulo'] != datos['titulo']:
+        for pago in instancia.pagos.select_related('tratamiento__paciente'):
+            guardar_documento(pago)
+
+
+def eliminar_documento(instancia):
+    DocumentoBusqueda.objects.filter(tipo=tipo_de(type(instancia)), objeto_id=instancia.pk).delete()
+
+
+def reindexar_documentos(tipos=None, lote=1000, apps=django_apps):
+    """
+    Reconstruye los documentos de ``tipos`` (todos por defecto); devuelve
+    ``{tipo: total}``. Las migraciones pasan su ``apps`` (modelos históricos).
+    """
+    Documento = apps.get_model('pacientes', 'DocumentoBusqueda')
+    totales = {}
+    for tipo in tipos or TIPOS:
+        etiqueta, construir, relacionados, _icono = TIPOS[tipo]
+        modelo = apps.get_model(etiqueta)
+        Documento.objects.filter(tipo=tipo).delete()
+        documentos = []
+        total = 0
+        for instancia in modelo.objects.select_related(*relacionados).order_by('pk').iterator(chunk_size=lote):
+            documentos.append(Documento(tipo=tipo, objeto_id=instancia.pk, **construir(instancia)))
+            if len(documentos) >= lote:
+                Documento.objects.bulk_create(documentos)
+                total += len(documentos)
+                documentos = []
+        Documento.objects.bulk_create(documentos)
+        totales[tipo] = total + len(documentos)
+    return totales
+
+
+# ============================================
+# BÚSQUEDA
+# ============================================
+
+def _buscar_fts(palabras, cuota):
+    # Cada palabra como prefijo ("juan"*): encuentra mientras se escribe
+    expresion = ' AND '.join(f'"{p}"*' for p in palabras)
+    sql = f"""
+        SELECT tipo, titulo, subtitulo, url, nombre FROM (
+            SELECT d.tipo, d.titulo, d.subtitulo, d.url, p.nombre_completo AS nombre,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY d.tipo ORDER BY bm25({FTS_TABLE}, %s, %s), d.fecha DESC
+                   ) AS puesto
+            FROM {FTS_TABLE}
+            JOIN pacientes_documentobusqueda d ON d.id = {FTS_TABLE}.rowid
+            LEFT JOIN pacientes_paciente p ON p.id = d.paciente_id
+            WHERE {FTS_TABLE} MATCH %s
+        )
+        WHERE puesto <= %s
+        ORDER BY tipo, puesto
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*PESOS, expresion, cuota])
+        return cursor.fetchall()
+
+
+def _buscar_like(palabras, cuota):
+    filtro = Q()
+    for palabra in palabras:
+        filtro &= Q(texto__contains=palabra) | Q(nombre_paciente__contains=palabra)
+    return list(
+        DocumentoBusqueda.objects.filter(filtro).annotate(
+            puesto=Window(RowNumber(), partition_by=[F('tipo')], order_by=F('fecha').desc(nulls_last=True)),
+        ).filter(puesto__lte=cuota).order_by('tipo', 'puesto').values_list(
+            'tipo', 'titulo', 'subtitulo', 'url', 'paciente__nombre_completo'
+        )
+    )
+
+
+def buscar_documentos(texto, cuota=CUOTA_POR_TIPO):
+    """
+    Resultados de la búsqueda global: como mucho ``cuota`` por tipo, en el
+    orden de ``TIPOS`` y por relevancia dentro de cada tipo.
+    """
+    palabras = normalizar(texto).split()
+    if not palabras:
+        return []
+    buscar = _buscar_fts if connection.vendor == 'sqlite' else _buscar_like
+    orden = list(TIPOS)
+    filas = sorted(buscar(palabras, cuota), key=lambda fila: orden.index(fila[0]))
+    resultados = []
+    for tipo, titulo, subtitulo, url, nombre in filas:
+        if tipo != 'paciente' and nombre:
+            subtitulo = ' · '.join(filter(None, [nombre, subtitulo]))
+        resultados.append({
+            'type': tipo,
+            'title': titulo,
+            'subtitle': subtitulo,
+            'url': url,
+            'icon': TIPOS[tipo][3],
+        })
+    return resultados
@@ -0,0 +1,126 @@
+# pacientes/management/commands/benchmark_busqueda.py
+import random
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from pacientes.busqueda import reindexar, texto_busqueda
+from pacientes.directorio import Directorio, _filas
+from pacientes.models import Paciente
+
+NOMBRES = [
+    'José', 'María', 'Juan', 'Rosa', 'Luis', 'Ana', 'Carlos', 'Lucía', 'Jorge', 'Carmen',
+    'Miguel', 'Sofía', 'Víctor', 'Elena', 'Raúl', 'Inés', 'Andrés', 'Mónica', 'Héctor', 'Ángela',
+]
+APELLIDOS = [
+    'Pérez', 'García', 'Rodríguez', 'Quispe', 'Mamani', 'Flores', 'Sánchez', 'Ramírez', 'Torres',
+    'Gutiérrez', 'Chávez', 'Vásquez', 'Núñez', 'Huamán', 'Castillo', 'Rojas', 'Mendoza', 'Córdova',
+    'Ccori', 'Ñahui', 'Benítez', 'Alarcón', 'Zúñiga', 'Paredes', 'Villanueva',
+]
+
+# (descripción, texto buscado)
+CONSULTAS = [
+    ('nombre completo', 'juan perez'),
+    ('sin tildes', 'nunez'),
+    ('con tildes', 'Núñez'),
+    ('prefijo', 'quis'),
+    ('fragmento', 'tiérr'),
+    ('con error', 'gutierez'),
+    ('DNI', None),
+    ('DNI parcial', None),
+    ('teléfono', None),
+]
+
+
+def medir(funcion, repeticiones):
+    mejor = None
+    resultado = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = funcion()
+        transcurrido = time.perf_counter() - t0
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, resultado
+
+
+def pagina_icontains(texto):
+    """Lo que hacía ``ListaPacientesView``: dos ``icontains`` + COUNT + primera página."""
+    qs = Paciente.objects.filter(nombre_completo__icontains=texto) | Paciente.objects.filter(dni__icontains=texto)
+    return qs.count(), list(qs.values_list('pk', flat=True)[:10])
+
+
+def pagina_indice(texto):
+    resultados = Paciente.objects.buscar(texto)
+    return resultados.count(), [p.pk for p in resultados[:10]]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la búsqueda de pacientes con icontains, con el índice de búsqueda y '
+        'con el directorio en memoria del autocompletado '
+        '(crea pacientes sintéticos dentro de una transacción que se deshace al final)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=100000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._medir(options)
+            transaction.set_rollback(True)
+
+    def _medir(self, options):
+        rnd = random.Random(42)
+        num = options['pacientes']
+        t0 = time.perf_counter()
+        pacientes = []
+        for i in range(num):
+            nombre = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+            dni = f"{90000000 + i:08d}"
+            telefono = f"9{rnd.randrange(10 ** 8):08d}"
+            pacientes.append(Paciente(
+                nombre_completo=nombre,
+                dni=dni,
+                telefono=telefono,
+                fecha_nacimiento=date(1950 + rnd.randrange(60), rnd.randint(1, 12), rnd.randint(1, 28)),
+                genero='O',
+                estado_civil='S',
+                busqueda=texto_busqueda(nombre, dni, telefono),
+            ))
+        Paciente.objects.bulk_create(pacientes, batch_size=2000)
+        reindexar()
+        self.stdout.write(f"{num} pacientes sintéticos creados e indexados en {time.perf_counter() - t0:.1f} s\n")
+
+        t0 = time.perf_counter()
+        directorio = Directorio.desde_filas(_filas().iterator(chunk_size=5000))
+        self.stdout.write(f"Directorio en memoria cargado en {time.perf_counter() - t0:.2f} s\n")
+
+        muestra = pacientes[num // 2]
+        textos = {
+            'DNI': muestra.dni,
+            'DNI parcial': muestra.dni[:6],
+            'teléfono': muestra.telefono,
+        }
+        self.stdout.write(
+            f"{'consulta':<16} {'texto':<12} {'icontains':>18} {'índice':>18} {'directorio (10)':>16}"
+        )
+        for descripcion, texto in CONSULTAS:
+            texto = texto or textos[descripcion]
+            t_like, (n_like, _) = medir(lambda: pagina_icontains(texto), options['repeticiones'])
+            t_indice, (n_indice, _) = medir(lambda: pagina_indice(texto), options['repeticiones'])
+            t_dir, encontrados = medir(lambda: directorio.buscar(texto), options['repeticiones'] * 20)
+            self.stdout.write(
+                f"{descripcion:<16} {texto:<12} "
+                f"{t_like * 1000:8.2f} ms ({n_like:>5}) "
+                f"{t_indice * 1000:8.2f} ms ({n_indice:>5}) "
+                f"{t_dir * 1000:8.3f} ms ({len(encontrados):>2})"
+            )
+        self.stdout.write(
+            "\nEntre paréntesis, resultados encontrados. icontains distingue tildes y no "
+            "encuentra errores de tipeo; el índice devuelve como máximo "
+            "los 500 más relevantes; el directorio solo busca por prefijo "
+            "(sin errores de tipeo) y devuelve la primera página."
+        )
@@ -0,0 +1,26 @@
+# pacientes/management/commands/reindexar_busqueda.py
+from django.core.management.base import BaseCommand
+
+from pacientes.busqueda import reindexar
+from pacientes.documentos import TIPOS, reindexar_documentos
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula el texto de búsqueda de los pacientes, reconstruye su índice '
+        'y los documentos de la búsqueda global'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tipo', action='append', choices=list(TIPOS),
+            help='Solo reconstruir los documentos de este tipo (se puede repetir)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['tipo']:
+            total = reindexar()
+            self.stdout.write(f"  índice de pacientes: {total}")
+        for tipo, total in reindexar_documentos(options['tipo']).items():
+            self.stdout.write(f"  documentos de tipo {tipo}: {total}")
+        self.stdout.write(self.style.SUCCESS("✓ Búsqueda reindexada"))
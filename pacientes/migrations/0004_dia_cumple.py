@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 12:33
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+def calcular_dia_cumple(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    pacientes = []
+    for paciente in Paciente.objects.only('pk', 'fecha_nacimiento').iterator():
+        fecha = paciente.fecha_nacimiento
+        paciente.dia_cumple = date(2000, fecha.month, fecha.day).timetuple().tm_yday
+        pacientes.append(paciente)
+    Paciente.objects.bulk_update(pacientes, ['dia_cumple'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0003_alter_tokenfichapaciente_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='dia_cumple',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False, help_text='Día del año (en año bisiesto) de la fecha de nacimiento; se calcula al guardar', verbose_name='Día del cumpleaños'),
+        ),
+        migrations.RunPython(calcular_dia_cumple, migrations.RunPython.noop),
+    ]
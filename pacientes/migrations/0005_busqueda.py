@@ -0,0 +1,77 @@
+# Generated by Django 4.2 on 2026-10-18 12:46
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+FTS_TABLE = 'pacientes_busqueda_fts'
+VOCAB_TABLE = 'pacientes_busqueda_vocab'
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', texto).strip()
+
+
+def calcular_busqueda(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    pacientes = []
+    for paciente in Paciente.objects.only('pk', 'nombre_completo', 'dni', 'telefono').iterator():
+        partes = (_normalizar(paciente.nombre_completo), _normalizar(paciente.dni), _normalizar(paciente.telefono))
+        paciente.busqueda = ' '.join(parte for parte in partes if parte)
+        pacientes.append(paciente)
+    Paciente.objects.bulk_update(pacientes, ['busqueda'], batch_size=500)
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(texto, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {VOCAB_TABLE} USING fts5(palabra, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, texto) SELECT id, busqueda FROM pacientes_paciente'
+        )
+        Paciente = apps.get_model('pacientes', 'Paciente')
+        vocabulario = set()
+        for texto in Paciente.objects.values_list('busqueda', flat=True).iterator():
+            vocabulario |= {w for w in texto.split() if len(w) >= 3 and not w.isdigit()}
+        for palabra in sorted(vocabulario):
+            schema_editor.execute(f'INSERT INTO {VOCAB_TABLE} (palabra) VALUES (%s)', [palabra])
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS pacientes_busqueda_trgm '
+            'ON pacientes_paciente USING gin (busqueda gin_trgm_ops)'
+        )
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {VOCAB_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS pacientes_busqueda_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0004_dia_cumple'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='busqueda',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Nombre, DNI y teléfono normalizados (sin tildes ni signos); se calcula al guardar', max_length=300, verbose_name='Texto de búsqueda'),
+        ),
+        migrations.RunPython(calcular_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 4.2 on 2026-10-18 12:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'pacientes_documentos_fts'
+TABLA = 'pacientes_documentobusqueda'
+
+# Tabla FTS5 de contenido externo: los triggers la mantienen al día con
+# cualquier cambio de pacientes_documentobusqueda (incluidos los borrados
+# en cascada), así que la aplicación solo escribe en la tabla normal.
+SQLITE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        texto, nombre_paciente,
+        content='{TABLA}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_ai AFTER INSERT ON {TABLA} BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, texto, nombre_paciente)
+        VALUES (new.id, new.texto, new.nombre_paciente);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_ad AFTER DELETE ON {TABLA} BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, texto, nombre_paciente)
+        VALUES ('delete', old.id, old.texto, old.nombre_paciente);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLA}_au AFTER UPDATE ON {TABLA} BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, texto, nombre_paciente)
+        VALUES ('delete', old.id, old.texto, old.nombre_paciente);
+        INSERT INTO {FTS_TABLE} (rowid, texto, nombre_paciente)
+        VALUES (new.id, new.texto, new.nombre_paciente);
+    END""",
+]
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        # pg_trgm ya lo instaló 0005_busqueda
+        for columna in ('texto', 'nombre_paciente'):
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS pacientes_documentos_{columna}_trgm '
+                f'ON {TABLA} USING gin ({columna} gin_trgm_ops)'
+            )
+
+
+def llenar_documentos(apps, schema_editor):
+    # Sin esto la búsqueda global queda vacía hasta correr reindexar_busqueda
+    from pacientes.documentos import reindexar_documentos
+
+    reindexar_documentos(apps=apps)
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sufijo in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {TABLA}_{sufijo}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        for columna in ('texto', 'nombre_paciente'):
+            schema_editor.execute(f'DROP INDEX IF EXISTS pacientes_documentos_{columna}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0005_busqueda'),
+        # Modelos que se indexan al llenar los documentos
+        ('tratamientos', '0010_checkpoints_odontograma'),
+        ('historias', '0002_alter_imagenhistoria_imagen'),
+        ('notas', '0004_imagennota_imagen_drive_url_alter_imagennota_imagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('paciente', 'Paciente'), ('tratamiento', 'Tratamiento'), ('historia', 'Historia clínica'), ('nota', 'Nota'), ('pago', 'Pago')], max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('titulo', models.CharField(max_length=300)),
+                ('subtitulo', models.CharField(blank=True, max_length=300)),
+                ('url', models.CharField(max_length=200)),
+                ('fecha', models.DateTimeField(blank=True, null=True)),
+                ('texto', models.TextField(help_text='Contenido propio normalizado')),
+                ('nombre_paciente', models.CharField(blank=True, help_text='Nombre normalizado del paciente (no aplica a los documentos de tipo paciente)', max_length=200)),
+                ('paciente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documentos_busqueda', to='pacientes.paciente')),
+            ],
+            options={
+                'verbose_name': 'Documento de búsqueda',
+                'verbose_name_plural': 'Documentos de búsqueda',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='documentobusqueda',
+            constraint=models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='documento_busqueda_unico'),
+        ),
+        migrations.RunPython(crear_indice, eliminar_indice),
+        migrations.RunPython(llenar_documentos, migrations.RunPython.noop),
+    ]
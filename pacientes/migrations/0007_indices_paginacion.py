@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0006_documentos_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['nombre_completo', 'id'], name='paciente_nombre_id'),
+        ),
+    ]
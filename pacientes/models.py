@@ -7,6 +7,135 @@ from datetime import date
 import uuid
 from datetime import timedelta
 from django.utils import timezone
+import calendar
+
+from .busqueda import ResultadosBusqueda, buscar_ids, texto_busqueda
+
+
+# ============================================
+# CUMPLEAÑOS
+# ============================================
+# Cada paciente guarda el día del año de su cumpleaños contado en un año
+# bisiesto (1..366, 29 de febrero = 60). El orden coincide con el del
+# calendario en cualquier año, así que "cumpleaños de hoy" y "próximos N
+# días" son consultas por rango sobre una columna indexada.
+
+_ANIO_BISIESTO = 2000
+
+
+def dia_cumple(fecha):
+    """Día del año (en año bisiesto) del mes/día de ``fecha``."""
+    return date(_ANIO_BISIESTO, fecha.month, fecha.day).timetuple().tm_yday
+
+
+def proximo_cumpleanos(fecha_nacimiento, hoy=None):
+    """
+    Fecha del próximo cumpleaños (hoy incluido). Los nacidos el 29 de
+    febrero lo celebran el 28 en los años no bisiestos.
+    """
+    hoy = hoy or date.today()
+    for anio in (hoy.year, hoy.year + 1):
+        dia = fecha_nacimiento.day
+        if fecha_nacimiento.month == 2 and dia == 29 and not calendar.isleap(anio):
+            dia = 28
+        cumple = date(anio, fecha_nacimiento.month, dia)
+        if cumple >= hoy:
+            return cumple
+
+
+def _rango_dias_cumple(fecha):
+    """
+    Días de cumpleaños (columna ``dia_cumple``) que se celebran en ``fecha``.
+    El 28 de febrero de un año no bisiesto también incluye a los del 29.
+    """
+    dia = dia_cumple(fecha)
+    if fecha.month == 2 and fecha.day == 28 and not calendar.isleap(fecha.year):
+        return dia, dia + 1
+    return dia, dia
+
+
+class PacienteQuerySet(models.QuerySet):
+
+    def cumpleanos_hoy(self, hoy=None):
+        desde, hasta = _rango_dias_cumple(hoy or date.today())
+        return self.filter(dia_cumple__gte=desde, dia_cumple__lte=hasta)
+
+    def cumpleanos_proximos(self, dias=30, hoy=None):
+        """
+        Pacientes que cumplen años entre hoy y hoy + ``dias``, ordenados por
+        cercanía. Si el rango cruza el fin de año la consulta "da la vuelta":
+        ``dia >= hoy OR dia <= fin``, y los de enero van después de los de diciembre.
+        """
+        hoy = hoy or date.today()
+        if dias >= 365:
+            desde, hasta = dia_cumple(hoy), dia_cumple(hoy) - 1
+        else:
+            desde = _rango_dias_cumple(hoy)[0]
+            hasta = _rango_dias_cumple(hoy + timedelta(days=dias))[1]
+
+        if desde <= hasta:
+            return self.filter(dia_cumple__gte=desde, dia_cumple__lte=hasta).order_by('dia_cumple', 'nombre_completo')
+        return self.filter(
+            models.Q(dia_cumple__gte=desde) | models.Q(dia_cumple__lte=hasta)
+        ).order_by(
+            models.Case(
+                models.When(dia_cumple__gte=desde, then=models.Value(0)),
+                default=models.Value(1),
+            ),
+            'dia_cumple',
+            'nombre_completo',
+        )
+
+    def con_deudas(self, desde=None, hasta=None):
+        """
+        Anota cada paciente con su resumen de deuda, calculado en SQL con
+        subconsultas sobre los saldos guardados en ``Tratamiento``:
+        ``costo_total``, ``total_pagado``, ``deuda_total``,
+        ``num_tratamientos`` (tratamientos con saldo pendiente) y
+        ``ultimo_pago``. Con ``desde``/``hasta`` solo cuentan los
+        tratamientos iniciados en ese rango; el último pago es siempre el
+        más reciente del paciente. Solo devuelve pacientes con deuda.
+        """
+        from tratamientos.models import Tratamiento, Pago
+
+        tratamientos = Tratamiento.objects.filter(paciente=models.OuterRef('pk'))
+        if desde:
+            tratamientos = tratamientos.filter(fecha_inicio__gte=desde)
+        if hasta:
+            tratamientos = tratamientos.filter(fecha_inicio__lte=hasta)
+        # values('paciente') agrupa la subconsulta por paciente: una fila por cada uno
+        tratamientos = tratamientos.order_by().values('paciente')
+
+        def total(expresion, campo):
+            return models.Subquery(
+                tratamientos.annotate(total=expresion).values('total'),
+                output_field=campo,
+            )
+
+        decimal = models.DecimalField(max_digits=12, decimal_places=2)
+        ultimo_pago = Pago.objects.filter(
+            tratamiento__paciente=models.OuterRef('pk')
+        ).order_by('-fecha_pago').values('fecha_pago')[:1]
+
+        return self.annotate(
+            costo_total=total(models.Sum('costo_total'), decimal),
+            total_pagado=total(models.Sum('total_pagado'), decimal),
+            deuda_total=total(models.Sum('saldo'), decimal),
+            num_tratamientos=total(
+                models.Count('pk', filter=models.Q(saldo__gt=0)), models.IntegerField()
+            ),
+            ultimo_pago=models.Subquery(ultimo_pago, output_field=models.DateTimeField()),
+        ).filter(deuda_total__gt=0)
+
+    def buscar(self, texto, limite=None):
+        """
+        Pacientes que coinciden con ``texto`` (nombre, DNI o teléfono, sin
+        importar tildes, mayúsculas ni errores de tipeo), del más relevante
+        al menos. Devuelve una ``ResultadosBusqueda``: se puede paginar y
+        rebanar, pero no encadenar más filtros.
+        """
+        ids = buscar_ids(texto) if limite is None else buscar_ids(texto, limite)
+        return ResultadosBusqueda(self, ids)
 
 
 class Paciente(models.Model):
@@ -116,23 +245,59 @@ class Paciente(models.Model):
     # === METADATOS ===
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
+    dia_cumple = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name="Día del cumpleaños",
+        help_text="Día del año (en año bisiesto) de la fecha de nacimiento; se calcula al guardar"
+    )
+    busqueda = models.CharField(
+        max_length=300,
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True,
+        verbose_name="Texto de búsqueda",
+        help_text="Nombre, DNI y teléfono normalizados (sin tildes ni signos); se calcula al guardar"
+    )
+
+    objects = PacienteQuerySet.as_manager()
+
+    def cumple_en(self, fecha):
+        """True si el paciente celebra su cumpleaños en ``fecha``."""
+        desde, hasta = _rango_dias_cumple(fecha)
+        return desde <= dia_cumple(self.fecha_nacimiento) <= hasta
 
     @property
     def dias_hasta_cumple(self):
         hoy = date.today()
-        cumple = self.fecha_nacimiento.replace(year=hoy.year)
-        if cumple < hoy:
-            cumple = cumple.replace(year=hoy.year + 1)
-        return (cumple - hoy).days
+        return (proximo_cumpleanos(self.fecha_nacimiento, hoy) - hoy).days
 
     class Meta:
         verbose_name = "Paciente"
         verbose_name_plural = "Pacientes"
         ordering = ['nombre_completo']
+        indexes = [
+            # Paginación por cursor del listado (consultorio_dental.paginacion)
+            models.Index(fields=['nombre_completo', 'id'], name='paciente_nombre_id'),
+        ]
 
     def __str__(self):
         return f"{self.nombre_completo} (DNI: {self.dni})"
 
+    def save(self, *args, **kwargs):
+        if self.fecha_nacimiento:
+            self.dia_cumple = dia_cumple(self.fecha_nacimiento)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'fecha_nacimiento' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'dia_cumple'}
+        self.busqueda = texto_busqueda(self.nombre_completo, self.dni, self.telefono)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nombre_completo', 'dni', 'telefono'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'busqueda'}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('pacientes:detalle', kwargs={'pk': self.pk})
 
@@ -335,4 +500,50 @@ class FichaMedicaPaciente(models.Model):
         ordering = ['-fecha_completado']
     
     def __str__(self):
-        return f"Ficha médica de {self.paciente.nombre_completo}"
\ No newline at end of file
+        return f"Ficha médica de {self.paciente.nombre_completo}"
+
+class DocumentoBusqueda(models.Model):
+    """
+    Una fila por cada paciente, tratamiento, entrada de historia, nota y pago,
+    con su texto normalizado para la búsqueda global. La mantienen las
+    señales de cada modelo (ver ``pacientes.documentos``); en SQLite la tabla
+    FTS5 ``pacientes_documentos_fts`` se sincroniza con triggers.
+    """
+
+    TIPO_CHOICES = [
+        ('paciente', 'Paciente'),
+        ('tratamiento', 'Tratamiento'),
+        ('historia', 'Historia clínica'),
+        ('nota', 'Nota'),
+        ('pago', 'Pago'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    objeto_id = models.PositiveBigIntegerField()
+    paciente = models.ForeignKey(
+        Paciente,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='documentos_busqueda'
+    )
+    titulo = models.CharField(max_length=300)
+    subtitulo = models.CharField(max_length=300, blank=True)
+    url = models.CharField(max_length=200)
+    fecha = models.DateTimeField(null=True, blank=True)
+    texto = models.TextField(help_text="Contenido propio normalizado")
+    nombre_paciente = models.CharField(
+        max_length=200,
+        blank=True,
+        help_text="Nombre normalizado del paciente (no aplica a los documentos de tipo paciente)"
+    )
+
+    class Meta:
+        verbose_name = "Documento de búsqueda"
+        verbose_name_plural = "Documentos de búsqueda"
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='documento_busqueda_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.objeto_id}: {self.titulo}"
@@ -5,29 +5,25 @@ Vistas para búsqueda global en el sistema
 
 from django.http import JsonResponse
 from django.urls import reverse
-from django.db.models import Q
 
-from .models import Paciente
-from tratamientos.models import Tratamiento
+from .directorio import LIMITE, autocompletar
+from .documentos import buscar_documentos
 
-try:
-    from historias.models import HistoriaClinica
-    HISTORIAS_AVAILABLE = True
-except ImportError:
-    HISTORIAS_AVAILABLE = False
+MAX_LIMITE_AUTOCOMPLETAR = 50
 
 
 def busqueda_global(request):
     """
     Vista AJAX para búsqueda global
-    Busca en pacientes, tratamientos e historias clínicas
+    Busca en pacientes, tratamientos, historias clínicas, notas y pagos
+    (tabla ``DocumentoBusqueda``) con una sola consulta
     
     Parámetros GET:
         q: término de búsqueda (mínimo 2 caracteres)
     
     Retorna:
         JSON con lista de resultados, cada uno con:
-        - type: tipo de resultado (paciente/tratamiento/historia)
+        - type: tipo de resultado (paciente/tratamiento/historia/nota/pago)
         - title: título principal
         - subtitle: información adicional
         - url: URL para navegar al detalle
@@ -39,62 +35,37 @@ def busqueda_global(request):
     if len(query) < 2:
         return JsonResponse({'results': []})
     
-    results = []
-    
-    # ===== BUSCAR EN PACIENTES =====
-    pacientes = Paciente.objects.filter(
-        Q(nombre__icontains=query) |
-        Q(apellido__icontains=query) |
-        Q(dni__icontains=query)
-    )[:5]  # Limitar a 5 resultados
-    
-    for p in pacientes:
-        results.append({
-            'type': 'paciente',
-            'title': p.nombre_completo,
-            'subtitle': f'DNI: {p.dni}' if p.dni else 'Sin DNI',
-            'url': reverse('pacientes:detalle', args=[p.id]),
-            'icon': 'bi-person'
-        })
-    
-    # ===== BUSCAR EN TRATAMIENTOS =====
-    tratamientos = Tratamiento.objects.filter(
-        Q(descripcion__icontains=query) |
-        Q(paciente__nombre__icontains=query) |
-        Q(paciente__apellido__icontains=query)
-    ).select_related('paciente')[:5]
-    
-    for t in tratamientos:
-        results.append({
-            'type': 'tratamiento',
-            'title': t.descripcion,
-            'subtitle': f'Paciente: {t.paciente.nombre_completo}',
-            'url': reverse('tratamientos:detalle', args=[t.id]),
-            'icon': 'bi-heart-pulse'
-        })
-    
-    # ===== BUSCAR EN HISTORIAS CLÍNICAS =====
-    if HISTORIAS_AVAILABLE:
-        try:
-            historias = HistoriaClinica.objects.filter(
-                Q(diagnostico__icontains=query) |
-                Q(tratamiento__icontains=query) |
-                Q(paciente__nombre__icontains=query) |
-                Q(paciente__apellido__icontains=query)
-            ).select_related('paciente')[:5]
-            
-            for h in historias:
-                # Truncar diagnóstico si es muy largo
-                diagnostico_preview = h.diagnostico[:50] + '...' if len(h.diagnostico) > 50 else h.diagnostico
-                results.append({
-                    'type': 'historia',
-                    'title': f'Historia - {h.paciente.nombre_completo}',
-                    'subtitle': diagnostico_preview,
-                    'url': reverse('historias:detalle', args=[h.id]),
-                    'icon': 'bi-journal-medical'
-                })
-        except Exception as e:
-            # Si hay algún error, simplemente no agregamos historias
-            print(f"Error buscando en historias: {e}")
-    
-    return JsonResponse({'results': results})
+    return JsonResponse({'results': buscar_documentos(query)})
+
+
+def autocompletar_pacientes(request):
+    """
+    Vista AJAX de autocompletado de pacientes, servida desde el directorio
+    en memoria (``pacientes.directorio``): no consulta la BD.
+
+    Parámetros GET:
+        q: nombre (desde cualquier palabra), DNI o teléfono; basta el inicio
+        limite: resultados por página (máximo 50)
+        pagina: número de página, desde 1
+
+    Retorna:
+        JSON con ``results`` (id, nombre, dni, telefono, url) y ``mas``
+        (si hay otra página)
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE)), 1), MAX_LIMITE_AUTOCOMPLETAR)
+        pagina = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+
+    if not query:
+        return JsonResponse({'results': [], 'mas': False})
+
+    # Se pide uno más para saber si hay otra página
+    filas = autocompletar(query, limite + 1, desde=(pagina - 1) * limite)
+    results = [
+        dict(fila, url=reverse('pacientes:detalle', args=[fila['id']]))
+        for fila in filas[:limite]
+    ]
+    return JsonResponse({'results': results, 'mas': len(filas) > limite})
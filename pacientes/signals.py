@@ -0,0 +1,49 @@
+# pacientes/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from historias.models import EntradaHistoria
+from notas.models import Nota
+from tratamientos.models import Pago, Tratamiento
+
+from .busqueda import desindexar, indexar
+from .cumpleanos import actualizar_resumen
+from .directorio import registrar_cambio
+from .documentos import eliminar_documento, guardar_documento
+from .models import Paciente
+
+
+@receiver(post_save, sender=Paciente)
+def paciente_guardado(sender, instance, **kwargs):
+    actualizar_resumen(instance)
+    indexar(instance.pk, instance.busqueda)
+    guardar_documento(instance)
+    # Tras el commit: ningún proceso debe releer el paciente antes de que se vea en la BD
+    transaction.on_commit(lambda pk=instance.pk: registrar_cambio(pk))
+
+
+@receiver(post_delete, sender=Paciente)
+def paciente_eliminado(sender, instance, **kwargs):
+    actualizar_resumen(instance, eliminado=True)
+    desindexar(instance.pk)
+    eliminar_documento(instance)
+    transaction.on_commit(lambda pk=instance.pk: registrar_cambio(pk))
+
+
+# Documentos de la búsqueda global (ver pacientes.documentos)
+@receiver(post_save, sender=Tratamiento)
+@receiver(post_save, sender=Pago)
+@receiver(post_save, sender=EntradaHistoria)
+@receiver(post_save, sender=Nota)
+def documento_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        guardar_documento(instance)
+
+
+@receiver(post_delete, sender=Tratamiento)
+@receiver(post_delete, sender=Pago)
+@receiver(post_delete, sender=EntradaHistoria)
+@receiver(post_delete, sender=Nota)
+def documento_eliminado(sender, instance, **kwargs):
+    eliminar_documento(instance)
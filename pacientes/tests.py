@@ -1,3 +1,203 @@
-from django.test import TestCase
+import random
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from citas.index import EventIndex
+from citas.models import CitaEvento
+
+from . import directorio as modulo_directorio
+from .busqueda import texto_busqueda
+from .directorio import (
+    CAMBIO_KEY, EPOCA_KEY, MAX_CAMBIOS, VERSION_KEY, Directorio, autocompletar, obtener_directorio,
+)
+from .models import Paciente
+
+NOMBRES = ['Juan', 'María', 'José', 'Ana', 'Luis', 'Rosa', 'Carlos', 'Lucía', 'Jorge', 'Juana']
+APELLIDOS = ['Pérez', 'García', 'Quispe', 'Mamani', 'Flores', 'Rojas', 'Huamán', 'Torres', 'Chávez']
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'directorio-tests'}}
+
+
+def fila_al_azar(azar, pk):
+    nombre = ' '.join(
+        azar.sample(NOMBRES, azar.randint(1, 2)) + azar.sample(APELLIDOS, azar.randint(1, 2))
+    )
+    dni = f'{azar.randint(10000000, 99999999)}'
+    telefono = azar.choice(['', f'9{azar.randint(10000000, 99999999)}'])
+    return pk, nombre, dni, telefono, texto_busqueda(nombre, dni, telefono)
+
+
+class DirectorioConCambiosTests(SimpleTestCase):
+    """Aplicar cambios sobre la base debe dar lo mismo que armar el directorio desde cero."""
+
+    consultas = [
+        'j', 'ju', 'juan', 'juana', 'ma', 'perez', 'perez juan', 'garcia ma', 'quispe rosa luis',
+        'ro', 'chavez', 'to', '9', '1', '45', 'x', 'mamani flores', 'ana l',
+    ]
+
+    def comparar(self, directorio, filas):
+        nuevo = Directorio.desde_filas(filas.values())
+        self.assertEqual(len(directorio), len(nuevo))
+        self.assertEqual(sorted(directorio.filas()), sorted(filas.values()))
+        consultas = self.consultas + [fila[2][:3] for fila in list(filas.values())[:5]]
+        for consulta in consultas:
+            with self.subTest(consulta=consulta):
+                encontrados = directorio.buscar(consulta, limite=len(filas) + 1)
+                self.assertEqual(len(encontrados), len(set(encontrados)))
+                self.assertEqual(set(encontrados), set(nuevo.buscar(consulta, limite=len(filas) + 1)))
+        for pk, nombre, dni, telefono, _texto in filas.values():
+            self.assertEqual(directorio.fila(pk), {'id': pk, 'nombre': nombre, 'dni': dni, 'telefono': telefono})
+
+    def recorrer(self, semilla, lotes=40):
+        azar = random.Random(semilla)
+        filas = {pk: fila_al_azar(azar, pk) for pk in range(1, 301)}
+        directorio = Directorio.desde_filas(filas.values())
+        siguiente = 301
+        for _ in range(lotes):
+            cambiadas, eliminados = [], set()
+            for _ in range(azar.randint(1, 10)):
+                accion = azar.random()
+                if accion < 0.4 or not filas:
+                    fila = fila_al_azar(azar, siguiente)
+                    siguiente += 1
+                elif accion < 0.75:
+                    fila = fila_al_azar(azar, azar.choice(list(filas)))
+                else:
+                    pk = azar.choice(list(filas))
+                    del filas[pk]
+                    eliminados.add(pk)
+                    cambiadas = [f for f in cambiadas if f[0] != pk]
+                    continue
+                filas[fila[0]] = fila
+                eliminados.discard(fila[0])
+                cambiadas = [f for f in cambiadas if f[0] != fila[0]] + [fila]
+            directorio = directorio.con_cambios(cambiadas, eliminados)
+            self.comparar(directorio, filas)
+        return directorio
+
+    @mock.patch.object(modulo_directorio, 'MAX_REVISADAS', 10 ** 6)
+    def test_cambios_al_azar_sin_rearmar(self):
+        directorio = self.recorrer(23)
+        # Todos los cambios siguen en el índice aparte
+        self.assertTrue(directorio.pendientes)
+        self.assertTrue(directorio.ocultos)
+
+    @mock.patch.object(modulo_directorio, 'MAX_REVISADAS', 10 ** 6)
+    @mock.patch.object(modulo_directorio, 'MIN_PENDIENTES', 15)
+    def test_cambios_al_azar_rearmando_la_base(self):
+        self.recorrer(42, lotes=60)
+
+    def test_la_base_se_comparte_hasta_el_umbral(self):
+        azar = random.Random(7)
+        directorio = Directorio.desde_filas(fila_al_azar(azar, pk) for pk in range(1, 51))
+        with mock.patch.object(modulo_directorio, 'MIN_PENDIENTES', 3):
+            uno = directorio.con_cambios([fila_al_azar(azar, 1)], [2])
+            self.assertIs(uno.ids, directorio.ids)
+            dos = uno.con_cambios([fila_al_azar(azar, 60), fila_al_azar(azar, 61)], [])
+            self.assertIsNot(dos.ids, directorio.ids)
+            self.assertFalse(dos.pendientes)
+            self.assertFalse(dos.ocultos)
+        self.assertEqual(len(dos), 51)
+        self.assertEqual(uno.buscar('x'), [])
+
+    def test_volver_a_cambiar_un_pendiente(self):
+        directorio = Directorio.desde_filas([(1, 'Ana Pérez', '11111111', '', texto_busqueda('Ana Pérez', '11111111'))])
+        directorio = directorio.con_cambios([(2, 'Luis Rojas', '22222222', '', texto_busqueda('Luis Rojas', '22222222'))], [])
+        directorio = directorio.con_cambios([(2, 'Luis Torres', '22222222', '', texto_busqueda('Luis Torres', '22222222'))], [])
+        self.assertEqual(directorio.buscar('rojas'), [])
+        self.assertEqual(directorio.buscar('torres'), [2])
+        directorio = directorio.con_cambios([], [2, 1])
+        self.assertEqual(directorio.buscar('luis'), [])
+        self.assertEqual(directorio.buscar('ana'), [])
+        self.assertEqual(len(directorio), 0)
+        self.assertEqual(directorio.claves_pendientes, [])
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class ObtenerDirectorioTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        modulo_directorio._proceso = (None, None, None)
+        self.addCleanup(setattr, modulo_directorio, '_proceso', (None, None, None))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ana = self.crear('Ana Pérez', '11111111')
+            self.crear('Luis Rojas', '22222222')
+
+    def crear(self, nombre, dni):
+        return Paciente.objects.create(nombre_completo=nombre, dni=dni, fecha_nacimiento=date(1990, 1, 1), genero='F')
+
+    def test_version_atrasada_aplica_solo_los_cambios(self):
+        anterior = obtener_directorio()
+        self.assertIs(obtener_directorio(), anterior)
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = self.crear('Juana Quispe', '33333333')
+            self.ana.nombre_completo = 'Ana Torres'
+            self.ana.save()
+        with self.assertNumQueries(1):
+            directorio = obtener_directorio()
+        # Se actualizó desde la versión local, sin recargar la base
+        self.assertIs(directorio.ids, anterior.ids)
+        self.assertEqual(directorio.buscar('juana'), [nuevo.pk])
+        self.assertEqual(directorio.buscar('torres'), [self.ana.pk])
+        self.assertEqual(directorio.buscar('perez'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo.delete()
+        self.assertEqual(obtener_directorio().buscar('juana'), [])
+        self.assertEqual([p['nombre'] for p in autocompletar('ana')], ['Ana Torres'])
+
+    def test_cambio_de_epoca_recarga_todo(self):
+        anterior = obtener_directorio()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear('Jorge Flores', '44444444')
+        # Otra época (la caché se vació y se volvió a llenar): la copia local no sirve
+        # aunque su versión sea anterior a la actual
+        cache.set(EPOCA_KEY, 'otra-epoca', timeout=None)
+        with mock.patch.object(Directorio, 'con_cambios') as con_cambios:
+            directorio = obtener_directorio()
+        con_cambios.assert_not_called()
+        self.assertIsNot(directorio.ids, anterior.ids)
+        self.assertEqual(len(directorio), 3)
+        self.assertEqual(len(directorio.buscar('jorge')), 1)
+
+    def test_cambio_perdido_recarga_todo(self):
+        anterior = obtener_directorio()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear('Rosa Mamani', '55555555')
+        epoca, version = cache.get(EPOCA_KEY), cache.get(VERSION_KEY)
+        cache.delete(CAMBIO_KEY.format(epoca=epoca, version=version))
+        directorio = obtener_directorio()
+        self.assertIsNot(directorio.ids, anterior.ids)
+        self.assertEqual(len(directorio.buscar('rosa')), 1)
+
+    def test_demasiados_cambios_recarga_todo(self):
+        anterior = obtener_directorio()
+        cache.incr(VERSION_KEY, MAX_CAMBIOS + 1)
+        directorio = obtener_directorio()
+        self.assertIsNot(directorio.ids, anterior.ids)
+        self.assertEqual(len(directorio), 2)
+
+
+class CitasDelPacienteTests(TestCase):
+
+    def test_proximas_y_ultimas_20_pasadas(self):
+        paciente = Paciente.objects.create(
+            nombre_completo='Ana Pérez', dni='11111111', fecha_nacimiento=date(1990, 1, 1), genero='F',
+        )
+        ahora = timezone.now()
+        for dias in [*range(-30, 0), 2, 1, 5]:
+            CitaEvento.objects.create(
+                uid=f'cita{dias}', titulo='Control', paciente=paciente, inicio=ahora + timedelta(days=dias),
+            )
+        with mock.patch('citas.context_processors.get_event_index', return_value=EventIndex([])):
+            response = self.client.get(reverse('pacientes:detalle', args=[paciente.pk]))
+        self.assertEqual([c.uid for c in response.context['citas_proximas']], ['cita1', 'cita2', 'cita5'])
+        self.assertEqual(
+            [c.uid for c in response.context['citas_pasadas']], [f'cita{dias}' for dias in range(-1, -21, -1)]
+        )
@@ -18,6 +18,7 @@ urlpatterns = [
     path('deudas/', views.pacientes_deudas, name='deudas'),
     # API de búsqueda global
     path('api/buscar/', search_views.busqueda_global, name='busqueda_global'),
+    path('api/autocomplete/', search_views.autocompletar_pacientes, name='autocompletar'),
     # Sistema de Ficha Médica Pública
     path('<int:paciente_id>/generar-ficha/', views_ficha_medica.generar_token_ficha, name='generar_ficha'),
 ]
\ No newline at end of file
@@ -5,7 +5,7 @@ from django.contrib import messages
 from django.urls import reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.core.paginator import Paginator
-from django.db.models import Count, Sum, Q
+from django.db.models import Avg, Count, F, Max, Min, Q, Sum
 from django.utils import timezone
 from datetime import date, timedelta
 from .models import Paciente
@@ -15,21 +15,19 @@ from protocolo_ninos.models import EvaluacionFuncional
 from programa_salud.models import ProgramaSalud
 
 from auditoria.utils import registrar_log
+from consultorio_dental.paginacion import PaginacionCursorMixin
 
-class ListaPacientesView(ListView):
+class ListaPacientesView(PaginacionCursorMixin, ListView):
     model = Paciente
     template_name = 'pacientes/lista_pacientes.html'
     context_object_name = 'pacientes'
     paginate_by = 10
+    orden_cursor = ('nombre_completo',)
 
     def get_queryset(self):
         query = self.request.GET.get('q')
         if query:
-            return Paciente.objects.filter(
-                nombre_completo__icontains=query
-            ) | Paciente.objects.filter(
-                dni__icontains=query
-            )
+            return Paciente.objects.buscar(query)
         return Paciente.objects.all()
 
 class DetallePacienteView(DetailView):
@@ -48,7 +46,7 @@ class DetallePacienteView(DetailView):
         context['historias_paginadas'] = historias_paginator.get_page(historias_page)
 
         # Paginación para tratamientos
-        tratamientos = paciente.tratamientos.all()
+        tratamientos = paciente.tratamientos.with_finanzas()
         tratamientos_paginator = Paginator(tratamientos, 20)
         tratamientos_page = self.request.GET.get('tratamientos_page')
         context['tratamientos_paginados'] = tratamientos_paginator.get_page(tratamientos_page)
@@ -59,6 +57,11 @@ class DetallePacienteView(DetailView):
         notas_page = self.request.GET.get('notas_page')
         context['notas_paginadas'] = notas_paginator.get_page(notas_page)
 
+        # Citas del calendario vinculadas al paciente: dos rangos sobre el índice paciente+inicio
+        ahora = timezone.now()
+        context['citas_proximas'] = list(paciente.citas.filter(inicio__gte=ahora).order_by('inicio'))
+        context['citas_pasadas'] = list(paciente.citas.filter(inicio__lt=ahora).order_by('-inicio')[:20])
+
         # Obtener evaluación funcional si existe
         try:
             context['evaluacion_funcional'] = paciente.evaluacion_funcional
@@ -148,44 +151,40 @@ class CumpleanosProximosView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        hoy = date.today()
-        dias_a_mirar = 180  # Próximos 180 días
-        pacientes = []
+        # Próximos 180 días: consulta por rango sobre dia_cumple, ordenada y paginada en la BD
+        return Paciente.objects.cumpleanos_proximos(dias=180)
+
+# Orden de la lista de deudores (parámetro ?orden=)
+ORDENES_DEUDA = {
+    'deuda': ('-deuda_total', 'nombre_completo'),
+    'nombre': ('nombre_completo',),
+    'ultimo_pago': (F('ultimo_pago').asc(nulls_first=True), '-deuda_total'),
+    'tratamientos': ('-num_tratamientos', '-deuda_total'),
+}
+
 
-        for paciente in Paciente.objects.all():
-            cumple = paciente.fecha_nacimiento.replace(year=hoy.year)
-            if cumple < hoy:
-                cumple = cumple.replace(year=hoy.year + 1)
-            if (cumple - hoy).days <= dias_a_mirar:
-                pacientes.append((paciente, (cumple - hoy).days))
+def _fila_deuda(paciente):
+    """Fila de las tablas de deudores a partir de un paciente anotado con ``con_deudas()``."""
+    porcentaje_deuda = (
+        paciente.deuda_total / paciente.costo_total * 100
+    ) if paciente.costo_total > 0 else 0
+    return {
+        'paciente': paciente,
+        'deuda_total': paciente.deuda_total,
+        'costo_total': paciente.costo_total,
+        'porcentaje_deuda': round(porcentaje_deuda, 1),
+        'num_tratamientos': paciente.num_tratamientos,
+        'ultimo_pago': paciente.ultimo_pago,
+    }
 
-        # Ordenar por días hasta el cumpleaños
-        pacientes.sort(key=lambda x: x[1])
-        return [p[0] for p in pacientes]
 
 def reportes(request):
     """Vista para mostrar reportes generales del consultorio"""
     
     # === PACIENTES CON MAYOR DEUDA ===
-    # Obtener todos los pacientes con tratamientos
-    pacientes_con_deuda = []
-    for paciente in Paciente.objects.all():
-        tratamientos = paciente.tratamientos.all()
-        if tratamientos.exists():
-            deuda_total = sum(t.deuda for t in tratamientos)
-            if deuda_total > 0:
-                costo_total = sum(t.costo_total for t in tratamientos)
-                porcentaje_deuda = (deuda_total / costo_total * 100) if costo_total > 0 else 0
-                pacientes_con_deuda.append({
-                    'paciente': paciente,
-                    'deuda_total': deuda_total,
-                    'costo_total': costo_total,
-                    'porcentaje_deuda': round(porcentaje_deuda, 1)
-                })
-    
-    # Ordenar por deuda descendente y tomar top 10
-    pacientes_con_deuda.sort(key=lambda x: x['deuda_total'], reverse=True)
-    top_deudores = pacientes_con_deuda[:10]
+    # Deuda por paciente calculada en la BD; solo se traen los 10 primeros
+    deudores = Paciente.objects.con_deudas()
+    top_deudores = [_fila_deuda(p) for p in deudores.order_by(*ORDENES_DEUDA['deuda'])[:10]]
     
     # === PACIENTES CON MÁS TRATAMIENTOS ===
     pacientes_con_tratamientos = Paciente.objects.annotate(
@@ -194,15 +193,10 @@ def reportes(request):
     
     # === RESUMEN FINANCIERO ===
     # Total de ingresos (todos los pagos)
-    try:
-        total_ingresos = Pago.objects.aggregate(total=Sum('monto'))['total']
-        if total_ingresos is None:
-            total_ingresos = 0
-    except Exception:
-        total_ingresos = 0
+    total_ingresos = Pago.objects.aggregate(total=Sum('monto'))['total'] or 0
     
     # Total de deudas pendientes
-    total_deudas = sum(item['deuda_total'] for item in pacientes_con_deuda)
+    total_deudas = deudores.aggregate(total=Sum('deuda_total'))['total'] or 0
     
     # Pagos del mes actual (calendario)
     hoy = timezone.now()
@@ -214,36 +208,22 @@ def reportes(request):
              'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
     nombre_mes = meses[mes_actual]
     
-    try:
-        pagos_mes = Pago.objects.filter(
-            fecha_pago__year=anio_actual,
-            fecha_pago__month=mes_actual
-        ).aggregate(total=Sum('monto'))['total']
-        
-        if pagos_mes is None:
-            pagos_mes = 0
-    except Exception as e:
-        print(f"Error calculando pagos del mes: {e}")
-        pagos_mes = 0
-    
-    # Costo total de todos los tratamientos
-    try:
-        costo_total_tratamientos = Tratamiento.objects.aggregate(
-            total=Sum('costo_total')
-        )['total']
-        if costo_total_tratamientos is None:
-            costo_total_tratamientos = 0
-    except Exception:
-        costo_total_tratamientos = 0
+    pagos_mes = Pago.objects.filter(
+        fecha_pago__year=anio_actual,
+        fecha_pago__month=mes_actual
+    ).aggregate(total=Sum('monto'))['total'] or 0
     
     # === ESTADÍSTICAS DE TRATAMIENTOS ===
-    # Contar tratamientos por estado
-    stats_tratamientos = {
-        'pendiente': Tratamiento.objects.filter(estado='pendiente').count(),
-        'en_progreso': Tratamiento.objects.filter(estado='en_progreso').count(),
-        'completado': Tratamiento.objects.filter(estado='completado').count(),
-        'total': Tratamiento.objects.count()
-    }
+    # Costo total y conteo por estado en una sola consulta
+    resumen_tratamientos = Tratamiento.objects.aggregate(
+        costo_total=Sum('costo_total'),
+        pendiente=Count('pk', filter=Q(estado='pendiente')),
+        en_progreso=Count('pk', filter=Q(estado='en_progreso')),
+        completado=Count('pk', filter=Q(estado='completado')),
+        total=Count('pk'),
+    )
+    costo_total_tratamientos = resumen_tratamientos.pop('costo_total') or 0
+    stats_tratamientos = resumen_tratamientos
     
     context = {
         'top_deudores': top_deudores,
@@ -265,6 +245,9 @@ def pacientes_deudas(request):
     fecha_desde = request.GET.get('fecha_desde', '')
     fecha_hasta = request.GET.get('fecha_hasta', '')
     filtro_rapido = request.GET.get('filtro_rapido', '')
+    orden = request.GET.get('orden', '')
+    if orden not in ORDENES_DEUDA:
+        orden = 'deuda'
     
     # Calcular fechas según filtro rápido
     hoy = timezone.now().date()
@@ -281,203 +264,46 @@ def pacientes_deudas(request):
         fecha_desde = f"{hoy.year}-01-01"
         fecha_hasta = hoy.strftime('%Y-%m-%d')
     
-    # Obtener todos los pacientes con sus deudas
-    pacientes_con_deuda = []
-    
-    for paciente in Paciente.objects.all():
-        tratamientos = paciente.tratamientos.all()
-        
-        # Aplicar filtro de fecha si existe
-        if fecha_desde and fecha_hasta:
-            try:
-                fecha_desde_obj = timezone.datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-                fecha_hasta_obj = timezone.datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-                tratamientos = tratamientos.filter(
-                    fecha_inicio__gte=fecha_desde_obj,
-                    fecha_inicio__lte=fecha_hasta_obj
-                )
-            except ValueError:
-                pass  # Si hay error en las fechas, ignorar filtro
-        
-        if tratamientos.exists():
-            deuda_total = sum(t.deuda for t in tratamientos)
-            if deuda_total > 0:
-                costo_total = sum(t.costo_total for t in tratamientos)
-                porcentaje_deuda = (deuda_total / costo_total * 100) if costo_total > 0 else 0
-                pacientes_con_deuda.append({
-                    'paciente': paciente,
-                    'deuda_total': deuda_total,
-                    'costo_total': costo_total,
-                    'porcentaje_deuda': round(porcentaje_deuda, 1)
-                })
-    
-    # Ordenar por deuda descendente y tomar top 10
-    pacientes_con_deuda.sort(key=lambda x: x['deuda_total'], reverse=True)
-    top_deudores = pacientes_con_deuda[:10]
-    
-    # === PACIENTES CON MÁS TRATAMIENTOS ===
-    pacientes_con_tratamientos = Paciente.objects.annotate(
-        num_tratamientos=Count('tratamientos')
-    ).filter(num_tratamientos__gt=0).order_by('-num_tratamientos')[:10]
-    
-    # === RESUMEN FINANCIERO ===
-    # Total de ingresos (todos los pagos)
-    try:
-        total_ingresos = Pago.objects.aggregate(total=Sum('monto'))['total']
-        if total_ingresos is None:
-            total_ingresos = 0
-    except Exception:
-        total_ingresos = 0
-    
-    # Total de deudas pendientes
-    total_deudas = sum(item['deuda_total'] for item in pacientes_con_deuda)
-    
-    # Pagos del mes actual (calendario)
-    hoy = timezone.now()
-    mes_actual = hoy.month
-    anio_actual = hoy.year
-    
-    # Nombres de meses en español
-    meses = ['', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-             'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
-    nombre_mes = meses[mes_actual]
-    
-    try:
-        pagos_mes = Pago.objects.filter(
-            fecha_pago__year=anio_actual,
-            fecha_pago__month=mes_actual
-        ).aggregate(total=Sum('monto'))['total']
-        
-        if pagos_mes is None:
-            pagos_mes = 0
-    except Exception as e:
-        print(f"Error calculando pagos del mes: {e}")
-        pagos_mes = 0
-    
-    # Costo total de todos los tratamientos
-    try:
-        costo_total_tratamientos = Tratamiento.objects.aggregate(
-            total=Sum('costo_total')
-        )['total']
-        if costo_total_tratamientos is None:
-            costo_total_tratamientos = 0
-    except Exception:
-        costo_total_tratamientos = 0
-    
-    # === ESTADÍSTICAS DE TRATAMIENTOS ===
-    # Contar tratamientos por estado
-    stats_tratamientos = {
-        'pendiente': Tratamiento.objects.filter(estado='pendiente').count(),
-        'en_progreso': Tratamiento.objects.filter(estado='en_progreso').count(),
-        'completado': Tratamiento.objects.filter(estado='completado').count(),
-        'total': Tratamiento.objects.count()
-    }
-    
-    context = {
-        'top_deudores': top_deudores,
-        'pacientes_con_tratamientos': pacientes_con_tratamientos,
-        'total_ingresos': total_ingresos,
-        'total_deudas': total_deudas,
-        'pagos_mes': pagos_mes,
-        'nombre_mes': nombre_mes,
-        'costo_total_tratamientos': costo_total_tratamientos,
-        'stats_tratamientos': stats_tratamientos,
-    }
-    
-    return render(request, 'pacientes/reportes.html', context)
-
-def pacientes_deudas(request):
-    """Vista para mostrar todos los pacientes con deuda, con filtros por fecha"""
-    
-    # Obtener parámetros de filtro
-    fecha_desde = request.GET.get('fecha_desde', '')
-    fecha_hasta = request.GET.get('fecha_hasta', '')
-    filtro_rapido = request.GET.get('filtro_rapido', '')
-    
-    # Calcular fechas según filtro rápido
-    hoy = timezone.now().date()
-    if filtro_rapido == '1mes':
-        fecha_desde = (hoy - timedelta(days=30)).strftime('%Y-%m-%d')
-        fecha_hasta = hoy.strftime('%Y-%m-%d')
-    elif filtro_rapido == '3meses':
-        fecha_desde = (hoy - timedelta(days=90)).strftime('%Y-%m-%d')
-        fecha_hasta = hoy.strftime('%Y-%m-%d')
-    elif filtro_rapido == '6meses':
-        fecha_desde = (hoy - timedelta(days=180)).strftime('%Y-%m-%d')
-        fecha_hasta = hoy.strftime('%Y-%m-%d')
-    elif filtro_rapido == 'anio':
-        fecha_desde = f"{hoy.year}-01-01"
-        fecha_hasta = hoy.strftime('%Y-%m-%d')
-    
-    # Obtener todos los pacientes con sus deudas
-    pacientes_con_deuda = []
-    
-    for paciente in Paciente.objects.all():
-        tratamientos = paciente.tratamientos.all()
-        
-        # Aplicar filtro de fecha si existe
-        if fecha_desde and fecha_hasta:
-            try:
-                fecha_desde_obj = timezone.datetime.strptime(fecha_desde, '%Y-%m-%d').date()
-                fecha_hasta_obj = timezone.datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
-                tratamientos = tratamientos.filter(
-                    fecha_inicio__gte=fecha_desde_obj,
-                    fecha_inicio__lte=fecha_hasta_obj
-                )
-            except ValueError:
-                pass  # Si hay error en las fechas, ignorar filtro
-        
-        if tratamientos.exists():
-            deuda_total = sum(t.deuda for t in tratamientos)
-            
-            if deuda_total > 0:
-                costo_total = sum(t.costo_total for t in tratamientos)
-                porcentaje_deuda = (deuda_total / costo_total * 100) if costo_total > 0 else 0
-                
-                # Obtener último pago
-                ultimo_pago = None
-                pagos = Pago.objects.filter(tratamiento__paciente=paciente).order_by('-fecha_pago')
-                if pagos.exists():
-                    ultimo_pago = pagos.first().fecha_pago
-                
-                # Contar tratamientos con deuda
-                tratamientos_con_deuda = sum(1 for t in tratamientos if t.deuda > 0)
-                
-                pacientes_con_deuda.append({
-                    'paciente': paciente,
-                    'deuda_total': deuda_total,
-                    'costo_total': costo_total,
-                    'porcentaje_deuda': round(porcentaje_deuda, 1),
-                    'num_tratamientos': tratamientos_con_deuda,
-                    'ultimo_pago': ultimo_pago,
-                })
+    # Aplicar filtro de fecha si existe
+    desde = hasta = None
+    if fecha_desde and fecha_hasta:
+        try:
+            desde = timezone.datetime.strptime(fecha_desde, '%Y-%m-%d').date()
+            hasta = timezone.datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
+        except ValueError:
+            desde = hasta = None  # Si hay error en las fechas, ignorar filtro
     
-    # Ordenar por deuda descendente
-    pacientes_con_deuda.sort(key=lambda x: x['deuda_total'], reverse=True)
+    # Deuda, orden y estadísticas se calculan en la BD: la página cuesta
+    # siempre las mismas consultas, sin importar cuántos pacientes haya
+    deudores = Paciente.objects.con_deudas(desde=desde, hasta=hasta)
     
     # Calcular estadísticas
-    total_pacientes = len(pacientes_con_deuda)
-    total_deudas = sum(item['deuda_total'] for item in pacientes_con_deuda)
-    deuda_promedio = total_deudas / total_pacientes if total_pacientes > 0 else 0
-    deuda_minima = min((item['deuda_total'] for item in pacientes_con_deuda), default=0)
-    deuda_maxima = max((item['deuda_total'] for item in pacientes_con_deuda), default=0)
-    
-    # Paginación
-    paginator = Paginator(pacientes_con_deuda, 20)
+    estadisticas = deudores.aggregate(
+        total_pacientes=Count('pk'),
+        total_deudas=Sum('deuda_total'),
+        deuda_promedio=Avg('deuda_total'),
+        deuda_minima=Min('deuda_total'),
+        deuda_maxima=Max('deuda_total'),
+    )
+    
+    # Paginación (el conteo ya se hizo en las estadísticas)
+    paginator = Paginator(deudores.order_by(*ORDENES_DEUDA[orden]), 20)
+    paginator.count = estadisticas['total_pacientes']
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
     context = {
         'page_obj': page_obj,
-        'pacientes_con_deuda': page_obj.object_list,
-        'total_pacientes': total_pacientes,
-        'total_deudas': total_deudas,
-        'deuda_promedio': deuda_promedio,
-        'deuda_minima': deuda_minima,
-        'deuda_maxima': deuda_maxima,
+        'pacientes_con_deuda': [_fila_deuda(p) for p in page_obj.object_list],
+        'total_pacientes': estadisticas['total_pacientes'],
+        'total_deudas': estadisticas['total_deudas'] or 0,
+        'deuda_promedio': estadisticas['deuda_promedio'] or 0,
+        'deuda_minima': estadisticas['deuda_minima'] or 0,
+        'deuda_maxima': estadisticas['deuda_maxima'] or 0,
         'fecha_desde': fecha_desde,
         'fecha_hasta': fecha_hasta,
         'filtro_rapido': filtro_rapido,
+        'orden': orden,
     }
     
     return render(request, 'pacientes/pacientes_deudas.html', context)
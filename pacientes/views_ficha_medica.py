@@ -7,6 +7,7 @@ from django.http import JsonResponse
 from django.utils import timezone
 from .models import Paciente, TokenFichaPaciente, FichaMedicaPaciente
 from .forms import FichaMedicaPacienteForm
+from consultorio_dental.utils import omitir_context_processors
 
 
 def generar_token_ficha(request, paciente_id):
@@ -29,6 +30,7 @@ def generar_token_ficha(request, paciente_id):
     })
 
 
+@omitir_context_processors()
 def ficha_publica(request, token):
     """Vista pública para que el paciente llene su ficha médica"""
     
@@ -104,6 +106,7 @@ def ficha_publica(request, token):
     return render(request, 'pacientes/ficha_publica.html', context)
 
 
+@omitir_context_processors()
 def ficha_completada(request):
     """Página de confirmación después de completar la ficha"""
     return render(request, 'pacientes/ficha_completada.html')
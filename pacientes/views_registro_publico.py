@@ -6,8 +6,11 @@ from django.contrib import messages
 from .models import Paciente
 from .forms_registro_publico import RegistroPacientePublicoForm
 from datetime import date
+from consultorio_dental.utils import omitir_context_processors
 
 
+# Página pública: la configuración se pasa explícitamente y no hay datos internos
+@omitir_context_processors()
 def registro_paciente_publico(request):
     """Formulario público para que pacientes se auto-registren"""
     
@@ -38,10 +41,10 @@ def registro_paciente_publico(request):
         form = RegistroPacientePublicoForm()
     
     # Obtener configuración del consultorio
-    from configuracion.models import ConfiguracionConsultorio
+    from configuracion.cache import get_configuracion_cacheada
     try:
-        config = ConfiguracionConsultorio.objects.first()
-    except:
+        config = get_configuracion_cacheada()
+    except Exception:
         config = None
     
     context = {
@@ -52,6 +55,7 @@ def registro_paciente_publico(request):
     return render(request, 'pacientes/registro_publico.html', context)
 
 
+@omitir_context_processors()
 def registro_completado(request):
     """Página de confirmación después del registro"""
     return render(request, 'pacientes/registro_completado.html')
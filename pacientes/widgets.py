@@ -0,0 +1,85 @@
+# pacientes/widgets.py
+"""
+Selector de paciente con autocompletado.
+
+Un ``<select>`` con la FK a ``Paciente`` escribe un ``<option>`` por cada
+paciente en cada render. ``SelectorPacienteWidget`` solo escribe el
+paciente elegido (un campo oculto con el id y un cuadro de texto con su
+nombre); las coincidencias se piden mientras se escribe al autocompletado
+(``pacientes:autocompletar``), de a una página por vez.
+
+Uso en un ``ModelForm``::
+
+    class Meta:
+        field_classes = {'paciente': SelectorPacienteField}
+
+y en el admin, con ``SelectorPacienteAdminMixin`` (``pacientes.admin``).
+La plantilla que muestre el formulario debe incluir ``{{ form.media }}``.
+"""
+
+from django import forms
+from django.core.validators import EMPTY_VALUES
+from django.urls import reverse
+
+from .directorio import LIMITE
+from .models import Paciente
+
+
+class SelectorPacienteWidget(forms.Widget):
+    template_name = 'pacientes/widgets/selector_paciente.html'
+    placeholder = 'Buscar paciente por nombre, DNI o teléfono...'
+
+    class Media:
+        css = {'all': ('css/selector_paciente.css',)}
+        js = ('js/selector_paciente.js',)
+
+    def __init__(self, attrs=None, limite=LIMITE):
+        super().__init__(attrs)
+        self.limite = limite
+
+    def id_for_label(self, id_):
+        # La etiqueta apunta al cuadro de texto, no al campo oculto
+        return f'{id_}_texto' if id_ else id_
+
+    def etiqueta(self, value):
+        """Texto del paciente elegido (una consulta por clave primaria)."""
+        if value in EMPTY_VALUES:
+            return ''
+        try:
+            paciente = Paciente.objects.only('nombre_completo', 'dni').get(pk=value)
+        except (Paciente.DoesNotExist, ValueError, TypeError):
+            return ''
+        return str(paciente)
+
+    def format_value(self, value):
+        if value in EMPTY_VALUES:
+            return ''
+        return str(value)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        texto_attrs = {
+            key: val for key, val in context['widget']['attrs'].items() if key != 'required'
+        }
+        texto_attrs.setdefault('placeholder', self.placeholder)
+        if texto_attrs.get('id'):
+            texto_attrs['id'] = self.id_for_label(texto_attrs['id'])
+        context['widget'].update({
+            'id': context['widget']['attrs'].get('id', ''),
+            'etiqueta': self.etiqueta(context['widget']['value']),
+            'texto_attrs': texto_attrs,
+            'url': reverse('pacientes:autocompletar'),
+            'limite': self.limite,
+        })
+        return context
+
+
+class SelectorPacienteField(forms.ModelChoiceField):
+    """``ModelChoiceField`` de pacientes que se muestra con ``SelectorPacienteWidget``."""
+
+    widget = SelectorPacienteWidget
+
+    def __init__(self, queryset=None, **kwargs):
+        if queryset is None:
+            queryset = Paciente.objects.all()
+        super().__init__(queryset, **kwargs)
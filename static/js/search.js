@@ -17,14 +17,24 @@
     }
     
     // Variables de control
-    let searchTimeout;
-    const DEBOUNCE_DELAY = 300; // ms
+    let autocompleteTimeout;
+    // Mientras se escribe solo se pide el autocompletado de pacientes (sale de
+    // memoria en el servidor). La búsqueda global, que consulta la BD, se hace
+    // con Enter o cuando el autocompletado trae menos de AUTOCOMPLETE_LIMIT
+    const AUTOCOMPLETE_DELAY = 60; // ms
+    const AUTOCOMPLETE_LIMIT = 5;
     const MIN_QUERY_LENGTH = 2;
+    // Número de la búsqueda en curso y de la última con resultados completos,
+    // para descartar respuestas que llegan tarde
+    let currentSearch = 0;
+    let completedSearch = 0;
     
     /**
      * Renderiza los resultados de búsqueda
      */
     function renderSearchResults(results) {
+        // Los resultados nuevos no heredan la selección con el teclado
+        selectedIndex = -1;
         if (results.length === 0) {
             searchResults.innerHTML = `
                 <div class="search-result-item">
@@ -57,10 +67,50 @@
         return div.innerHTML;
     }
     
+    /**
+     * Muestra primero los pacientes (autocompletado rápido) mientras llega
+     * la búsqueda global completa
+     */
+    function performAutocomplete(query, searchId) {
+        fetch(`/pacientes/api/autocomplete/?q=${encodeURIComponent(query)}&limite=${AUTOCOMPLETE_LIMIT}`)
+            .then(response => response.ok ? response.json() : { results: [] })
+            .then(data => {
+                if (searchId !== currentSearch || completedSearch === searchId) {
+                    return;
+                }
+                // Pocos pacientes: puede ser un tratamiento, una nota, ...
+                if (data.results.length < AUTOCOMPLETE_LIMIT) {
+                    performSearch(query, searchId);
+                    return;
+                }
+                renderSearchResults(data.results.map(p => ({
+                    type: 'paciente',
+                    title: p.nombre,
+                    subtitle: p.dni ? `DNI: ${p.dni}` : 'Sin DNI',
+                    url: p.url,
+                    icon: 'bi-person'
+                })));
+                searchResults.insertAdjacentHTML('beforeend', `
+                    <a href="#" class="search-result-item" data-busqueda-global>
+                        <i class="bi bi-search search-result-icon"></i>
+                        <div class="search-result-content">
+                            <div class="search-result-title">Buscar "${escapeHtml(query)}" en todo el sistema</div>
+                            <div class="search-result-meta">Tratamientos, historias, notas y pagos (Enter)</div>
+                        </div>
+                    </a>
+                `);
+            })
+            .catch(() => {
+                if (searchId === currentSearch) {
+                    performSearch(query, searchId);
+                }
+            });
+    }
+    
     /**
      * Realiza la búsqueda AJAX
      */
-    function performSearch(query) {
+    function performSearch(query, searchId) {
         fetch(`/pacientes/api/buscar/?q=${encodeURIComponent(query)}`)
             .then(response => {
                 if (!response.ok) {
@@ -69,6 +119,10 @@
                 return response.json();
             })
             .then(data => {
+                if (searchId !== currentSearch) {
+                    return;
+                }
+                completedSearch = searchId;
                 renderSearchResults(data.results);
             })
             .catch(error => {
@@ -87,8 +141,9 @@
      * Maneja el evento de input con debounce
      */
     searchInput.addEventListener('input', function() {
-        clearTimeout(searchTimeout);
+        clearTimeout(autocompleteTimeout);
         const query = this.value.trim();
+        const searchId = ++currentSearch;
         
         // Si la query es muy corta, ocultar resultados
         if (query.length < MIN_QUERY_LENGTH) {
@@ -97,9 +152,27 @@
         }
         
         // Debounce: esperar antes de buscar
-        searchTimeout = setTimeout(() => {
-            performSearch(query);
-        }, DEBOUNCE_DELAY);
+        autocompleteTimeout = setTimeout(() => {
+            performAutocomplete(query, searchId);
+        }, AUTOCOMPLETE_DELAY);
+    });
+    
+    /**
+     * Búsqueda global en la BD con la query actual
+     */
+    function searchEverywhere() {
+        clearTimeout(autocompleteTimeout);
+        const query = searchInput.value.trim();
+        if (query.length >= MIN_QUERY_LENGTH) {
+            performSearch(query, ++currentSearch);
+        }
+    }
+    
+    searchResults.addEventListener('click', function(e) {
+        if (e.target.closest('[data-busqueda-global]')) {
+            e.preventDefault();
+            searchEverywhere();
+        }
     });
     
     /**
@@ -129,6 +202,13 @@
     searchInput.addEventListener('keydown', function(e) {
         const items = searchResults.querySelectorAll('.search-result-item');
         
+        // Enter sin un resultado elegido: búsqueda global
+        if (e.key === 'Enter' && !(selectedIndex >= 0 && items[selectedIndex])) {
+            e.preventDefault();
+            searchEverywhere();
+            return;
+        }
+        
         if (items.length === 0) return;
         
         switch(e.key) {
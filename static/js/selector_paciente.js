@@ -0,0 +1,214 @@
+// static/js/selector_paciente.js
+/**
+ * Selector de paciente con autocompletado
+ * (widget pacientes.widgets.SelectorPacienteWidget)
+ *
+ * El formulario solo trae el paciente elegido; las coincidencias se piden
+ * al autocompletado mientras se escribe, de a una página, y "Ver más"
+ * trae la siguiente. Los eventos se escuchan en el documento, así que
+ * también funciona con filas agregadas después (inlines del admin).
+ */
+
+(function() {
+    'use strict';
+
+    const DEBOUNCE_DELAY = 150; // ms
+    const MIN_QUERY_LENGTH = 1;
+
+    // Estado de cada selector: texto buscado, página, número de la consulta en curso
+    const estados = new WeakMap();
+
+    function estado(selector) {
+        if (!estados.has(selector)) {
+            estados.set(selector, { texto: '', pagina: 1, consulta: 0, timeout: null, activo: -1 });
+        }
+        return estados.get(selector);
+    }
+
+    function partes(selector) {
+        return {
+            valor: selector.querySelector('.selector-paciente-valor'),
+            texto: selector.querySelector('.selector-paciente-texto'),
+            lista: selector.querySelector('.selector-paciente-lista')
+        };
+    }
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function etiqueta(paciente) {
+        return `${paciente.nombre} (DNI: ${paciente.dni})`;
+    }
+
+    function cerrar(selector) {
+        const { texto, lista } = partes(selector);
+        lista.hidden = true;
+        texto.setAttribute('aria-expanded', 'false');
+        estado(selector).activo = -1;
+    }
+
+    function elegir(selector, id, texto_elegido) {
+        const { valor, texto } = partes(selector);
+        valor.value = id;
+        texto.value = texto_elegido;
+        texto.dataset.etiqueta = texto_elegido;
+        valor.dispatchEvent(new Event('change', { bubbles: true }));
+        cerrar(selector);
+    }
+
+    function opciones(selector) {
+        return Array.from(partes(selector).lista.querySelectorAll('.selector-paciente-opcion'));
+    }
+
+    function marcar(selector, indice) {
+        const items = opciones(selector);
+        if (items.length === 0) {
+            return;
+        }
+        const st = estado(selector);
+        st.activo = (indice + items.length) % items.length;
+        items.forEach((item, i) => item.classList.toggle('activo', i === st.activo));
+        items[st.activo].scrollIntoView({ block: 'nearest' });
+    }
+
+    function renderizar(selector, data, agregar) {
+        const { texto, lista } = partes(selector);
+        const anterior = lista.querySelector('.selector-paciente-mas');
+        if (anterior) {
+            anterior.remove();
+        }
+        const html = data.results.map(p => `
+            <div class="selector-paciente-opcion" role="option" data-id="${p.id}" data-etiqueta="${escapeHtml(etiqueta(p))}">
+                <div class="selector-paciente-nombre">${escapeHtml(p.nombre)}</div>
+                <div class="selector-paciente-meta">DNI: ${escapeHtml(p.dni)}${p.telefono ? ' · ' + escapeHtml(p.telefono) : ''}</div>
+            </div>
+        `).join('');
+        if (agregar) {
+            lista.insertAdjacentHTML('beforeend', html);
+        } else if (data.results.length === 0) {
+            lista.innerHTML = '<div class="selector-paciente-vacio">No se encontraron pacientes</div>';
+        } else {
+            lista.innerHTML = html;
+            estado(selector).activo = -1;
+        }
+        if (data.mas) {
+            lista.insertAdjacentHTML('beforeend', '<div class="selector-paciente-mas">Ver más resultados</div>');
+        }
+        lista.hidden = false;
+        texto.setAttribute('aria-expanded', 'true');
+    }
+
+    function buscar(selector, agregar) {
+        const st = estado(selector);
+        const consulta = ++st.consulta;
+        const params = new URLSearchParams({
+            q: st.texto,
+            limite: selector.dataset.limite,
+            pagina: st.pagina
+        });
+        fetch(`${selector.dataset.url}?${params}`)
+            .then(response => response.ok ? response.json() : { results: [], mas: false })
+            .then(data => {
+                // Una respuesta que llega tarde no pisa la de una búsqueda posterior
+                if (consulta === st.consulta) {
+                    renderizar(selector, data, agregar);
+                }
+            })
+            .catch(() => {});
+    }
+
+    document.addEventListener('input', function(event) {
+        const selector = event.target.closest('.selector-paciente');
+        if (!selector || !event.target.classList.contains('selector-paciente-texto')) {
+            return;
+        }
+        const st = estado(selector);
+        const { valor } = partes(selector);
+        // Escribir deja el campo sin paciente hasta que se elija uno
+        valor.value = '';
+        clearTimeout(st.timeout);
+        st.texto = event.target.value.trim();
+        st.pagina = 1;
+        if (st.texto.length < MIN_QUERY_LENGTH) {
+            st.consulta++;
+            cerrar(selector);
+            return;
+        }
+        st.timeout = setTimeout(() => buscar(selector, false), DEBOUNCE_DELAY);
+    });
+
+    // mousedown en vez de click: ocurre antes del blur del cuadro de texto
+    document.addEventListener('mousedown', function(event) {
+        const selector = event.target.closest('.selector-paciente');
+        if (!selector) {
+            return;
+        }
+        const opcion = event.target.closest('.selector-paciente-opcion');
+        if (opcion) {
+            event.preventDefault();
+            elegir(selector, opcion.dataset.id, opcion.dataset.etiqueta);
+        } else if (event.target.closest('.selector-paciente-mas')) {
+            event.preventDefault();
+            estado(selector).pagina++;
+            buscar(selector, true);
+        }
+    });
+
+    document.addEventListener('keydown', function(event) {
+        const selector = event.target.closest('.selector-paciente');
+        if (!selector || !event.target.classList.contains('selector-paciente-texto')) {
+            return;
+        }
+        const st = estado(selector);
+        const abierta = !partes(selector).lista.hidden;
+        if (event.key === 'ArrowDown' && abierta) {
+            event.preventDefault();
+            marcar(selector, st.activo + 1);
+        } else if (event.key === 'ArrowUp' && abierta) {
+            event.preventDefault();
+            marcar(selector, st.activo - 1);
+        } else if (event.key === 'Enter' && abierta && st.activo >= 0) {
+            event.preventDefault();
+            const opcion = opciones(selector)[st.activo];
+            elegir(selector, opcion.dataset.id, opcion.dataset.etiqueta);
+        } else if (event.key === 'Escape' && abierta) {
+            event.preventDefault();
+            cerrar(selector);
+        }
+    });
+
+    // Al salir sin elegir se vuelve al paciente que estaba; si se borró el texto, queda vacío
+    document.addEventListener('focusout', function(event) {
+        const selector = event.target.closest('.selector-paciente');
+        if (!selector || !event.target.classList.contains('selector-paciente-texto')) {
+            return;
+        }
+        const { valor, texto } = partes(selector);
+        const st = estado(selector);
+        clearTimeout(st.timeout);
+        st.consulta++;
+        cerrar(selector);
+        if (texto.value.trim() === '') {
+            texto.dataset.etiqueta = '';
+            valor.dataset.anterior = '';
+        } else if (!valor.value) {
+            valor.value = valor.dataset.anterior || '';
+            texto.value = valor.value ? texto.dataset.etiqueta : '';
+        }
+    });
+
+    // Paciente elegido al cargar (para poder restaurarlo)
+    document.addEventListener('focusin', function(event) {
+        const selector = event.target.closest('.selector-paciente');
+        if (!selector || !event.target.classList.contains('selector-paciente-texto')) {
+            return;
+        }
+        const { valor } = partes(selector);
+        if (valor.value) {
+            valor.dataset.anterior = valor.value;
+        }
+    });
+})();
@@ -0,0 +1,205 @@
+# tratamientos/exportar.py
+"""
+Odontograma en SVG y PDF generado en el servidor.
+
+El dibujo sale del snapshot empaquetado (``tratamientos.odontograma``) con
+la misma geometría que la pantalla, y el PDF pasa por
+``consultorio_dental.utils.render_to_pdf``. Ambos se guardan en la caché con
+una clave que es un hash de todo lo que cambia el resultado (versión del
+snapshot, versión de la configuración, datos del paciente, dentición), así
+que volver a exportar un odontograma sin cambios no renderiza nada.
+"""
+
+import base64
+import hashlib
+import os
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from configuracion.cache import get_configuracion_cacheada, version_configuracion
+from consultorio_dental.utils import render_to_pdf
+
+from .models import EstadoDiente, HistorialOdontograma
+from .odontograma import desempaquetar
+
+CACHE_PREFIX = 'odontograma:render'
+CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Mismos colores que las herramientas de odontograma.html
+COLORES_ESTADO = {
+    'sano': '#ffffff',
+    'caries': '#dc3545',
+    'obturado': '#0d6efd',
+    'corona': '#ffc107',
+    'ausente': '#212529',
+    'endodoncia': '#6f42c1',
+    'protesis': '#adb5bd',
+    'sellante': '#20c997',
+    'bracket': '#17a2b8',
+    'retenedor': '#fd7e14',
+    'aparato': '#e83e8c',
+    'extraccion_programada': '#6c757d',
+    'fractura': '#ff6b6b',
+    'implante': '#4ecdc4',
+    'puente': '#95a5a6',
+    'protesis_parcial': '#9b59b6',
+    'protesis_total': '#8e44ad',
+    'en_erupcion': '#f39c12',
+    'retenido': '#d35400',
+}
+
+DENTICIONES = {
+    'adulto': {
+        'nombre': 'Adulto (32 dientes)',
+        'superior': [18, 17, 16, 15, 14, 13, 12, 11, 21, 22, 23, 24, 25, 26, 27, 28],
+        'inferior': [48, 47, 46, 45, 44, 43, 42, 41, 31, 32, 33, 34, 35, 36, 37, 38],
+        'separacion': 50,
+    },
+    'nino': {
+        'nombre': 'Niño (20 dientes)',
+        'superior': [55, 54, 53, 52, 51, 61, 62, 63, 64, 65],
+        'inferior': [85, 84, 83, 82, 81, 71, 72, 73, 74, 75],
+        'separacion': 80,
+    },
+}
+
+# Caras de cada diente (cuadrado de 40x40): posición -> puntos del polígono
+_POLIGONOS = (
+    ('arriba', '0,0 40,0 30,10 10,10'),
+    ('derecha', '40,0 40,40 30,30 30,10'),
+    ('abajo', '40,40 0,40 10,30 30,30'),
+    ('izquierda', '0,40 0,0 10,10 10,30'),
+    ('centro', '10,10 30,10 30,30 10,30'),
+)
+_LADO_DERECHO = set(range(11, 19)) | set(range(41, 49)) | set(range(51, 56)) | set(range(81, 86))
+
+
+def _cara(diente, posicion, superior):
+    """Cara anatómica que ocupa cada posición del dibujo (igual que la pantalla)."""
+    if posicion == 'centro':
+        return 'O'
+    if posicion == 'arriba':
+        return 'V' if superior else 'L'
+    if posicion == 'abajo':
+        return 'L' if superior else 'V'
+    if diente in _LADO_DERECHO:
+        return 'D' if posicion == 'izquierda' else 'M'
+    return 'M' if posicion == 'izquierda' else 'D'
+
+
+def _dientes(estados, denticion):
+    config = DENTICIONES[denticion]
+    mitad = len(config['superior']) // 2
+    dientes = []
+    for fila, superior, y in (('superior', True, 50), ('inferior', False, 250)):
+        for i, diente in enumerate(config[fila]):
+            x = 50 + i * config['separacion'] + (20 if i >= mitad else 0)
+            caras = []
+            for posicion, puntos in _POLIGONOS:
+                estado = estados.get((diente, _cara(diente, posicion, superior)))
+                caras.append({'puntos': puntos, 'color': COLORES_ESTADO.get(estado, '#ffffff')})
+            dientes.append({
+                'numero': diente,
+                'x': x,
+                'y': y,
+                'y_etiqueta': -5 if superior else 55,
+                'caras': caras,
+            })
+    return dientes
+
+
+def generar_svg(snapshot, denticion='adulto'):
+    estados = desempaquetar(snapshot.mapa)
+    return render_to_string('tratamientos/odontograma.svg', {
+        'dientes': _dientes(estados, denticion),
+    })
+
+
+def clave_render(paciente, snapshot, denticion, formato):
+    """Hash de todo lo que cambia el documento generado."""
+    partes = [
+        str(paciente.pk),
+        str(snapshot.version),
+        str(version_configuracion()),
+        paciente.actualizado_en.isoformat() if paciente.actualizado_en else '',
+        denticion,
+        formato,
+    ]
+    return hashlib.sha256(':'.join(partes).encode()).hexdigest()
+
+
+def _en_cache(clave, generar):
+    """Devuelve ``(contenido, desde_cache)``; ``generar`` puede devolver ``None`` si falla."""
+    cache_key = f'{CACHE_PREFIX}:{clave}'
+    contenido = cache.get(cache_key)
+    if contenido is not None:
+        return contenido, True
+    contenido = generar()
+    if contenido is not None:
+        cache.set(cache_key, contenido, timeout=CACHE_TIMEOUT)
+    return contenido, False
+
+
+def svg_odontograma(paciente, snapshot, denticion='adulto'):
+    """``(clave, svg, desde_cache)``."""
+    clave = clave_render(paciente, snapshot, denticion, 'svg')
+    svg, desde_cache = _en_cache(clave, lambda: generar_svg(snapshot, denticion))
+    return clave, svg, desde_cache
+
+
+def _edad_en(fecha_nacimiento, fecha):
+    if not fecha_nacimiento:
+        return None
+    return fecha.year - fecha_nacimiento.year - (
+        (fecha.month, fecha.day) < (fecha_nacimiento.month, fecha_nacimiento.day)
+    )
+
+
+def generar_pdf(paciente, snapshot, denticion='adulto'):
+    """PDF en bytes, o ``None`` si ``render_to_pdf`` falló."""
+    config = get_configuracion_cacheada()
+    estados = desempaquetar(snapshot.mapa)
+    svg = generar_svg(snapshot, denticion)
+    nombres = dict(EstadoDiente.ESTADO_CHOICES)
+    usados = sorted({estado for estado in estados.values() if estado != 'sano'}, key=list(nombres).index)
+    nombres_cara = dict(EstadoDiente.CARA_CHOICES)
+    historial = [
+        {
+            'fecha': cambio.fecha_cambio,
+            'diente': cambio.diente,
+            'cara': nombres_cara.get(cambio.cara, cambio.cara),
+            'estado': nombres.get(cambio.estado, cambio.estado),
+            'observaciones': cambio.observaciones,
+        }
+        for cambio in HistorialOdontograma.objects.filter(paciente=paciente).order_by('-pk')[:50]
+    ]
+    # La fecha del documento es la del último cambio, no la de exportación:
+    # así el mismo odontograma produce siempre el mismo PDF
+    fecha = snapshot.actualizado_en
+
+    logo = None
+    if config.logo and os.path.exists(config.logo.path):
+        logo = config.logo.path
+
+    respuesta = render_to_pdf('tratamientos/odontograma_pdf.html', {
+        'config': config,
+        'logo': logo,
+        'paciente': paciente,
+        'fecha': fecha,
+        'edad': _edad_en(paciente.fecha_nacimiento, fecha.date()),
+        'denticion': DENTICIONES[denticion]['nombre'],
+        'svg_data_uri': 'data:image/svg+xml;base64,' + base64.b64encode(svg.encode()).decode(),
+        'leyenda': [{'nombre': nombres[e], 'color': COLORES_ESTADO.get(e, '#ffffff')} for e in usados],
+        'historial': historial,
+    })
+    if respuesta.status_code != 200:
+        return None
+    return respuesta.content
+
+
+def pdf_odontograma(paciente, snapshot, denticion='adulto'):
+    """``(clave, pdf, desde_cache)``; ``pdf`` es ``None`` si no se pudo generar."""
+    clave = clave_render(paciente, snapshot, denticion, 'pdf')
+    pdf, desde_cache = _en_cache(clave, lambda: generar_pdf(paciente, snapshot, denticion))
+    return clave, pdf, desde_cache
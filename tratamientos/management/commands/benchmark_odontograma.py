@@ -0,0 +1,93 @@
+# tratamientos/management/commands/benchmark_odontograma.py
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from pacientes.models import Paciente
+from tratamientos.models import HistorialOdontograma
+from tratamientos.odontograma import (
+    INTERVALO_CHECKPOINT, ORDEN_CARAS, ORDEN_DIENTES, CODIGOS_ESTADO, crear_checkpoints, estado_en,
+)
+
+
+def medir(funcion, repeticiones):
+    mejor = None
+    resultado = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = funcion()
+        transcurrido = time.perf_counter() - t0
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, resultado
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la reconstrucción del odontograma en una fecha con y sin checkpoints '
+        '(crea un paciente sintético dentro de una transacción que se deshace al final)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cambios', type=int, nargs='+', default=[1000, 5000, 20000])
+        parser.add_argument('--intervalo', type=int, default=INTERVALO_CHECKPOINT)
+        parser.add_argument('--consultas', type=int, default=20, help='Fechas al azar a reconstruir')
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **options):
+        for num in options['cambios']:
+            with transaction.atomic():
+                self._medir(num, options)
+                transaction.set_rollback(True)
+
+    def _medir(self, num, options):
+        rnd = random.Random(42)
+        paciente = Paciente.objects.create(
+            nombre_completo='Benchmark Odontograma',
+            dni='00000000',
+            fecha_nacimiento=date(1990, 1, 1),
+            genero='O',
+            estado_civil='S',
+        )
+        fin = timezone.now()
+        inicio = fin - timedelta(days=365 * 5)
+        paso = (fin - inicio) / num
+        estados = CODIGOS_ESTADO[1:]
+        HistorialOdontograma.objects.bulk_create([
+            HistorialOdontograma(
+                paciente=paciente,
+                diente=str(rnd.choice(ORDEN_DIENTES)),
+                cara=rnd.choice(ORDEN_CARAS),
+                estado=rnd.choice(estados),
+            )
+            for _ in range(num)
+        ], batch_size=1000)
+        # fecha_cambio es auto_now_add: se reparten los cambios en los últimos 5 años
+        historial = list(HistorialOdontograma.objects.filter(paciente=paciente).order_by('pk').only('pk'))
+        for i, cambio in enumerate(historial):
+            cambio.fecha_cambio = inicio + paso * (i + 1)
+        HistorialOdontograma.objects.bulk_update(historial, ['fecha_cambio'], batch_size=1000)
+
+        momentos = [inicio + (fin - inicio) * rnd.random() for _ in range(options['consultas'])]
+
+        def reconstruir():
+            return [estado_en(paciente.pk, momento) for momento in momentos]
+
+        self.stdout.write(f"\nPaciente con {num} cambios en el historial, {len(momentos)} fechas al azar")
+        t_sin, sin = medir(reconstruir, options['repeticiones'])
+        self.stdout.write(f"  sin checkpoints:            {t_sin * 1000 / len(momentos):8.2f} ms por fecha")
+
+        t0 = time.perf_counter()
+        creados = crear_checkpoints(paciente.pk, intervalo=options['intervalo'])
+        t_crear = time.perf_counter() - t0
+        self.stdout.write(f"  crear {creados} checkpoints (cada {options['intervalo']}): {t_crear * 1000:8.1f} ms")
+
+        t_con, con = medir(reconstruir, options['repeticiones'])
+        self.stdout.write(f"  con checkpoints:            {t_con * 1000 / len(momentos):8.2f} ms por fecha")
+        if sin != con:
+            self.stderr.write(self.style.ERROR("  ✗ los resultados con y sin checkpoints no coinciden"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"  → {t_sin / t_con:.1f}x más rápido, mismos resultados"))
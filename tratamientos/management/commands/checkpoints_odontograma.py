@@ -0,0 +1,27 @@
+# tratamientos/management/commands/checkpoints_odontograma.py
+from django.core.management.base import BaseCommand
+
+from tratamientos.models import HistorialOdontograma
+from tratamientos.odontograma import INTERVALO_CHECKPOINT, crear_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Crea los checkpoints de odontograma que falten (cada N cambios del historial)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paciente', type=int, help='Solo este paciente')
+        parser.add_argument('--intervalo', type=int, default=INTERVALO_CHECKPOINT)
+
+    def handle(self, *args, **options):
+        if options['paciente']:
+            pacientes = [options['paciente']]
+        else:
+            pacientes = HistorialOdontograma.objects.values_list('paciente_id', flat=True).distinct()
+
+        total = 0
+        for paciente_id in pacientes:
+            creados = crear_checkpoints(paciente_id, intervalo=options['intervalo'])
+            if creados:
+                self.stdout.write(f"  paciente #{paciente_id}: {creados} checkpoints")
+            total += creados
+        self.stdout.write(self.style.SUCCESS(f"✓ {total} checkpoints creados"))
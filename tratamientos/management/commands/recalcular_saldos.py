@@ -0,0 +1,50 @@
+# tratamientos/management/commands/recalcular_saldos.py
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from tratamientos.models import Tratamiento
+
+
+class Command(BaseCommand):
+    help = 'Verifica (y corrige) total_pagado / saldo de cada tratamiento contra sus pagos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Solo informa las diferencias, no modifica nada (sale con error si hay diferencias)',
+        )
+
+    def handle(self, *args, **options):
+        incorrectos = []
+        revisados = 0
+        tratamientos = Tratamiento.objects.annotate(suma_pagos=Sum('pagos__monto')).only(
+            'pk', 'nombre', 'costo_total', 'total_pagado', 'saldo'
+        )
+        for tratamiento in tratamientos.iterator():
+            revisados += 1
+            pagado = tratamiento.suma_pagos or Decimal('0.00')
+            saldo = tratamiento.costo_total - pagado
+            if tratamiento.total_pagado != pagado or tratamiento.saldo != saldo:
+                self.stdout.write(self.style.WARNING(
+                    f"  #{tratamiento.pk} {tratamiento.nombre}: guardado pagado={tratamiento.total_pagado} "
+                    f"saldo={tratamiento.saldo} / real pagado={pagado} saldo={saldo}"
+                ))
+                tratamiento.total_pagado = pagado
+                tratamiento.saldo = saldo
+                incorrectos.append(tratamiento)
+
+        if not incorrectos:
+            self.stdout.write(self.style.SUCCESS(f"✓ {revisados} tratamientos revisados, todos cuadran"))
+            return
+
+        if options['verificar']:
+            self.stderr.write(self.style.ERROR(f"✗ {len(incorrectos)} de {revisados} tratamientos no cuadran"))
+            raise SystemExit(1)
+
+        with transaction.atomic():
+            Tratamiento.objects.bulk_update(incorrectos, ['total_pagado', 'saldo'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"✓ {len(incorrectos)} de {revisados} tratamientos corregidos"))
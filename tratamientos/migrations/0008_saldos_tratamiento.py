@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 12:34
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def calcular_saldos(apps, schema_editor):
+    Tratamiento = apps.get_model('tratamientos', 'Tratamiento')
+    tratamientos = []
+    for tratamiento in Tratamiento.objects.annotate(suma=Sum('pagos__monto')).iterator():
+        tratamiento.total_pagado = tratamiento.suma or Decimal('0.00')
+        tratamiento.saldo = tratamiento.costo_total - tratamiento.total_pagado
+        tratamientos.append(tratamiento)
+    Tratamiento.objects.bulk_update(tratamientos, ['total_pagado', 'saldo'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0007_historialodontograma'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tratamiento',
+            name='saldo',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Saldo pendiente (S/)'),
+        ),
+        migrations.AddField(
+            model_name='tratamiento',
+            name='total_pagado',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Total pagado (S/)'),
+        ),
+        migrations.RunPython(calcular_saldos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0004_dia_cumple'),
+        ('tratamientos', '0008_saldos_tratamiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OdontogramaSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('mapa', models.TextField(blank=True)),
+                ('observaciones', models.JSONField(blank=True, default=dict)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('paciente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='odontograma_snapshot', to='pacientes.paciente', verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Odontograma',
+                'verbose_name_plural': 'Snapshots de Odontogramas',
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 12:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0004_dia_cumple'),
+        ('tratamientos', '0009_odontograma_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckpointOdontograma',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hasta_id', models.PositiveBigIntegerField(verbose_name='Último cambio incluido')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha del último cambio incluido')),
+                ('mapa', models.TextField(blank=True)),
+                ('observaciones', models.JSONField(blank=True, default=dict)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Odontograma',
+                'verbose_name_plural': 'Checkpoints de Odontogramas',
+                'ordering': ['-fecha', '-hasta_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='historialodontograma',
+            index=models.Index(fields=['paciente', 'fecha_cambio'], name='historial_paciente_fecha'),
+        ),
+        migrations.AddField(
+            model_name='checkpointodontograma',
+            name='paciente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints_odontograma', to='pacientes.paciente', verbose_name='Paciente'),
+        ),
+        migrations.AddIndex(
+            model_name='checkpointodontograma',
+            index=models.Index(fields=['paciente', 'fecha'], name='checkpoint_paciente_fecha'),
+        ),
+    ]
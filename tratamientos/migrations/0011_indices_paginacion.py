@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tratamientos', '0010_checkpoints_odontograma'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['fecha_pago', 'id'], name='pago_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='tratamiento',
+            index=models.Index(fields=['fecha_inicio', 'id'], name='tratamiento_inicio_id'),
+        ),
+    ]
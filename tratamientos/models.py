@@ -1,10 +1,47 @@
 # tratamientos/models.py
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Cast, Coalesce, Round
 from django.urls import reverse
 from pacientes.models import Paciente
 from django.utils import timezone
 
+
+class TratamientoQuerySet(models.QuerySet):
+
+    def with_finanzas(self):
+        """
+        Tratamientos listos para listar: paciente en el mismo JOIN y los
+        datos de pago calculados en SQL, sin consultas extra por fila.
+        ``total_pagado`` y ``saldo`` ya son columnas; se anotan además
+        ``num_pagos``, ``porcentaje_pagado_sql`` y ``estado_pago_sql``, que
+        las propiedades ``porcentaje_pagado`` y ``estado_pago`` usan si están.
+        """
+        pagos = Pago.objects.filter(tratamiento=models.OuterRef('pk')).order_by().values('tratamiento')
+        return self.select_related('paciente').annotate(
+            num_pagos=Coalesce(
+                models.Subquery(pagos.annotate(n=models.Count('pk')).values('n')),
+                0,
+            ),
+            porcentaje_pagado_sql=models.Case(
+                models.When(costo_total=0, then=models.Value(100.0)),
+                default=Round(
+                    Cast('total_pagado', models.FloatField()) * 100
+                    / Cast('costo_total', models.FloatField()),
+                    1,
+                ),
+                output_field=models.FloatField(),
+            ),
+            estado_pago_sql=models.Case(
+                models.When(total_pagado__lte=0, then=models.Value('pendiente')),
+                models.When(total_pagado__gte=F('costo_total'), then=models.Value('completado')),
+                default=models.Value('parcial'),
+                output_field=models.CharField(),
+            ),
+        )
+
+
 class Tratamiento(models.Model):
     paciente = models.ForeignKey(
         Paciente,
@@ -45,13 +82,35 @@ class Tratamiento(models.Model):
         default='pendiente',
         verbose_name="Estado del tratamiento"
     )
+    # Libro de pagos desnormalizado: lo mantienen Pago.save() / Pago.delete()
+    # con updates F() atómicos (verificar con `manage.py recalcular_saldos`)
+    total_pagado = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name="Total pagado (S/)"
+    )
+    saldo = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name="Saldo pendiente (S/)"
+    )
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
 
+    objects = TratamientoQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Tratamiento"
         verbose_name_plural = "Tratamientos"
         ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['fecha_inicio', 'id'], name='tratamiento_inicio_id'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} - {self.paciente.nombre_completo}"
@@ -59,16 +118,14 @@ class Tratamiento(models.Model):
     def get_absolute_url(self):
         return reverse('tratamientos:detalle', kwargs={'pk': self.pk})
 
-    @property
-    def total_pagado(self):
-        return sum(pago.monto for pago in self.pagos.all())
-
     @property
     def deuda(self):
-        return self.costo_total - self.total_pagado
+        return self.saldo
 
     @property
     def porcentaje_pagado(self):
+        if hasattr(self, 'porcentaje_pagado_sql'):
+            return self.porcentaje_pagado_sql
         if self.costo_total == 0:
             return 100.0
         porcentaje = (self.total_pagado / self.costo_total) * 100
@@ -76,6 +133,8 @@ class Tratamiento(models.Model):
 
     @property
     def estado_pago(self):
+        if hasattr(self, 'estado_pago_sql'):
+            return self.estado_pago_sql
         if self.total_pagado <= 0:
             return 'pendiente'
         elif self.total_pagado >= self.costo_total:
@@ -87,7 +146,36 @@ class Tratamiento(models.Model):
         # Actualizar estado automáticamente si se marca fecha_fin
         if self.fecha_fin and self.estado != 'completado':
             self.estado = 'completado'
-        super().save(*args, **kwargs)
+
+        if self._state.adding:
+            self.total_pagado = 0
+            self.saldo = self.costo_total
+            super().save(*args, **kwargs)
+            return
+
+        # total_pagado / saldo en memoria pueden estar desactualizados si se
+        # registró un pago mientras tanto: nunca se escriben desde aquí
+        campos = kwargs.pop('update_fields', None)
+        if campos is None:
+            campos = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ('total_pagado', 'saldo')
+            ]
+        else:
+            campos = [c for c in campos if c not in ('total_pagado', 'saldo')]
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, update_fields=campos, **kwargs)
+            if 'costo_total' in campos:
+                Tratamiento.objects.filter(pk=self.pk).update(saldo=F('costo_total') - F('total_pagado'))
+                self.refresh_from_db(fields=['total_pagado', 'saldo'])
+
+    @classmethod
+    def aplicar_pago(cls, tratamiento_id, monto):
+        """Suma ``monto`` (negativo para anular) al total pagado con un UPDATE atómico."""
+        cls.objects.filter(pk=tratamiento_id).update(
+            total_pagado=F('total_pagado') + monto,
+            saldo=F('saldo') - monto,
+        )
 
 
 
@@ -150,15 +238,38 @@ class Pago(models.Model):
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
         ordering = ['-fecha_pago']
+        indexes = [
+            models.Index(fields=['fecha_pago', 'id'], name='pago_fecha_id'),
+        ]
 
     def __str__(self):
         return f"S/ {self.monto} - {self.get_metodo_pago_display()} ({self.fecha_pago})"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Actualizar estado del tratamiento al guardar un pago
-        if self.tratamiento:
-            self.tratamiento.save()
+        # El pago y el total del tratamiento se guardan en la misma transacción
+        with transaction.atomic():
+            anterior = None
+            if not self._state.adding:
+                anterior = Pago.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'tratamiento_id', 'monto'
+                ).first()
+            super().save(*args, **kwargs)
+            if anterior:
+                Tratamiento.aplicar_pago(anterior[0], -anterior[1])
+            Tratamiento.aplicar_pago(self.tratamiento_id, self.monto)
+        self._refrescar_tratamiento()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            Tratamiento.aplicar_pago(self.tratamiento_id, -self.monto)
+        self._refrescar_tratamiento()
+        return resultado
+
+    def _refrescar_tratamiento(self):
+        # Si el tratamiento ya está cargado en memoria, que muestre los totales nuevos
+        if Pago.tratamiento.is_cached(self):
+            self.tratamiento.refresh_from_db(fields=['total_pagado', 'saldo'])
 
 
 class EstadoDiente(models.Model):
@@ -280,7 +391,71 @@ class HistorialOdontograma(models.Model):
         verbose_name = "Historial de Odontograma"
         verbose_name_plural = "Historial de Odontogramas"
         ordering = ['-fecha_cambio']
+        indexes = [
+            models.Index(fields=['paciente', 'fecha_cambio'], name='historial_paciente_fecha'),
+        ]
     
     def __str__(self):
         return f"{self.paciente.nombre_completo} - Diente {self.diente} - {self.fecha_cambio.strftime('%d/%m/%Y %H:%M')}"
 
+
+class OdontogramaSnapshot(models.Model):
+    """
+    Odontograma completo del paciente en un solo registro, para cargarlo
+    con una consulta. ``mapa`` tiene un carácter por diente x cara con el
+    código de su estado (ver ``tratamientos.odontograma``); ``EstadoDiente``
+    sigue siendo la fuente normalizada para consultas. ``version`` sube en
+    cada cambio y sirve de ETag.
+    """
+    paciente = models.OneToOneField(
+        'pacientes.Paciente',
+        on_delete=models.CASCADE,
+        related_name='odontograma_snapshot',
+        verbose_name="Paciente"
+    )
+    version = models.PositiveIntegerField(default=0)
+    mapa = models.TextField(blank=True)
+    observaciones = models.JSONField(default=dict, blank=True)  # {"11V": "texto", ...}
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Snapshot de Odontograma"
+        verbose_name_plural = "Snapshots de Odontogramas"
+
+    def __str__(self):
+        return f"Odontograma de {self.paciente_id} (v{self.version})"
+
+
+class CheckpointOdontograma(models.Model):
+    """
+    Estado del odontograma tras aplicar el historial hasta ``hasta_id``
+    (inclusive), en el mismo formato empaquetado que el snapshot. Para ver
+    el odontograma en una fecha se parte del checkpoint anterior más
+    cercano y solo se repasan los cambios posteriores.
+    """
+    paciente = models.ForeignKey(
+        'pacientes.Paciente',
+        on_delete=models.CASCADE,
+        related_name='checkpoints_odontograma',
+        verbose_name="Paciente"
+    )
+    hasta_id = models.PositiveBigIntegerField(
+        verbose_name="Último cambio incluido"
+    )
+    fecha = models.DateTimeField(
+        verbose_name="Fecha del último cambio incluido"
+    )
+    mapa = models.TextField(blank=True)
+    observaciones = models.JSONField(default=dict, blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Checkpoint de Odontograma"
+        verbose_name_plural = "Checkpoints de Odontogramas"
+        ordering = ['-fecha', '-hasta_id']
+        indexes = [
+            models.Index(fields=['paciente', 'fecha'], name='checkpoint_paciente_fecha'),
+        ]
+
+    def __str__(self):
+        return f"Checkpoint {self.paciente_id} hasta #{self.hasta_id}"
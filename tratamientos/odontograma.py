@@ -0,0 +1,350 @@
+# tratamientos/odontograma.py
+"""
+Guardado del odontograma por lotes.
+
+La pantalla del odontograma acumula los cambios (diente, cara, estado,
+observaciones) y los envía juntos. ``validar_cambios`` los comprueba contra
+la numeración FDI y ``aplicar_cambios`` los escribe en una sola transacción:
+un upsert masivo de ``EstadoDiente`` y un ``bulk_create`` del historial, en
+lugar de dos escrituras por cada cara pintada.
+
+Además cada paciente tiene un ``OdontogramaSnapshot``: el estado de todas
+las caras empaquetado en un texto de un carácter por diente x cara, que la
+pantalla (o una tablet, o el PDF) carga de una sola vez.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CheckpointOdontograma, EstadoDiente, HistorialOdontograma, OdontogramaSnapshot
+
+# Numeración FDI: cuadrante (1-4 permanentes, 5-8 temporales) + posición
+DIENTES_PERMANENTES = frozenset(c * 10 + p for c in (1, 2, 3, 4) for p in range(1, 9))
+DIENTES_TEMPORALES = frozenset(c * 10 + p for c in (5, 6, 7, 8) for p in range(1, 6))
+DIENTES_FDI = DIENTES_PERMANENTES | DIENTES_TEMPORALES
+
+CARAS = frozenset(codigo for codigo, _nombre in EstadoDiente.CARA_CHOICES)
+ESTADOS = frozenset(codigo for codigo, _nombre in EstadoDiente.ESTADO_CHOICES)
+
+# Una boca adulta completa son 32 dientes x 6 caras
+MAX_CAMBIOS_LOTE = 500
+
+# ============================================
+# SNAPSHOT EMPAQUETADO
+# ============================================
+# Posición i del mapa = ORDEN_DIENTES[i // 6], ORDEN_CARAS[i % 6].
+# El carácter es ALFABETO[código] y el código es la posición del estado en
+# CODIGOS_ESTADO (0 = sin registro). Los códigos salen del orden de
+# EstadoDiente.ESTADO_CHOICES: los estados nuevos solo se agregan al final.
+ORDEN_DIENTES = tuple(sorted(DIENTES_FDI))
+ORDEN_CARAS = 'VLMDOC'
+CODIGOS_ESTADO = ('',) + tuple(codigo for codigo, _nombre in EstadoDiente.ESTADO_CHOICES)
+ALFABETO = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+_POSICION = {
+    (diente, cara): i * len(ORDEN_CARAS) + j
+    for i, diente in enumerate(ORDEN_DIENTES)
+    for j, cara in enumerate(ORDEN_CARAS)
+}
+_CARACTER_ESTADO = {estado: ALFABETO[codigo] for codigo, estado in enumerate(CODIGOS_ESTADO)}
+_MAPA_VACIO = ALFABETO[0] * len(_POSICION)
+
+
+def validar_cambio(dato):
+    """
+    Normaliza un cambio recibido por la API. Devuelve
+    ``(diente, cara, estado, observaciones)`` o lanza ``ValueError``.
+    """
+    if not isinstance(dato, dict):
+        raise ValueError('Formato de cambio inválido')
+    diente, cara, estado = dato.get('diente'), dato.get('cara'), dato.get('estado')
+    if not all([diente, cara, estado]):
+        raise ValueError('Datos incompletos')
+    try:
+        diente = int(diente)
+    except (TypeError, ValueError):
+        raise ValueError(f'Diente inválido: {diente}')
+    if diente not in DIENTES_FDI:
+        raise ValueError(f'El diente {diente} no existe en la numeración FDI')
+    if cara not in CARAS:
+        raise ValueError(f'Cara inválida: {cara}')
+    if estado not in ESTADOS:
+        raise ValueError(f'Estado inválido: {estado}')
+    observaciones = dato.get('observaciones') or ''
+    if not isinstance(observaciones, str):
+        raise ValueError('Las observaciones deben ser texto')
+    return diente, cara, estado, observaciones
+
+
+def validar_cambios(datos):
+    """
+    Valida una lista de cambios. Devuelve ``(cambios, errores)``; cada error
+    es ``{'indice': i, 'error': mensaje}`` para que el cliente sepa cuál falló.
+    """
+    if not isinstance(datos, list) or not datos:
+        return [], [{'indice': None, 'error': 'Se esperaba una lista de cambios'}]
+    if len(datos) > MAX_CAMBIOS_LOTE:
+        return [], [{'indice': None, 'error': f'Máximo {MAX_CAMBIOS_LOTE} cambios por envío'}]
+
+    cambios, errores = [], []
+    for indice, dato in enumerate(datos):
+        try:
+            cambios.append(validar_cambio(dato))
+        except ValueError as e:
+            errores.append({'indice': indice, 'error': str(e)})
+    return cambios, errores
+
+
+def aplicar_cambios(paciente_id, cambios):
+    """
+    Guarda los cambios ya validados en una transacción. Cada cambio queda en
+    el historial; en ``EstadoDiente`` gana el último de cada diente/cara.
+    El snapshot del paciente se actualiza en la misma transacción.
+    """
+    finales = {}
+    for diente, cara, estado, observaciones in cambios:
+        finales[(diente, cara)] = (estado, observaciones)
+
+    with transaction.atomic():
+        EstadoDiente.objects.bulk_create(
+            [
+                EstadoDiente(
+                    paciente_id=paciente_id,
+                    diente=diente,
+                    cara=cara,
+                    estado=estado,
+                    observaciones=observaciones,
+                )
+                for (diente, cara), (estado, observaciones) in finales.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['paciente', 'diente', 'cara'],
+            update_fields=['estado', 'observaciones', 'actualizado_en'],
+        )
+        HistorialOdontograma.objects.bulk_create([
+            HistorialOdontograma(
+                paciente_id=paciente_id,
+                diente=str(diente),
+                cara=cara,
+                estado=estado,
+                observaciones=observaciones,
+            )
+            for diente, cara, estado, observaciones in cambios
+        ])
+        actualizar_snapshot(paciente_id)
+        crear_checkpoint_si_corresponde(paciente_id)
+    return len(finales)
+
+
+def empaquetar(filas):
+    """
+    ``filas``: iterable de ``(diente, cara, estado, observaciones)``.
+    Devuelve ``(mapa, observaciones)``. Las filas fuera de la numeración
+    FDI (datos anteriores a la validación) no entran en el mapa.
+    """
+    mapa = list(_MAPA_VACIO)
+    observaciones = {}
+    for diente, cara, estado, obs in filas:
+        posicion = _POSICION.get((int(diente), cara))
+        if posicion is None or estado not in _CARACTER_ESTADO:
+            continue
+        mapa[posicion] = _CARACTER_ESTADO[estado]
+        if obs:
+            observaciones[f'{diente}{cara}'] = obs
+    return ''.join(mapa), observaciones
+
+
+def desempaquetar(mapa):
+    """Inverso de ``empaquetar``: ``{(diente, cara): estado}`` de las caras con registro."""
+    estados = {}
+    for posicion, caracter in enumerate(mapa):
+        codigo = ALFABETO.index(caracter)
+        if codigo:
+            diente = ORDEN_DIENTES[posicion // len(ORDEN_CARAS)]
+            estados[(diente, ORDEN_CARAS[posicion % len(ORDEN_CARAS)])] = CODIGOS_ESTADO[codigo]
+    return estados
+
+
+def actualizar_snapshot(paciente_id, crear=True):
+    """
+    Reconstruye el snapshot desde ``EstadoDiente`` y sube su versión.
+    Con ``crear=False`` solo actualiza un snapshot existente (lo usan las
+    señales, que también se disparan al borrar al paciente).
+    """
+    mapa, observaciones = empaquetar(
+        EstadoDiente.objects.filter(paciente_id=paciente_id).values_list(
+            'diente', 'cara', 'estado', 'observaciones'
+        )
+    )
+    actualizados = OdontogramaSnapshot.objects.filter(paciente_id=paciente_id).update(
+        mapa=mapa,
+        observaciones=observaciones,
+        version=F('version') + 1,
+        actualizado_en=timezone.now(),
+    )
+    if actualizados or not crear:
+        return
+    try:
+        with transaction.atomic():
+            OdontogramaSnapshot.objects.create(
+                paciente_id=paciente_id, mapa=mapa, observaciones=observaciones, version=1
+            )
+    except IntegrityError:
+        # Otro proceso lo creó primero: sobre ese se sube la versión
+        actualizar_snapshot(paciente_id, crear=False)
+
+
+def obtener_snapshot(paciente_id):
+    """
+    Snapshot del paciente; se construye la primera vez que se pide.
+    ``None`` si el paciente no existe.
+    """
+    snapshot = OdontogramaSnapshot.objects.filter(paciente_id=paciente_id).first()
+    if snapshot is None:
+        actualizar_snapshot(paciente_id)
+        snapshot = OdontogramaSnapshot.objects.filter(paciente_id=paciente_id).first()
+    return snapshot
+
+
+def mapa_a_dict(mapa, observaciones):
+    """Mapa empaquetado con las tablas necesarias para decodificarlo (respuesta JSON)."""
+    return {
+        'dientes': ORDEN_DIENTES,
+        'caras': ORDEN_CARAS,
+        'codigos': CODIGOS_ESTADO,
+        'alfabeto': ALFABETO,
+        'mapa': mapa,
+        'observaciones': observaciones,
+    }
+
+
+def snapshot_a_dict(snapshot):
+    return dict(mapa_a_dict(snapshot.mapa, snapshot.observaciones), version=snapshot.version)
+
+
+# ============================================
+# VIAJE EN EL TIEMPO
+# ============================================
+# HistorialOdontograma guarda cada cambio, así que el odontograma en una
+# fecha es la repetición del historial hasta esa fecha. Cada
+# INTERVALO_CHECKPOINT cambios se guarda un CheckpointOdontograma y la
+# reconstrucción empieza desde el checkpoint anterior más cercano.
+# Los cambios hechos antes de existir el historial no se pueden reconstruir.
+
+INTERVALO_CHECKPOINT = 200
+
+
+def _repetir(estados, cambios):
+    """
+    Aplica los cambios del historial sobre ``estados``. Devuelve
+    ``(id, fecha)`` del último cambio aplicado.
+    """
+    ultimo = (None, None)
+    for pk, fecha, diente, cara, estado, observaciones in cambios:
+        ultimo = (pk, fecha)
+        try:
+            estados[(int(diente), cara)] = (estado, observaciones)
+        except ValueError:
+            continue
+    return ultimo
+
+
+def _desde_checkpoint(checkpoint):
+    if checkpoint is None:
+        return {}
+    observaciones = checkpoint.observaciones
+    return {
+        (diente, cara): (estado, observaciones.get(f'{diente}{cara}', ''))
+        for (diente, cara), estado in desempaquetar(checkpoint.mapa).items()
+    }
+
+
+def _checkpoint_previo(paciente_id, momento=None):
+    checkpoints = CheckpointOdontograma.objects.filter(paciente_id=paciente_id)
+    if momento is not None:
+        checkpoints = checkpoints.filter(fecha__lte=momento)
+    return checkpoints.order_by('-fecha', '-hasta_id').first()
+
+
+def _cambios_desde(paciente_id, checkpoint, momento=None):
+    cambios = HistorialOdontograma.objects.filter(paciente_id=paciente_id)
+    if checkpoint is not None:
+        cambios = cambios.filter(pk__gt=checkpoint.hasta_id)
+    if momento is not None:
+        cambios = cambios.filter(fecha_cambio__lte=momento)
+    # El orden en que se aplicaron los cambios es el de inserción
+    return cambios.order_by('pk').values_list(
+        'pk', 'fecha_cambio', 'diente', 'cara', 'estado', 'observaciones'
+    )
+
+
+def estado_en(paciente_id, momento):
+    """``{(diente, cara): (estado, observaciones)}`` tal como estaba en ``momento``."""
+    checkpoint = _checkpoint_previo(paciente_id, momento)
+    estados = _desde_checkpoint(checkpoint)
+    _repetir(estados, _cambios_desde(paciente_id, checkpoint, momento).iterator())
+    return estados
+
+
+def empaquetar_estados(estados):
+    """``estado_en(...)`` -> ``(mapa, observaciones)``."""
+    return empaquetar(
+        (diente, cara, estado, observaciones)
+        for (diente, cara), (estado, observaciones) in estados.items()
+    )
+
+
+def diferencias(paciente_id, desde, hasta):
+    """Caras que cambiaron entre ``desde`` y ``hasta`` (``None`` = sin registro)."""
+    antes = estado_en(paciente_id, desde)
+    despues = estado_en(paciente_id, hasta)
+    cambios = []
+    for clave in sorted(antes.keys() | despues.keys()):
+        estado_antes, obs_antes = antes.get(clave, (None, ''))
+        estado_despues, obs_despues = despues.get(clave, (None, ''))
+        if (estado_antes, obs_antes) != (estado_despues, obs_despues):
+            cambios.append({
+                'diente': clave[0],
+                'cara': clave[1],
+                'antes': estado_antes,
+                'despues': estado_despues,
+                'observaciones_antes': obs_antes,
+                'observaciones_despues': obs_despues,
+            })
+    return cambios
+
+
+def crear_checkpoints(paciente_id, intervalo=None):
+    """
+    Guarda un checkpoint cada ``intervalo`` cambios (por defecto
+    ``INTERVALO_CHECKPOINT``) desde el último existente. Devuelve cuántos se crearon.
+    """
+    intervalo = intervalo or INTERVALO_CHECKPOINT
+    checkpoint = _checkpoint_previo(paciente_id)
+    estados = _desde_checkpoint(checkpoint)
+    pendientes = []
+    nuevos = []
+    for cambio in _cambios_desde(paciente_id, checkpoint).iterator():
+        pendientes.append(cambio)
+        if len(pendientes) < intervalo:
+            continue
+        hasta_id, fecha = _repetir(estados, pendientes)
+        pendientes = []
+        mapa, observaciones = empaquetar_estados(estados)
+        nuevos.append(CheckpointOdontograma(
+            paciente_id=paciente_id,
+            hasta_id=hasta_id,
+            fecha=fecha,
+            mapa=mapa,
+            observaciones=observaciones,
+        ))
+    CheckpointOdontograma.objects.bulk_create(nuevos)
+    return len(nuevos)
+
+
+def crear_checkpoint_si_corresponde(paciente_id):
+    """Llamado tras guardar cambios: solo trabaja si ya hay ``INTERVALO_CHECKPOINT`` cambios nuevos."""
+    checkpoint = _checkpoint_previo(paciente_id)
+    if _cambios_desde(paciente_id, checkpoint).count() >= INTERVALO_CHECKPOINT:
+        crear_checkpoints(paciente_id)
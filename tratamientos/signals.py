@@ -0,0 +1,18 @@
+# tratamientos/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import EstadoDiente
+from .odontograma import actualizar_snapshot
+
+
+# Ediciones sueltas de EstadoDiente (admin, shell). El guardado por lotes
+# usa bulk_create, que no dispara señales, y actualiza el snapshot él mismo.
+@receiver(post_save, sender=EstadoDiente)
+def estado_diente_guardado(sender, instance, **kwargs):
+    actualizar_snapshot(instance.paciente_id, crear=False)
+
+
+@receiver(post_delete, sender=EstadoDiente)
+def estado_diente_eliminado(sender, instance, **kwargs):
+    actualizar_snapshot(instance.paciente_id, crear=False)
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from pacientes.models import Paciente
+
+from .models import CheckpointOdontograma, EstadoDiente, HistorialOdontograma, Pago, Tratamiento
+from .odontograma import (
+    DIENTES_FDI, ESTADOS, ORDEN_CARAS, aplicar_cambios, crear_checkpoints, desempaquetar,
+    diferencias, empaquetar_estados, estado_en, obtener_snapshot,
+)
+from .views import _parse_momento
+
+
+def crear_paciente(dni='12345678', nombre='Paciente de Prueba'):
+    return Paciente.objects.create(
+        nombre_completo=nombre, dni=dni, fecha_nacimiento=date(1990, 1, 1), genero='F',
+    )
+
+
+class ParseMomentoTests(SimpleTestCase):
+
+    def test_fecha_sola_es_el_final_del_dia(self):
+        momento = _parse_momento('2024-05-10')
+        self.assertEqual(momento, timezone.make_aware(datetime(2024, 5, 10, 23, 59, 59, 999999)))
+
+    def test_fecha_y_hora(self):
+        self.assertEqual(
+            _parse_momento('2024-05-10T10:30'),
+            timezone.make_aware(datetime(2024, 5, 10, 10, 30)),
+        )
+
+    def test_fechas_imposibles_o_mal_formadas(self):
+        for valor in ('2024-02-30', '2024-02-30T10:00', '2024-13-01T00:00', 'ayer', ''):
+            with self.subTest(valor=valor):
+                self.assertIsNone(_parse_momento(valor))
+
+
+class OdontogramaEnFechaApiTests(TestCase):
+
+    def setUp(self):
+        self.paciente = crear_paciente()
+        aplicar_cambios(self.paciente.pk, [(16, 'O', 'caries', '')])
+        # El cambio se hizo a media tarde (hora de Lima)
+        HistorialOdontograma.objects.filter(paciente=self.paciente).update(
+            fecha_cambio=timezone.make_aware(datetime(2024, 5, 10, 15, 0))
+        )
+
+    def test_fecha_sola_incluye_los_cambios_de_ese_dia(self):
+        url = reverse('tratamientos:api_odontograma_en_fecha', args=[self.paciente.pk])
+        response = self.client.get(url, {'fecha': '2024-05-10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(desempaquetar(response.json()['mapa']), {(16, 'O'): 'caries'})
+
+        response = self.client.get(url, {'fecha': '2024-05-09'})
+        self.assertEqual(desempaquetar(response.json()['mapa']), {})
+
+    def test_fecha_imposible_es_400(self):
+        url = reverse('tratamientos:api_odontograma_en_fecha', args=[self.paciente.pk])
+        self.assertEqual(self.client.get(url, {'fecha': '2024-02-30T10:00'}).status_code, 400)
+
+        url = reverse('tratamientos:api_odontograma_diferencias', args=[self.paciente.pk])
+        self.assertEqual(self.client.get(url, {'desde': '2024-02-30T10:00'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(url, {'desde': '2024-05-01', 'hasta': '2024-02-30'}).status_code, 400
+        )
+
+
+class ViajeEnElTiempoTests(TestCase):
+    """``estado_en``/``diferencias`` con checkpoints deben dar lo mismo que repetir todo el historial."""
+
+    inicio = timezone.make_aware(datetime(2024, 1, 1, 9, 0))
+
+    def setUp(self):
+        self.paciente = crear_paciente()
+        azar = random.Random(19)
+        dientes = sorted(DIENTES_FDI)
+        estados = sorted(ESTADOS)
+        # 12 visitas de hasta 8 cambios, una por semana; se repiten caras a propósito
+        self.momentos = []
+        for visita in range(12):
+            cambios = [
+                (
+                    azar.choice(dientes[:6]), azar.choice(ORDEN_CARAS), azar.choice(estados),
+                    azar.choice(['', '', f'visita {visita}']),
+                )
+                for _ in range(azar.randint(1, 8))
+            ]
+            momento = self.inicio + timedelta(weeks=visita)
+            ultimo = HistorialOdontograma.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            aplicar_cambios(self.paciente.pk, cambios)
+            HistorialOdontograma.objects.filter(pk__gt=ultimo).update(fecha_cambio=momento)
+            self.momentos.append(momento)
+
+    def repetir_todo(self, momento):
+        estados = {}
+        for diente, cara, estado, observaciones in HistorialOdontograma.objects.filter(
+            paciente=self.paciente, fecha_cambio__lte=momento
+        ).order_by('pk').values_list('diente', 'cara', 'estado', 'observaciones'):
+            estados[(int(diente), cara)] = (estado, observaciones)
+        return estados
+
+    def consultas(self):
+        # Antes del historial, en cada visita, entre visitas y después de la última
+        yield self.inicio - timedelta(days=1)
+        for momento in self.momentos:
+            yield momento
+            yield momento + timedelta(days=3)
+
+    def test_checkpoints_no_cambian_el_resultado(self):
+        total = HistorialOdontograma.objects.filter(paciente=self.paciente).count()
+        self.assertEqual(crear_checkpoints(self.paciente.pk, intervalo=7), total // 7)
+        self.assertTrue(CheckpointOdontograma.objects.filter(paciente=self.paciente).exists())
+
+        for momento in self.consultas():
+            with self.subTest(momento=momento):
+                self.assertEqual(estado_en(self.paciente.pk, momento), self.repetir_todo(momento))
+
+    def test_cada_checkpoint_es_el_historial_hasta_su_ultimo_cambio(self):
+        crear_checkpoints(self.paciente.pk, intervalo=5)
+        for checkpoint in CheckpointOdontograma.objects.filter(paciente=self.paciente):
+            estados = {}
+            for diente, cara, estado, observaciones in HistorialOdontograma.objects.filter(
+                paciente=self.paciente, pk__lte=checkpoint.hasta_id
+            ).order_by('pk').values_list('diente', 'cara', 'estado', 'observaciones'):
+                estados[(int(diente), cara)] = (estado, observaciones)
+            self.assertEqual((checkpoint.mapa, checkpoint.observaciones), empaquetar_estados(estados))
+
+    def test_diferencias_coinciden_con_la_repeticion(self):
+        crear_checkpoints(self.paciente.pk, intervalo=6)
+        momentos = list(self.consultas())
+        for desde, hasta in zip(momentos, momentos[3:]):
+            antes, despues = self.repetir_todo(desde), self.repetir_todo(hasta)
+            esperadas = {
+                clave for clave in antes.keys() | despues.keys() if antes.get(clave) != despues.get(clave)
+            }
+            with self.subTest(desde=desde, hasta=hasta):
+                cambios = diferencias(self.paciente.pk, desde, hasta)
+                self.assertEqual({(c['diente'], c['cara']) for c in cambios}, esperadas)
+                for cambio in cambios:
+                    clave = (cambio['diente'], cambio['cara'])
+                    self.assertEqual(cambio['antes'], antes.get(clave, (None, ''))[0])
+                    self.assertEqual(cambio['despues'], despues.get(clave, (None, ''))[0])
+
+    def test_hoy_coincide_con_el_estado_y_el_snapshot(self):
+        crear_checkpoints(self.paciente.pk, intervalo=4)
+        ahora = estado_en(self.paciente.pk, timezone.now())
+        actuales = {
+            (diente, cara): (estado, observaciones)
+            for diente, cara, estado, observaciones in EstadoDiente.objects.filter(
+                paciente=self.paciente
+            ).values_list('diente', 'cara', 'estado', 'observaciones')
+        }
+        self.assertEqual(ahora, actuales)
+        snapshot = obtener_snapshot(self.paciente.pk)
+        self.assertEqual((snapshot.mapa, snapshot.observaciones), empaquetar_estados(ahora))
+
+    def test_guardar_crea_checkpoint_al_llegar_al_intervalo(self):
+        antes = CheckpointOdontograma.objects.filter(paciente=self.paciente).count()
+        with mock.patch('tratamientos.odontograma.INTERVALO_CHECKPOINT', 5):
+            aplicar_cambios(self.paciente.pk, [(11, 'V', 'caries', '')])
+        self.assertGreater(CheckpointOdontograma.objects.filter(paciente=self.paciente).count(), antes)
+        ahora = timezone.now()
+        self.assertEqual(estado_en(self.paciente.pk, ahora), self.repetir_todo(ahora))
+
+
+class SaldosTests(TestCase):
+    """``total_pagado``/``saldo`` guardados deben coincidir siempre con la suma de los pagos."""
+
+    def setUp(self):
+        self.paciente = crear_paciente()
+        self.tratamiento = self.crear_tratamiento('Endodoncia', '500.00')
+        self.otro = self.crear_tratamiento('Corona', '800.00')
+
+    def crear_tratamiento(self, nombre, costo):
+        return Tratamiento.objects.create(
+            paciente=self.paciente, nombre=nombre, costo_total=Decimal(costo), fecha_inicio=date(2024, 1, 1),
+        )
+
+    def assertCuadra(self, *tratamientos):
+        for tratamiento in tratamientos:
+            tratamiento.refresh_from_db()
+            pagado = tratamiento.pagos.aggregate(total=Sum('monto'))['total'] or Decimal('0')
+            self.assertEqual(tratamiento.total_pagado, pagado)
+            self.assertEqual(tratamiento.saldo, tratamiento.costo_total - pagado)
+
+    def test_nuevo_tratamiento_sin_pagos(self):
+        self.assertEqual(self.tratamiento.total_pagado, 0)
+        self.assertEqual(self.tratamiento.saldo, Decimal('500.00'))
+        self.assertCuadra(self.tratamiento)
+
+    def test_crear_pagos(self):
+        Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('120.50'))
+        pago = Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('79.50'))
+        # El tratamiento cargado en el pago muestra los totales nuevos
+        self.assertEqual(pago.tratamiento.saldo, Decimal('300.00'))
+        self.assertCuadra(self.tratamiento, self.otro)
+        self.assertEqual(self.tratamiento.estado_pago, 'parcial')
+
+    def test_editar_monto(self):
+        pago = Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('100'))
+        pago.monto = Decimal('500')
+        pago.save()
+        self.assertCuadra(self.tratamiento)
+        self.assertEqual(self.tratamiento.saldo, 0)
+        self.assertEqual(self.tratamiento.estado_pago, 'completado')
+
+    def test_mover_pago_a_otro_tratamiento(self):
+        pago = Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('200'))
+        # Desde una instancia nueva (como el formulario de edición), cambiando también el monto
+        pago = Pago.objects.get(pk=pago.pk)
+        pago.tratamiento = self.otro
+        pago.monto = Decimal('250')
+        pago.save()
+        self.assertCuadra(self.tratamiento, self.otro)
+        self.assertEqual(self.tratamiento.total_pagado, 0)
+        self.assertEqual(self.otro.saldo, Decimal('550.00'))
+
+    def test_eliminar_pago(self):
+        pago = Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('150'))
+        Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('50'))
+        pago.delete()
+        self.assertCuadra(self.tratamiento)
+        self.assertEqual(self.tratamiento.saldo, Decimal('450.00'))
+
+    def test_cambiar_costo_total(self):
+        Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('100'))
+        # Instancia vieja: su total_pagado en memoria es 0 y no debe pisar el guardado
+        viejo = Tratamiento.objects.get(pk=self.tratamiento.pk)
+        Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('100'))
+        viejo.costo_total = Decimal('600.00')
+        viejo.save()
+        self.assertEqual(viejo.saldo, Decimal('400.00'))
+        self.assertCuadra(self.tratamiento)
+
+    def test_deuda_del_paciente(self):
+        Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('500'))
+        Pago.objects.create(tratamiento=self.otro, monto=Decimal('300'))
+        paciente = Paciente.objects.con_deudas().get(pk=self.paciente.pk)
+        self.assertEqual(paciente.deuda_total, Decimal('500.00'))
+        self.assertEqual(paciente.total_pagado, Decimal('800.00'))
+        self.assertEqual(paciente.num_tratamientos, 1)
+
+        Pago.objects.create(tratamiento=self.otro, monto=Decimal('500'))
+        self.assertFalse(Paciente.objects.con_deudas().filter(pk=self.paciente.pk).exists())
+
+    def test_recalcular_saldos(self):
+        Pago.objects.create(tratamiento=self.tratamiento, monto=Decimal('100'))
+        # Pagos cargados sin pasar por Pago.save (p. ej. un import): los totales quedan mal
+        Pago.objects.bulk_create([Pago(tratamiento=self.otro, monto=Decimal('300'))])
+        Tratamiento.objects.filter(pk=self.tratamiento.pk).update(total_pagado=Decimal('7'))
+
+        salida = StringIO()
+        with self.assertRaises(SystemExit):
+            call_command('recalcular_saldos', verificar=True, stdout=salida, stderr=StringIO())
+        self.tratamiento.refresh_from_db()
+        self.assertEqual(self.tratamiento.total_pagado, Decimal('7'))
+
+        call_command('recalcular_saldos', stdout=salida)
+        self.assertCuadra(self.tratamiento, self.otro)
+        self.assertEqual(self.otro.saldo, Decimal('500.00'))
+
+        salida = StringIO()
+        call_command('recalcular_saldos', verificar=True, stdout=salida)
+        self.assertIn('todos cuadran', salida.getvalue())
@@ -22,7 +22,12 @@ urlpatterns = [
     
     # Odontograma
     path('paciente/<int:paciente_id>/odontograma/', views.odontograma_view, name='odontograma'),
+    path('paciente/<int:paciente_id>/odontograma.svg', views.odontograma_svg_view, name='odontograma_svg'),
+    path('paciente/<int:paciente_id>/odontograma.pdf', views.odontograma_pdf_view, name='odontograma_pdf'),
     path('api/odontograma/<int:paciente_id>/', views.api_obtener_odontograma, name='api_odontograma'),
     path('api/odontograma/<int:paciente_id>/guardar/', views.api_guardar_estado_diente, name='api_guardar_odontograma'),
+    path('api/odontograma/<int:paciente_id>/guardar-lote/', views.api_guardar_odontograma_lote, name='api_guardar_odontograma_lote'),
     path('api/odontograma/<int:paciente_id>/historial/', views.api_historial_odontograma, name='api_historial_odontograma'),
+    path('api/odontograma/<int:paciente_id>/en-fecha/', views.api_odontograma_en_fecha, name='api_odontograma_en_fecha'),
+    path('api/odontograma/<int:paciente_id>/diferencias/', views.api_odontograma_diferencias, name='api_odontograma_diferencias'),
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 # tratamientos/views.py
-from datetime import date
+from datetime import date, datetime, time
 import calendar 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
@@ -9,23 +9,33 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from pacientes.models import Paciente
 from .models import Tratamiento, Pago, EstadoDiente, HistorialOdontograma
 from .forms import TratamientoForm, PagoForm
+from .exportar import DENTICIONES, clave_render, pdf_odontograma, svg_odontograma
+from .odontograma import (
+    aplicar_cambios, diferencias, empaquetar_estados, estado_en, mapa_a_dict,
+    obtener_snapshot, snapshot_a_dict, validar_cambio, validar_cambios,
+)
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.http import require_POST
 import json
 from auditoria.utils import registrar_log
+from consultorio_dental.paginacion import PaginacionCursorMixin
 
 # ===== TRATAMIENTOS =====
 
-class ListaTratamientosView(ListView):
+class ListaTratamientosView(PaginacionCursorMixin, ListView):
     model = Tratamiento
     template_name = 'tratamientos/lista_tratamientos.html'
     context_object_name = 'tratamientos'
     paginate_by = 20
+    orden_cursor = ('-fecha_inicio',)
 
     def get_queryset(self):
         paciente_id = self.kwargs.get('paciente_id')
-        queryset = Tratamiento.objects.all()
+        queryset = Tratamiento.objects.with_finanzas()
         
         if paciente_id:
             self.paciente = get_object_or_404(Paciente, pk=paciente_id)
@@ -91,6 +101,9 @@ class DetalleTratamientoView(DetailView):
     template_name = 'tratamientos/detalle_tratamiento.html'
     context_object_name = 'tratamiento'
 
+    def get_queryset(self):
+        return Tratamiento.objects.with_finanzas().prefetch_related('pagos')
+
 class CrearTratamientoView(CreateView):
     model = Tratamiento
     form_class = TratamientoForm
@@ -255,11 +268,12 @@ class EliminarPagoView(DeleteView):
         messages.success(request, "Pago eliminado exitosamente.")
         return super().delete(request, *args, **kwargs)
 
-class ListaPagosView(ListView):
+class ListaPagosView(PaginacionCursorMixin, ListView):
     model = Pago
     template_name = 'tratamientos/lista_pagos.html'
     context_object_name = 'pagos'
     paginate_by = 20
+    orden_cursor = ('-fecha_pago',)
 
     def get_queryset(self):
         queryset = Pago.objects.select_related('tratamiento__paciente', 'tratamiento').all()
@@ -295,66 +309,120 @@ class ListaPagosView(ListView):
 
 def odontograma_view(request, paciente_id):
     paciente = get_object_or_404(Paciente, pk=paciente_id)
-    from configuracion.models import ConfiguracionConsultorio
-    config = ConfiguracionConsultorio.get_configuracion()
+    from configuracion.cache import get_configuracion_cacheada
+    config = get_configuracion_cacheada()
     return render(request, 'tratamientos/odontograma.html', {
         'paciente': paciente,
         'config': config
     })
 
+def _exportar_odontograma(request, paciente_id, formato):
+    paciente = get_object_or_404(Paciente, pk=paciente_id)
+    denticion = request.GET.get('denticion', 'adulto')
+    if denticion not in DENTICIONES:
+        denticion = 'adulto'
+    snapshot = obtener_snapshot(paciente.pk)
+
+    etag = f'"{clave_render(paciente, snapshot, denticion, formato)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    if formato == 'svg':
+        _clave, contenido, _cache = svg_odontograma(paciente, snapshot, denticion)
+        response = HttpResponse(contenido, content_type='image/svg+xml')
+    else:
+        _clave, contenido, _cache = pdf_odontograma(paciente, snapshot, denticion)
+        if contenido is None:
+            return HttpResponse("Error generando PDF", status=500)
+        response = HttpResponse(contenido, content_type='application/pdf')
+        filename = f"Odontograma_{paciente.nombre_completo.replace(' ', '_')}.pdf"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def odontograma_svg_view(request, paciente_id):
+    return _exportar_odontograma(request, paciente_id, 'svg')
+
+def odontograma_pdf_view(request, paciente_id):
+    return _exportar_odontograma(request, paciente_id, 'pdf')
+
 def api_obtener_odontograma(request, paciente_id):
-    estados = EstadoDiente.objects.filter(paciente_id=paciente_id)
-    data = []
-    for estado in estados:
-        data.append({
-            'diente': estado.diente,
-            'cara': estado.cara,
-            'estado': estado.estado,
-            'tratamiento_id': estado.tratamiento_id,
-            'observaciones': estado.observaciones
-        })
-    return JsonResponse({'estados': data})
+    """
+    Odontograma completo en una respuesta (snapshot empaquetado). El ETag es
+    la versión del snapshot: si el cliente ya la tiene se responde 304.
+    """
+    snapshot = obtener_snapshot(paciente_id)
+    if snapshot is None:
+        return JsonResponse({'error': 'Paciente no encontrado'}, status=404)
+    etag = f'"odontograma-{paciente_id}-v{snapshot.version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(snapshot_a_dict(snapshot))
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @require_POST
 def api_guardar_estado_diente(request, paciente_id):
     try:
-        data = json.loads(request.body)
-        diente = data.get('diente')
-        cara = data.get('cara')
-        estado_valor = data.get('estado')
-        observaciones = data.get('observaciones', '')
-        
-        if not all([diente, cara, estado_valor]):
-            return JsonResponse({'error': 'Datos incompletos'}, status=400)
-
-        estado_diente, created = EstadoDiente.objects.update_or_create(
-            paciente_id=paciente_id,
-            diente=diente,
-            cara=cara,
-            defaults={
-                'estado': estado_valor,
-                'observaciones': observaciones
-            }
-        )
-        
-        HistorialOdontograma.objects.create(
-            paciente_id=paciente_id,
-            diente=diente,
-            cara=cara,
-            estado=estado_valor,
-            observaciones=observaciones
-        )
-        
+        cambio = validar_cambio(json.loads(request.body))
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        aplicar_cambios(paciente_id, [cambio])
         return JsonResponse({'status': 'success', 'message': 'Estado guardado'})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@require_POST
+def api_guardar_odontograma_lote(request, paciente_id):
+    """
+    Guarda de una vez los cambios que el odontograma fue acumulando:
+    ``{"cambios": [{"diente", "cara", "estado", "observaciones"}, ...]}``.
+    Si algún cambio no es válido no se guarda ninguno.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    if not Paciente.objects.filter(pk=paciente_id).exists():
+        return JsonResponse({'error': 'Paciente no encontrado'}, status=404)
+
+    cambios, errores = validar_cambios(data.get('cambios') if isinstance(data, dict) else None)
+    if errores:
+        return JsonResponse({'error': 'Cambios inválidos', 'errores': errores}, status=400)
+    try:
+        guardados = aplicar_cambios(paciente_id, cambios)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({'status': 'success', 'cambios': len(cambios), 'guardados': guardados})
+
 def api_historial_odontograma(request, paciente_id):
-    historial = HistorialOdontograma.objects.filter(paciente_id=paciente_id).order_by('-fecha_cambio')[:50]
+    """
+    Cambios del odontograma, del más reciente al más antiguo. Para ver más
+    atrás se pide ``?antes=<id>`` con el ``siguiente`` de la respuesta anterior.
+    """
+    try:
+        limite = min(int(request.GET.get('limite', 50)), 200)
+        antes = int(request.GET['antes']) if request.GET.get('antes') else None
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if limite < 1:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+
+    historial = HistorialOdontograma.objects.filter(paciente_id=paciente_id)
+    if antes is not None:
+        historial = historial.filter(pk__lt=antes)
+    historial = list(historial.order_by('-pk')[:limite + 1])
+    hay_mas = len(historial) > limite
+    historial = historial[:limite]
     
     data = []
     for entry in historial:
         data.append({
+            'id': entry.pk,
             'diente': entry.diente,
             'cara': entry.cara,
             'estado': entry.estado,
@@ -362,4 +430,48 @@ def api_historial_odontograma(request, paciente_id):
             'fecha': entry.fecha_cambio.strftime('%Y-%m-%d %H:%M:%S')
         })
     
-    return JsonResponse({'historial': data})
\ No newline at end of file
+    return JsonResponse({
+        'historial': data,
+        'siguiente': historial[-1].pk if hay_mas else None,
+    })
+
+def _parse_momento(valor):
+    """
+    Fecha/hora de los parámetros de la API. Una fecha sola (``2024-05-10``)
+    significa el final de ese día, hora de Lima. ``None`` si no es válida.
+    """
+    if not valor:
+        return None
+    # En Python 3.11+ parse_datetime también acepta una fecha sola (medianoche):
+    # se mira primero si es solo fecha
+    try:
+        dia = parse_date(valor)
+        momento = datetime.combine(dia, time.max) if dia else parse_datetime(valor)
+    except ValueError:
+        # Bien formada pero imposible (p. ej. 2024-02-30)
+        return None
+    if momento is None:
+        return None
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+def api_odontograma_en_fecha(request, paciente_id):
+    """Odontograma tal como estaba en ``?fecha=`` (mismo formato que el snapshot)."""
+    momento = _parse_momento(request.GET.get('fecha'))
+    if momento is None:
+        return JsonResponse({'error': 'Fecha inválida'}, status=400)
+    mapa, observaciones = empaquetar_estados(estado_en(paciente_id, momento))
+    return JsonResponse(dict(mapa_a_dict(mapa, observaciones), fecha=momento.isoformat()))
+
+def api_odontograma_diferencias(request, paciente_id):
+    """Caras que cambiaron entre ``?desde=`` y ``?hasta=`` (por defecto, ahora)."""
+    desde = _parse_momento(request.GET.get('desde'))
+    hasta = _parse_momento(request.GET.get('hasta')) if request.GET.get('hasta') else timezone.now()
+    if desde is None or hasta is None:
+        return JsonResponse({'error': 'Fechas inválidas'}, status=400)
+    return JsonResponse({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'cambios': diferencias(paciente_id, desde, hasta),
+    })